@@ -0,0 +1,284 @@
+import json
+import shutil
+import signal
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future
+from pathlib import Path
+
+from openai import OpenAI
+
+from batch_packer import Batch
+from config import LLM_BATCH_API_MAX_REQUESTS, LLM_BATCH_API_POLL_SECONDS
+from json_stream import parse_llm_json
+from provider_pool import Provider
+from tables import iter_table_rows
+
+FINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def answer_items(record: dict) -> list | None:
+    """Answer items of one Batch API output line, None if unusable"""
+    response = record.get('response') or {}
+    if record.get('error') or response.get('status_code') != 200:
+        return None
+    try:
+        content = response['body']['choices'][0]['message']['content']
+        answer = parse_llm_json(content or "")
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError):
+        return None
+    if isinstance(answer, dict):
+        answer = answer.get('results')
+    return answer if isinstance(answer, list) else None
+
+
+class BatchApiRunner:
+    """Evaluates pending rows through the provider's offline Batch API.
+
+    Everything lives in `work_dir`: `manifest.jsonl` lists the rows of each
+    group (one QualityChecker batch), `requests-<n>.jsonl` are the request
+    files and `state.json` tracks the submitted jobs. Rerunning after an
+    interruption resumes from there instead of rendering again, unless
+    the rendering itself was interrupted: nothing was submitted then, and
+    it starts over.
+    """
+
+    def __init__(self, checker, packer, work_dir: str):
+        self.checker = checker
+        self.packer = packer
+        self.work_dir = Path(work_dir)
+        self.state_file = self.work_dir / 'state.json'
+        self.manifest_file = self.work_dir / 'manifest.jsonl'
+        # Input rows read so far by ingest, which asks for them in order
+        self.input_rows: Iterator[tuple[int, dict]] | None = None
+
+    def run(self, rows):
+        signal.signal(signal.SIGINT, self.checker.signal_handler)
+        self.checker.metrics.start()
+        state = json.loads(self.state_file.read_text()) \
+            if self.state_file.exists() else None
+        if state and not state.get('rendered_complete'):
+            print(f"Rendering in {self.work_dir} was interrupted, "
+                  "rendering again")
+            shutil.rmtree(self.work_dir)
+            state = None
+        if state:
+            print(f"Resuming Batch API run from {self.work_dir}")
+        else:
+            state = self.render(rows)
+            if not state['rendered_complete']:
+                print("Stopped, rerun the same command to resume")
+                return
+        if not state['chunks']:
+            print("No rows to process")
+            shutil.rmtree(self.work_dir)
+            return
+
+        self.checker.results.open(state['fieldnames'])
+        for chunk in state['chunks']:
+            if chunk['status'] == 'rendered':
+                self.submit(chunk)
+                self.save_state(state)
+
+        # Ingest in order so verdicts shared by later groups are known
+        for chunk in state['chunks']:
+            if chunk['status'] == 'ingested':
+                continue
+            batch_job = self.wait(chunk)
+            if batch_job is None:
+                print("Stopped, rerun the same command to resume")
+                return
+            self.ingest(chunk, batch_job)
+            chunk['status'] = 'ingested'
+            self.save_state(state)
+
+        shutil.rmtree(self.work_dir)
+        print("Batch API run completed")
+
+    def save_state(self, state: dict):
+        tmp_file = self.state_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps(state, indent=2))
+        tmp_file.replace(self.state_file)
+
+    def render(self, rows) -> dict:
+        """Write the manifest and request files for all pending rows"""
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        chunks: list[dict] = []
+        requests_file = None
+        request_count = 0
+        prompt_names = self.checker.prompt_names
+        # A job is answered by the endpoint it was submitted to
+        provider = self.checker.pool.primary
+
+        with open(self.manifest_file, 'w') as manifest:
+            for group, batch in enumerate(
+                    self.checker.iter_batches(rows, self.packer)):
+                entry = {
+                    'group':
+                    group,
+                    'rows': [[int(r['original_row_number']), key]
+                             for r, key in zip(batch.rows, batch.keys)],
+                    'pending': [
+                        int(r['original_row_number'])
+                        for r in batch.pending_rows
+                    ],
+                }
+                manifest.write(json.dumps(entry) + '\n')
+
+                if not chunks or batch.pending_rows and request_count + len(
+                        prompt_names) > LLM_BATCH_API_MAX_REQUESTS:
+                    if requests_file:
+                        requests_file.close()
+                    name = f'requests-{len(chunks)}.jsonl'
+                    requests_file = open(self.work_dir / name, 'w')
+                    request_count = 0
+                    chunks.append({
+                        'requests_file': name,
+                        'first_group': group,
+                        'request_count': 0,
+                        'batch_id': None,
+                        'provider': provider.name,
+                        'status': 'rendered',
+                    })
+                chunks[-1]['last_group'] = group
+
+                if not batch.pending_rows:
+                    continue
+                assert requests_file, "No requests file open"
+                for prompt_name in prompt_names:
+                    messages = self.checker.render_messages(
+                        prompt_name, batch.pending_rows)
+                    request = {
+                        'custom_id': f'{prompt_name}:{group}',
+                        'method': 'POST',
+                        'url': '/v1/chat/completions',
+                        'body': {
+                            'model': provider.model,
+                            'messages': messages
+                        },
+                    }
+                    requests_file.write(json.dumps(request) + '\n')
+                    request_count += 1
+                chunks[-1]['request_count'] = request_count
+
+        if requests_file:
+            requests_file.close()
+        state = {
+            'fieldnames': self.checker.output_fieldnames(),
+            'chunks': chunks,
+            # iter_batches stops early on SIGINT
+            'rendered_complete': self.checker.running,
+        }
+        self.save_state(state)
+        print(f"Rendered {sum(c['request_count'] for c in chunks)} requests "
+              f"in {len(chunks)} file(s)")
+        return state
+
+    def provider(self, chunk: dict) -> Provider:
+        pool = self.checker.pool
+        return pool.by_name.get(chunk.get('provider'), pool.primary)
+
+    def client(self, chunk: dict) -> OpenAI:
+        return self.provider(chunk).client
+
+    def submit(self, chunk: dict):
+        if not chunk['request_count']:
+            chunk['status'] = 'empty'
+            return
+        with open(self.work_dir / chunk['requests_file'], 'rb') as f:
+            uploaded = self.client(chunk).files.create(file=f, purpose='batch')
+        batch_job = self.client(chunk).batches.create(
+            input_file_id=uploaded.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
+        )
+        chunk['batch_id'] = batch_job.id
+        chunk['status'] = 'submitted'
+        print(f"Submitted {chunk['requests_file']} as {batch_job.id}")
+
+    def wait(self, chunk: dict):
+        """Poll until the chunk's job is final, None when interrupted"""
+        if chunk['status'] == 'empty':
+            return chunk
+        while self.checker.running:
+            batch_job = self.client(chunk).batches.retrieve(chunk['batch_id'])
+            counts = batch_job.request_counts
+            progress = f" ({counts.completed}/{counts.total})" \
+                if counts else ""
+            print(f"{chunk['batch_id']}: {batch_job.status}{progress}")
+            if batch_job.status in FINAL_STATUSES:
+                return batch_job
+            time.sleep(LLM_BATCH_API_POLL_SECONDS)
+        return None
+
+    def download_answers(self, chunk: dict,
+                         batch_job) -> dict[str, list | None]:
+        answers: dict[str, list | None] = {}
+        for file_id in (batch_job.output_file_id, batch_job.error_file_id):
+            if not file_id:
+                continue
+            content = self.client(chunk).files.content(file_id).text
+            for line in content.splitlines():
+                if line.strip():
+                    record = json.loads(line)
+                    answers[record['custom_id']] = answer_items(record)
+        return answers
+
+    def read_input_rows(self, row_numbers: set[int]) -> dict[int, dict]:
+        """Rows by number, reading on from the previous call's rows; groups
+        follow the input order, so all chunks take one pass over it"""
+        rows: dict[int, dict] = {}
+        if not row_numbers:
+            return rows
+        if self.input_rows is None:
+            self.input_rows = enumerate(
+                iter_table_rows(self.checker.input_file))
+        last = max(row_numbers)
+        for idx, row in self.input_rows:
+            if idx in row_numbers:
+                rows[idx] = self.checker.prepare_row(row, idx)
+            if idx >= last:
+                break
+        return rows
+
+    def ingest(self, chunk: dict, batch_job):
+        """Write the chunk's groups; ids the job did not answer are
+        re-issued through the interactive recovery path"""
+        answers = self.download_answers(chunk, batch_job) \
+            if chunk['status'] != 'empty' else {}
+        with open(self.manifest_file) as manifest:
+            groups = [
+                g for g in map(json.loads, manifest)
+                if chunk['first_group'] <= g['group'] <= chunk['last_group']
+            ]
+        input_rows = self.read_input_rows(
+            {n
+             for g in groups
+             for n, _ in g['rows']})
+        prompt_names = self.checker.prompt_names
+        provider = self.provider(chunk)
+        source = (provider.name, provider.model)
+
+        for g in groups:
+            keys = dict(g['rows'])
+            pending_rows = [input_rows[n] for n in g['pending']]
+            results = self.checker.rate_from_answers(
+                pending_rows,
+                {p: answers.get(f"{p}:{g['group']}")
+                 for p in prompt_names}, source) if pending_rows else []
+            future: Future[list[dict]] = Future()
+            future.set_result(results)
+            batch = Batch(
+                rows=[
+                    input_rows[n] for n, _ in g['rows']
+                    if not self.checker.results.is_processed(n)
+                ],
+                pending_rows=pending_rows,
+                pending_keys=[keys[n] for n in g['pending']],
+                future=future,
+            )
+            batch.keys = [
+                keys[int(r['original_row_number'])] for r in batch.rows
+            ]
+            self.checker.write_batch(batch)
+        print(f"Ingested groups {chunk['first_group']}-{chunk['last_group']}")
@@ -0,0 +1,106 @@
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from rate_limiter import estimate_tokens
+
+# Rough completion size of one `{"id": .., "category": ..}` style item
+OUTPUT_TOKENS_PER_ITEM = 24
+
+
+@dataclass
+class Batch:
+    """Rows written together; only `pending_rows` are sent to the LLM"""
+    rows: list[dict] = field(default_factory=list)
+    keys: list[str] = field(default_factory=list)
+    pending_rows: list[dict] = field(default_factory=list)
+    pending_keys: list[str] = field(default_factory=list)
+    pending_tokens: int = 0
+    future: Future | None = None
+    # Verdicts streamed in before the batch completes, by pending index
+    partial: dict[int, dict] = field(default_factory=dict)
+    updated: threading.Condition = field(default_factory=threading.Condition)
+
+    def record_verdict(self, index: int, result_field: str, value):
+        """Dict values, e.g. the sources by prompt, are merged"""
+        with self.updated:
+            partial = self.partial.setdefault(index, {})
+            if isinstance(value, dict):
+                partial.setdefault(result_field, {}).update(value)
+            else:
+                partial[result_field] = value
+            self.updated.notify_all()
+
+    def notify(self, _future: Future | None = None):
+        with self.updated:
+            self.updated.notify_all()
+
+
+class BatchPacker:
+    """Decides batch boundaries from estimated prompt and output tokens.
+
+    A row's cost is the size of its rendered section in the largest of the
+    user templates, so every request of the batch stays within
+    `token_budget`. A row that does not fit in an empty request is sent on
+    its own. A budget of 0 disables that limit. Rows carry the diff as it
+    is rendered, compacted, under `compact_diff`.
+    """
+
+    def __init__(self,
+                 render: Callable[[str, dict], str],
+                 prompt_names: list[str],
+                 max_rows: int | None = None,
+                 token_budget: int = 0,
+                 output_token_cap: int = 0):
+        self.render = render
+        self.prompt_names = prompt_names
+        self.max_rows = max_rows
+        self.token_budget = token_budget
+        self.output_token_cap = output_token_cap
+        empty: dict[str, list] = {'suggestions': []}
+        self.overhead = max(
+            estimate_tokens(
+                render(f'{name}_system', empty) +
+                render(f'{name}_user', empty)) for name in prompt_names)
+
+    def row_tokens(self, row: dict) -> int:
+        if not self.token_budget:
+            return 0
+        render_args = {
+            'suggestions': [{
+                'id': 0,
+                'suggestion': row['Suggestion'],
+                'code_diff': row['compact_diff'],
+            }]
+        }
+        return max(
+            estimate_tokens(self.render(f'{name}_user', render_args)) -
+            estimate_tokens(self.render(f'{name}_user', {'suggestions': []}))
+            for name in self.prompt_names)
+
+    def is_oversized(self, tokens: int) -> bool:
+        return bool(self.token_budget) and \
+            self.overhead + tokens > self.token_budget
+
+    def can_add(self, rows: int, tokens: int, row_tokens: int) -> bool:
+        """Whether a batch of `rows` rows / `tokens` tokens takes one more"""
+        if rows == 0:
+            return True
+        if self.max_rows and rows + 1 > self.max_rows:
+            return False
+        if self.token_budget and \
+                self.overhead + tokens + row_tokens > self.token_budget:
+            return False
+        if self.output_token_cap and \
+                (rows + 1) * OUTPUT_TOKENS_PER_ITEM > self.output_token_cap:
+            return False
+        return True
+
+    def is_full(self, rows: int, tokens: int) -> bool:
+        if self.max_rows and rows >= self.max_rows:
+            return True
+        if self.is_oversized(tokens):
+            return True
+        return bool(self.output_token_cap) and \
+            (rows + 1) * OUTPUT_TOKENS_PER_ITEM > self.output_token_cap
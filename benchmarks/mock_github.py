@@ -0,0 +1,563 @@
+"""Local stand-in for the GitHub endpoints used by the export and clone
+scripts
+
+Serves pull requests, paginated review comments, PR diffs, repository
+creation and PR creation from synthetic data, with configurable latency
+and a primary rate limit. GET responses carry an ETag and answer a
+matching If-None-Match with 304, which like GitHub's does not count
+against the rate limit; review comments can be filtered by `since` and
+pull request listings by `state` (every fourth PR is closed).
+Source repositories are real bare git repos
+under `git_root`, so clone_prs.py can clone from and push to them with
+GITHUB_GIT_URL=file://<git_root>. Point the scripts at it with
+GITHUB_API_URL=http://127.0.0.1:<port> and
+GITHUB_DIFF_URL=http://127.0.0.1:<port>/raw.
+
+POST /graphql answers the aliased review thread queries of
+export_gh_comments_to_csv.py --backend graphql, with the review comments
+of a PR grouped into threads of `comments_per_thread`.
+"""
+import hashlib
+import json
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import click
+
+BOT_LOGIN = 'review-bot[bot]'
+# Modules of the source repos the PR diff does not touch
+UNTOUCHED_MODULES = 200
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+GRAPHQL_REPOSITORY = (r'(\w+): repository\(owner: "([^"]+)", '
+                      r'name: "([^"]+)"\) \{ pullRequest\(number: (\d+)\) ')
+GRAPHQL_PULL = re.compile(
+    GRAPHQL_REPOSITORY + r'\{ reviewThreads\(first: (\d+)'
+    r'(?:, after: "([^"]*)")?\) .*? comments\(first: (\d+)\)')
+GRAPHQL_BODY = re.compile(GRAPHQL_REPOSITORY + r'\{ body \}')
+GRAPHQL_THREAD = re.compile(r'(\w+): node\(id: "([^"]+)"\) .*? '
+                            r'comments\(first: (\d+)(?:, after: "([^"]*)")?\)')
+
+
+def run_git(args: list[str], cwd: str | Path | None = None) -> str:
+    return subprocess.run(['git', *args],
+                          cwd=cwd,
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout.strip()
+
+
+def create_source_repo(git_root: Path, owner: str, name: str) -> dict:
+    """Bare repo with a base commit and a PR diff that applies on top,
+    serving partial clones like GitHub"""
+    bare = git_root / owner / f'{name}.git'
+    with tempfile.TemporaryDirectory() as work:
+        run_git(['init', '-q', '-b', 'main', work])
+        run_git(['config', 'user.email', 'bench@example.com'], work)
+        run_git(['config', 'user.name', 'Bench'], work)
+        source = Path(work) / 'app.py'
+        source.write_text(''.join(f'def handler_{i}(request):\n'
+                                  f'    return process(request, {i})\n\n'
+                                  for i in range(50)))
+        lib = Path(work) / 'lib'
+        lib.mkdir()
+        for i in range(UNTOUCHED_MODULES):
+            (lib / f'module_{i}.py').write_text(''.join(
+                f'def helper_{i}_{j}(value):\n    return value * {j}\n\n'
+                for j in range(40)))
+        run_git(['add', '.'], work)
+        run_git(['commit', '-q', '-m', 'Base'], work)
+        base_sha = run_git(['rev-parse', 'HEAD'], work)
+        source.write_text(source.read_text().replace(
+            'return process(request, 7)',
+            'data = request.json\n    return process(data, 7)'))
+        run_git(['commit', '-q', '-am', 'Change handler'], work)
+        head_sha = run_git(['rev-parse', 'HEAD'], work)
+        diff = run_git(['diff', base_sha, head_sha], work) + '\n'
+        run_git(['reset', '-q', '--hard', base_sha], work)
+        bare.parent.mkdir(parents=True, exist_ok=True)
+        run_git(['clone', '-q', '--bare', work, str(bare)])
+        run_git(['config', 'uploadpack.allowFilter', 'true'], bare)
+    return {
+        'base_sha': base_sha,
+        'head_sha': head_sha,
+        'diff': diff,
+        'default_branch': 'main',
+    }
+
+
+def synthetic_comment(owner: str, repo: str, number: int, index: int,
+                      comment_id: int) -> dict:
+    """Review comment `index` of a PR, the same on every request; later
+    comments are newer"""
+    seed = number * 7919 + index
+    created_at = EPOCH + timedelta(days=number % 365, minutes=index * 7)
+    lines = '\n'.join(f'+    value_{seed}_{i} = compute(item, {i})'
+                      for i in range(1 + seed % 6))
+    return {
+        'id': comment_id,
+        'user': {
+            'login': BOT_LOGIN
+        },
+        'body': f'Consider validating `value_{seed}` in {repo}#{number} '
+        f'before it is used; suggestion {index} of this review.',
+        'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'updated_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'diff_hunk': f'@@ -{10 + seed % 90},3 +{10 + seed % 90},4 @@ '
+        f'def handler_{seed % 50}(request):\n{lines}',
+        'path': 'app.py',
+    }
+
+
+class MockGitHub:
+    """Synthetic GitHub state shared by all request handlers"""
+
+    def __init__(self,
+                 base_url: str,
+                 git_root: Path,
+                 user_login: str = 'bench-user',
+                 source_repos: tuple[str, ...] = ('bench-org/service', ),
+                 prs_per_repo: int = 10,
+                 comments_per_pr: int = 100,
+                 latency: float = 0.0,
+                 rate_limit: int = 0,
+                 rate_window: float = 60.0,
+                 comments_per_thread: int = 3):
+        self.base_url = base_url
+        self.git_root = git_root
+        self.user_login = user_login
+        self.prs_per_repo = prs_per_repo
+        self.comments_per_pr = comments_per_pr
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.comments_per_thread = comments_per_thread
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.window_used = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.repos: dict[str, dict] = {}
+        for full_name in source_repos:
+            owner, name = full_name.split('/')
+            self.repos[full_name] = create_source_repo(git_root, owner, name)
+        self.source = next(iter(self.repos.values()))
+        # Pull requests created through the API, by repository
+        self.created_prs: dict[str, list[dict]] = {}
+
+    def take_rate_limit(self) -> tuple[dict, bool]:
+        """Rate limit headers for one request and whether it is allowed"""
+        with self.lock:
+            self.requests += 1
+            now = time.time()
+            if now - self.window_start >= self.rate_window:
+                self.window_start = now
+                self.window_used = 0
+            reset = self.window_start + self.rate_window
+            if not self.rate_limit:
+                return {}, True
+            allowed = self.window_used < self.rate_limit
+            if allowed:
+                self.window_used += 1
+            headers = {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining':
+                str(self.rate_limit - self.window_used),
+                'X-RateLimit-Used': str(self.window_used),
+                'X-RateLimit-Reset': str(int(reset) + 1),
+                'X-RateLimit-Resource': 'core',
+            }
+            if not allowed:
+                headers['Retry-After'] = str(max(int(reset - now) + 1, 1))
+            return headers, allowed
+
+    def refund_rate_limit(self):
+        """Give back the request of a 304 answer"""
+        with self.lock:
+            self.not_modified += 1
+            if self.rate_limit and self.window_used:
+                self.window_used -= 1
+
+    def pull(self, full_name: str, number: int) -> dict | None:
+        created = self.created_prs.get(full_name)
+        if created is not None:
+            if not 1 <= number <= len(created):
+                return None
+            return created[number - 1]
+        if full_name not in self.repos or \
+                not 1 <= number <= self.prs_per_repo:
+            return None
+        repo = self.repos[full_name]
+        return self.pull_data(full_name, number, 'main', repo['base_sha'],
+                              f'feature-{number}', repo['head_sha'],
+                              f'Synthetic PR {number}')
+
+    def pull_data(self, full_name: str, number: int, base_ref: str,
+                  base_sha: str, head_ref: str, head_sha: str,
+                  title: str) -> dict:
+        created_at = EPOCH + timedelta(days=number % 365)
+        return {
+            'url': f'{self.base_url}/repos/{full_name}/pulls/{number}',
+            'html_url': f'https://github.com/{full_name}/pull/{number}',
+            'number': number,
+            'title': title,
+            'body': f'{title}\n\nChanges the request handling of handler_7.',
+            'state': 'closed' if number % 4 == 0 else 'open',
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'base': {
+                'ref': base_ref,
+                'sha': base_sha,
+                'repo': {
+                    'full_name': full_name,
+                    'default_branch': 'main'
+                },
+            },
+            'head': {
+                'ref': head_ref,
+                'sha': head_sha
+            },
+        }
+
+    def create_repo(self, name: str) -> dict:
+        full_name = f'{self.user_login}/{name}'
+        with self.lock:
+            if full_name not in self.created_prs:
+                bare = self.git_root / self.user_login / f'{name}.git'
+                bare.parent.mkdir(parents=True, exist_ok=True)
+                run_git(['init', '-q', '--bare', str(bare)])
+                self.created_prs[full_name] = []
+        return {'name': name, 'full_name': full_name, 'private': True}
+
+    def create_pull(self, full_name: str, body: dict) -> dict | None:
+        """The new pull request, None for an unknown repository; raises
+        ValueError when one is already open from the head branch"""
+        with self.lock:
+            created = self.created_prs.get(full_name)
+            if created is None:
+                return None
+            if any(pull['head']['ref'] == body['head'] for pull in created):
+                raise ValueError('A pull request already exists for '
+                                 f"{self.user_login}:{body['head']}.")
+            pull = self.pull_data(full_name,
+                                  len(created) + 1, body['base'],
+                                  self.source['base_sha'], body['head'],
+                                  self.source['head_sha'], body['title'])
+            created.append(pull)
+        return pull
+
+    def comments(self,
+                 full_name: str,
+                 number: int,
+                 page: int,
+                 per_page: int,
+                 since: str | None = None) -> tuple[list[dict], int]:
+        """A page of review comments updated at or after `since`, and the
+        number of such comments"""
+        owner, repo = full_name.split('/')
+        comments = [
+            synthetic_comment(owner, repo, number, index,
+                              number * 1_000_000 + index)
+            for index in range(self.comments_per_pr)
+        ]
+        if since:
+            comments = [c for c in comments if c['updated_at'] >= since]
+        first = (page - 1) * per_page
+        return comments[first:first + per_page], len(comments)
+
+    def thread_node(self, full_name: str, number: int, thread: int, start: int,
+                    first: int) -> dict:
+        """GraphQL review thread `thread` with comments from `start`"""
+        owner, repo = full_name.split('/')
+        indices = range(
+            thread * self.comments_per_thread,
+            min((thread + 1) * self.comments_per_thread, self.comments_per_pr))
+        page = indices[start:start + first]
+        nodes = []
+        for index in page:
+            comment = synthetic_comment(owner, repo, number, index,
+                                        number * 1_000_000 + index)
+            nodes.append({
+                'databaseId': comment['id'],
+                # GraphQL spells bot logins without the [bot] suffix
+                'author': {
+                    '__typename': 'Bot',
+                    'login': BOT_LOGIN.removesuffix('[bot]')
+                },
+                'body': comment['body'],
+                'createdAt': comment['created_at'],
+                'updatedAt': comment['updated_at'],
+                'diffHunk': comment['diff_hunk'],
+            })
+        end = start + len(page)
+        return {
+            'id': f'PRRT_{full_name}#{number}#{thread}',
+            'comments': {
+                'pageInfo': {
+                    'hasNextPage': end < len(indices),
+                    'endCursor': str(end)
+                },
+                'nodes': nodes,
+            },
+        }
+
+    def graphql(self, query: str) -> dict:
+        data: dict[str, dict] = {}
+        errors: list[dict] = []
+
+        def resolve(alias: str, owner: str, repo: str,
+                    number: str) -> dict | None:
+            pull = self.pull(f'{owner}/{repo}', int(number))
+            if pull is None:
+                data[alias] = {'pullRequest': None}
+                errors.append({
+                    'type':
+                    'NOT_FOUND',
+                    'path': [alias, 'pullRequest'],
+                    'message':
+                    'Could not resolve to a PullRequest with '
+                    f'the number of {number}.',
+                })
+            return pull
+
+        for alias, owner, repo, number in GRAPHQL_BODY.findall(query):
+            if pull := resolve(alias, owner, repo, number):
+                data[alias] = {'pullRequest': {'body': pull['body']}}
+        threads = -(-self.comments_per_pr // self.comments_per_thread)
+        for alias, owner, repo, number, first, after, comments_first in \
+                GRAPHQL_PULL.findall(query):
+            if not resolve(alias, owner, repo, number):
+                continue
+            start = int(after or 0)
+            end = min(start + int(first), threads)
+            data[alias] = {
+                'pullRequest': {
+                    'reviewThreads': {
+                        'pageInfo': {
+                            'hasNextPage': end < threads,
+                            'endCursor': str(end)
+                        },
+                        'nodes': [
+                            self.thread_node(f'{owner}/{repo}', int(number),
+                                             thread, 0, int(comments_first))
+                            for thread in range(start, end)
+                        ],
+                    },
+                }
+            }
+        for alias, thread_id, first, after in GRAPHQL_THREAD.findall(query):
+            full_name, number, thread = thread_id.removeprefix('PRRT_').split(
+                '#')
+            data[alias] = self.thread_node(full_name, int(number), int(thread),
+                                           int(after or 0), int(first))
+        return {'data': data, **({'errors': errors} if errors else {})}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock: MockGitHub
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self,
+                  payload: bytes,
+                  content_type: str,
+                  status: int = 200,
+                  headers: dict | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, data, status: int = 200, headers: dict | None = None):
+        payload = json.dumps(data).encode()
+        if self.command == 'GET' and status == 200:
+            etag = f'"{hashlib.sha1(payload).hexdigest()}"'
+            headers = {**(headers or {}), 'ETag': etag}
+            if self.headers.get('If-None-Match') == etag:
+                self.mock.refund_rate_limit()
+                self.send_response(304)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.send_body(payload, 'application/json', status, headers)
+
+    def not_found(self, headers: dict | None = None):
+        self.send_json({'message': 'Not Found'}, 404, headers)
+
+    def page_links(self,
+                   path: str,
+                   page: int,
+                   per_page: int,
+                   total: int,
+                   query: str = '') -> dict:
+        last = max((total + per_page - 1) // per_page, 1)
+        links = []
+        base = f'{self.mock.base_url}{path}?{query}per_page={per_page}'
+        if page < last:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+            links.append(f'<{base}&page={last}>; rel="last"')
+        return {'Link': ', '.join(links)} if links else {}
+
+    def begin(self) -> dict | None:
+        """Apply latency and rate limit; None when the request was
+        rejected"""
+        time.sleep(self.mock.latency)
+        headers, allowed = self.mock.take_rate_limit()
+        if not allowed:
+            self.read_body()
+            self.send_json(
+                {
+                    'message': 'API rate limit exceeded for user.',
+                    'documentation_url': 'https://docs.github.com/rest'
+                }, 403, headers)
+            return None
+        return headers
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_GET(self):
+        headers = self.begin()
+        if headers is None:
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        per_page = min(int(query.get('per_page', ['30'])[0]), 100)
+
+        if match := re.fullmatch(r'/raw/([^/]+/[^/]+)/pull/(\d+)\.diff',
+                                 url.path):
+            pull = self.mock.pull(match[1], int(match[2]))
+            if pull is None:
+                return self.not_found(headers)
+            return self.send_body(self.mock.source['diff'].encode(),
+                                  'text/plain', 200, headers)
+
+        match = re.fullmatch(
+            r'/repos/([^/]+/[^/]+)(/pulls(?:/(\d+))?'
+            r'(/comments)?)?', url.path)
+        if not match:
+            return self.not_found(headers)
+        full_name, pulls, number, comments = match.groups()
+        if full_name not in self.mock.repos and \
+                full_name not in self.mock.created_prs:
+            return self.not_found(headers)
+        if not pulls:
+            return self.send_json({'full_name': full_name}, 200, headers)
+        if number is None:
+            state = query.get('state', ['open'])[0]
+            head = query.get('head', [None])[0]
+            created = self.mock.created_prs.get(full_name)
+            count = self.mock.prs_per_repo if created is None \
+                else len(created)
+            listed = [
+                pull for pull in (self.mock.pull(full_name, n)
+                                  for n in range(1, count + 1))
+                if pull and (state == 'all' or pull['state'] == state) and (
+                    head is None or head.split(':')[-1] == pull['head']['ref'])
+            ]
+            first = (page - 1) * per_page
+            extra = urlencode({'state': state}) + '&'
+            headers.update(
+                self.page_links(url.path, page, per_page, len(listed), extra))
+            return self.send_json(listed[first:first + per_page], 200, headers)
+        pull = self.mock.pull(full_name, int(number))
+        if pull is None:
+            return self.not_found(headers)
+        if not comments:
+            return self.send_json(pull, 200, headers)
+        since = query.get('since', [None])[0]
+        page_comments, total = self.mock.comments(full_name, int(number), page,
+                                                  per_page, since)
+        extra = urlencode({'since': since}) + '&' if since else ''
+        headers.update(self.page_links(url.path, page, per_page, total, extra))
+        return self.send_json(page_comments, 200, headers)
+
+    def do_POST(self):
+        headers = self.begin()
+        if headers is None:
+            return
+        body = json.loads(self.read_body() or b'{}')
+        if self.path == '/graphql':
+            return self.send_json(self.mock.graphql(body['query']), 200,
+                                  headers)
+        if self.path == '/user/repos':
+            return self.send_json(self.mock.create_repo(body['name']), 201,
+                                  headers)
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)/pulls', self.path)
+        try:
+            pull = self.mock.create_pull(match[1], body) if match else None
+        except ValueError as e:
+            return self.send_json(
+                {
+                    'message': 'Validation Failed',
+                    'errors': [{
+                        'message': str(e)
+                    }]
+                }, 422, headers)
+        if pull is None:
+            return self.not_found(headers)
+        return self.send_json(pull, 201, headers)
+
+
+def make_server(port: int, git_root: str, **options) -> ThreadingHTTPServer:
+    """Server on 127.0.0.1:`port` (0 picks a free port); `options` are
+    passed to MockGitHub"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    server.RequestHandlerClass = type(
+        'MockHandler', (Handler, ), {
+            'mock': MockGitHub(base_url, Path(git_root), **options),
+        })
+    return server
+
+
+@click.command()
+@click.option("--port", type=int, default=8780, show_default=True)
+@click.option("--git_root",
+              type=str,
+              required=True,
+              help="Directory for the bare git repositories")
+@click.option("--prs_per_repo", type=int, default=10, show_default=True)
+@click.option("--comments_per_pr", type=int, default=100, show_default=True)
+@click.option("--latency",
+              type=float,
+              default=0.0,
+              show_default=True,
+              help="Seconds before each request is answered")
+@click.option("--rate_limit",
+              type=int,
+              default=0,
+              show_default=True,
+              help="Requests allowed per --rate_window (0 disables)")
+@click.option("--rate_window", type=float, default=60.0, show_default=True)
+@click.option("--comments_per_thread", type=int, default=3, show_default=True)
+def main(port, git_root, prs_per_repo, comments_per_pr, latency, rate_limit,
+         rate_window, comments_per_thread):
+    server = make_server(port,
+                         git_root,
+                         prs_per_repo=prs_per_repo,
+                         comments_per_pr=comments_per_pr,
+                         latency=latency,
+                         rate_limit=rate_limit,
+                         rate_window=rate_window,
+                         comments_per_thread=comments_per_thread)
+    print(f"Mock GitHub listening on http://127.0.0.1:{port}, "
+          f"git remotes under file://{Path(git_root).resolve()}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""Local stand-in for the OpenAI-compatible endpoints used by eval_prs.py
+
+Serves chat completions, streamed as server-sent events when asked to,
+plus the files and batches endpoints of the Batch API. Answers are
+synthesized from the `Suggestion Id` lines of the prompt.
+Point eval_prs.py at it with `OPENAI_BASE_URL=http://127.0.0.1:<port>/v1`
+(or GEMINI_BASE_URL when IS_GEMINI is set).
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+
+def answer_content(body: dict) -> str:
+    """JSON answer for a chat completion request of eval_prs.py"""
+    system_prompt = body['messages'][0]['content']
+    user_prompt = body['messages'][-1]['content']
+    ids = [int(i) for i in re.findall(r'Suggestion Id: (\d+)', user_prompt)]
+    items = []
+    for i in ids:
+        item: dict[str, object] = {'id': i}
+        if 'category' in system_prompt:
+            item['category'] = 'NITPICK'
+        if 'is_false_positive' in system_prompt:
+            item['is_false_positive'] = i % 2 == 0
+        if '- confidence:' in system_prompt:
+            # Every fourth item is uncertain, for the --cascade mode
+            item['confidence'] = 0.5 if i % 4 == 0 else 0.95
+        items.append(item)
+    if body.get('response_format', {}).get('type') == 'json_schema':
+        # Structured output wraps the items, see eval_prs.response_format
+        return json.dumps({'results': items})
+    return json.dumps(items)
+
+
+def completion(body: dict) -> dict:
+    content = answer_content(body)
+    prompt_tokens = sum(len(m['content']) for m in body['messages']) // 4
+    return {
+        'id':
+        f'chatcmpl-{uuid.uuid4().hex[:12]}',
+        'object':
+        'chat.completion',
+        'created':
+        int(time.time()),
+        'model':
+        body.get('model', 'mock'),
+        'choices': [{
+            'index': 0,
+            'finish_reason': 'stop',
+            'message': {
+                'role': 'assistant',
+                'content': content
+            },
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+def completion_chunks(body: dict, chunk_chars: int = 16) -> Iterator[dict]:
+    """chat.completion.chunk events of a streamed completion, cutting the
+    answer every `chunk_chars` characters so items span chunks"""
+    response = completion(body)
+    content = response['choices'][0]['message']['content']
+    chunk = {
+        'id': response['id'],
+        'object': 'chat.completion.chunk',
+        'created': response['created'],
+        'model': response['model'],
+    }
+    deltas = [{
+        'role': 'assistant',
+        'content': ''
+    }] + [{
+        'content': content[i:i + chunk_chars]
+    } for i in range(0, len(content), chunk_chars)]
+    for i, delta in enumerate(deltas):
+        yield {
+            **chunk,
+            'choices': [{
+                'index':
+                0,
+                'delta':
+                delta,
+                'finish_reason':
+                'stop' if i == len(deltas) - 1 else None,
+            }],
+        }
+    if (body.get('stream_options') or {}).get('include_usage'):
+        yield {**chunk, 'choices': [], 'usage': response['usage']}
+
+
+class MockOpenAI:
+    """In-memory files and batches, shared by all request handlers"""
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 batch_latency: float = 1.0,
+                 drop_rate: float = 0.0,
+                 requests_per_minute: int = 0,
+                 error_rate: float = 0.0):
+        self.latency = latency
+        self.batch_latency = batch_latency
+        self.drop_rate = drop_rate
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.window_start = time.time()
+        self.window_used = 0
+        self.completions = 0
+        self.streamed = 0
+        self.rejected = 0
+
+    def take_request(self) -> tuple[int, dict]:
+        """Status and headers for a chat completion: 200, or 429 once
+        `requests_per_minute` is used up, or a random 500"""
+        with self.lock:
+            self.completions += 1
+            now = time.time()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.window_used = 0
+            if self.requests_per_minute:
+                remaining = self.requests_per_minute - self.window_used
+                headers = {
+                    'x-ratelimit-limit-requests':
+                    str(self.requests_per_minute),
+                    'x-ratelimit-remaining-requests':
+                    str(max(remaining - 1, 0)),
+                }
+                if remaining <= 0:
+                    self.rejected += 1
+                    retry_after = int(self.window_start + 60 - now) + 1
+                    headers['retry-after'] = str(retry_after)
+                    return 429, headers
+            else:
+                headers = {}
+            self.window_used += 1
+            if random.random() < self.error_rate:
+                self.rejected += 1
+                return 500, headers
+            return 200, headers
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f'file-{uuid.uuid4().hex[:12]}'
+        with self.lock:
+            self.files[file_id] = content
+        return {
+            'id': file_id,
+            'object': 'file',
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': filename,
+            'purpose': purpose,
+            'status': 'processed',
+        }
+
+    def create_batch(self, body: dict) -> dict:
+        batch = {
+            'id': f'batch_{uuid.uuid4().hex[:12]}',
+            'object': 'batch',
+            'endpoint': body['endpoint'],
+            'input_file_id': body['input_file_id'],
+            'completion_window': body['completion_window'],
+            'status': 'in_progress',
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {
+                'total': 0,
+                'completed': 0,
+                'failed': 0
+            },
+        }
+        with self.lock:
+            self.batches[batch['id']] = batch
+        threading.Timer(self.batch_latency, self.run_batch,
+                        (batch['id'], )).start()
+        return batch
+
+    def run_batch(self, batch_id: str):
+        batch = self.batches[batch_id]
+        outputs, errors = [], []
+        for line in self.files[batch['input_file_id']].splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if random.random() < self.drop_rate:
+                errors.append({
+                    'id': f'batch_req_{uuid.uuid4().hex[:12]}',
+                    'custom_id': request['custom_id'],
+                    'response': None,
+                    'error': {
+                        'code': 'server_error',
+                        'message': 'Dropped by the mock'
+                    },
+                })
+                continue
+            outputs.append({
+                'id': f'batch_req_{uuid.uuid4().hex[:12]}',
+                'custom_id': request['custom_id'],
+                'response': {
+                    'status_code': 200,
+                    'body': completion(request['body'])
+                },
+                'error': None,
+            })
+        file_ids = {}
+        for key, records in (('output_file_id', outputs), ('error_file_id',
+                                                           errors)):
+            if records:
+                content = ''.join(json.dumps(r) + '\n' for r in records)
+                file_ids[key] = self.add_file(content.encode(),
+                                              f'{batch_id}_{key}.jsonl',
+                                              'batch_output')['id']
+        with self.lock:
+            batch.update(file_ids)
+            batch['request_counts'] = {
+                'total': len(outputs) + len(errors),
+                'completed': len(outputs),
+                'failed': len(errors),
+            }
+            batch['status'] = 'completed'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock: MockOpenAI
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self,
+                  data: dict,
+                  status: int = 200,
+                  headers: dict | None = None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_events(self, events: Iterator[dict], headers: dict):
+        """Server-sent events, one chunk of the chunked body each"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        data = [json.dumps(event) for event in events] + ['[DONE]']
+        for payload in data:
+            message = f'data: {payload}\n\n'.encode()
+            self.wfile.write(f'{len(message):x}\r\n'.encode() + message +
+                             b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        if self.path == '/v1/chat/completions':
+            body = json.loads(self.read_body())
+            time.sleep(self.mock.latency)
+            status, headers = self.mock.take_request()
+            if status != 200:
+                self.send_json(
+                    {
+                        'error': {
+                            'message':
+                            'Rate limit reached'
+                            if status == 429 else 'Mock server error',
+                            'type':
+                            'requests' if status == 429 else 'server_error',
+                        }
+                    }, status, headers)
+            elif body.get('stream'):
+                with self.mock.lock:
+                    self.mock.streamed += 1
+                self.send_events(completion_chunks(body), headers)
+            else:
+                self.send_json(completion(body), 200, headers)
+        elif self.path == '/v1/files':
+            header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n"
+            message = BytesParser(policy=HTTP).parsebytes(header.encode() +
+                                                          self.read_body())
+            fields = {
+                part.get_param('name', header='content-disposition'): part
+                for part in message.iter_parts()
+            }
+            content = fields['file'].get_payload(decode=True)
+            assert isinstance(content, bytes), "Multipart file expected"
+            self.send_json(
+                self.mock.add_file(
+                    content, fields['file'].get_filename() or 'upload.jsonl',
+                    fields['purpose'].get_content().strip()))
+        elif self.path == '/v1/batches':
+            self.send_json(self.mock.create_batch(json.loads(
+                self.read_body())))
+        else:
+            self.send_json({'error': {'message': 'Not found'}}, 404)
+
+    def do_GET(self):
+        match = re.fullmatch(r'/v1/(files|batches)/([\w-]+)(/content)?',
+                             self.path)
+        if match and match[1] == 'files' and match[3] and \
+                match[2] in self.mock.files:
+            content = self.mock.files[match[2]]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif match and match[1] == 'batches' and match[2] in self.mock.batches:
+            with self.mock.lock:
+                self.send_json(self.mock.batches[match[2]])
+        else:
+            self.send_json({'error': {'message': 'Not found'}}, 404)
+
+
+def make_server(port: int, **options) -> ThreadingHTTPServer:
+    """Server on 127.0.0.1:`port` (0 picks a free port); `options` are
+    passed to MockOpenAI"""
+    handler = type('MockHandler', (Handler, ), {
+        'mock': MockOpenAI(**options),
+    })
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+@click.command()
+@click.option("--port", type=int, default=8765, show_default=True)
+@click.option("--latency",
+              type=float,
+              default=0.0,
+              show_default=True,
+              help="Seconds before each chat completion is answered")
+@click.option("--batch_latency",
+              type=float,
+              default=1.0,
+              show_default=True,
+              help="Seconds before a submitted batch completes")
+@click.option("--drop_rate",
+              type=float,
+              default=0.0,
+              show_default=True,
+              help="Share of batch requests answered with an error")
+@click.option("--requests_per_minute",
+              type=int,
+              default=0,
+              show_default=True,
+              help="Chat completions allowed per minute before answering "
+              "429 with retry-after (0 disables)")
+@click.option("--error_rate",
+              type=float,
+              default=0.0,
+              show_default=True,
+              help="Share of chat completions answered with a 500")
+def main(port, latency, batch_latency, drop_rate, requests_per_minute,
+         error_rate):
+    server = make_server(port,
+                         latency=latency,
+                         batch_latency=batch_latency,
+                         drop_rate=drop_rate,
+                         requests_per_minute=requests_per_minute,
+                         error_rate=error_rate)
+    print(f"Mock OpenAI listening on http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
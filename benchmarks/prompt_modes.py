@@ -0,0 +1,117 @@
+"""Compare the two-pass and combined prompt modes of eval_prs.py
+
+Runs every batch of a fixture CSV through each --prompt_mode against the
+configured endpoint (see benchmarks/mock_openai.py for a local one) and
+reports latency, tokens and how often both modes agree. Run it from the
+repository root:
+
+    python -m benchmarks.prompt_modes --output prompt_modes.json
+"""
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+from eval_prs import PROMPT_MODES, QualityChecker
+from rate_limiter import estimate_tokens
+
+
+def run_mode(input_file: str, prompt_mode: str, batch_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        checker = QualityChecker(input_file,
+                                 str(Path(tmp_dir) / 'output.csv'),
+                                 use_cache=False,
+                                 dedup=False,
+                                 prompt_mode=prompt_mode)
+        rows = list(checker.get_rows())
+        batches = [
+            rows[i:i + batch_size] for i in range(0, len(rows), batch_size)
+        ]
+        latencies = []
+        verdicts = {}
+        estimated_prompt_tokens = 0
+        started = time.perf_counter()
+        for batch in batches:
+            for prompt_name in checker.prompt_names:
+                messages = checker.render_messages(prompt_name, batch)
+                estimated_prompt_tokens += estimate_tokens(''.join(
+                    m['content'] for m in messages))
+            batch_started = time.perf_counter()
+            results = checker.rate_suggestions_batch(batch)
+            latencies.append(time.perf_counter() - batch_started)
+            for row, result in zip(batch, results):
+                verdicts[row['original_row_number']] = result
+        wall_time = time.perf_counter() - started
+        checker.close()
+
+    return {
+        'rows': len(rows),
+        'requests': len(batches) * len(PROMPT_MODES[prompt_mode]),
+        'wall_time_s': round(wall_time, 3),
+        'batch_latency_s': {
+            'mean': round(statistics.mean(latencies), 3),
+            'max': round(max(latencies), 3),
+        } if latencies else {},
+        'estimated_prompt_tokens': estimated_prompt_tokens,
+        'token_usage': checker.metrics.summary()['models'],
+        'verdicts': verdicts,
+    }
+
+
+def agreement(first: dict, second: dict) -> dict:
+    """Share of rows on which both runs gave the same verdicts"""
+    common = first.keys() & second.keys()
+    if not common:
+        return {}
+
+    def share(field: str) -> float:
+        same = sum(first[n][field] == second[n][field] for n in common)
+        return round(same / len(common), 3)
+
+    return {
+        'category': share('category'),
+        'is_false_positive': share('is_false_positive'),
+    }
+
+
+@click.command()
+@click.option("--input_file",
+              type=str,
+              default='benchmarks/fixtures/comments.csv',
+              show_default=True,
+              help="CSV in the export_gh_comments_to_csv.py layout")
+@click.option("--batch_size", type=int, default=6, show_default=True)
+@click.option("--output",
+              type=str,
+              default=None,
+              help="Also write the JSON report to this file")
+def main(input_file, batch_size, output):
+    runs = {
+        mode: run_mode(input_file, mode, batch_size)
+        for mode in PROMPT_MODES
+    }
+    modes = {
+        mode: {
+            k: v
+            for k, v in run.items() if k != 'verdicts'
+        }
+        for mode, run in runs.items()
+    }
+    verdicts = [run['verdicts'] for run in runs.values()]
+    report = {
+        'input_file': input_file,
+        'batch_size': batch_size,
+        'modes': modes,
+        'agreement': agreement(*verdicts),
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
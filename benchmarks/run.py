@@ -0,0 +1,376 @@
+"""End-to-end benchmark of clone_prs.py, export_gh_comments_to_csv.py and
+eval_prs.py against local stand-ins for GitHub and the LLM endpoint
+
+The export runs once per backend: `export` over REST, `export_graphql`
+over GraphQL, which must produce the same rows. `export_incremental` then
+re-exports the unchanged corpus with --incremental, mostly answered 304.
+The evaluation also runs once more with --streaming (`eval_streaming`),
+which must produce the same rows as `eval`.
+
+Each stage runs as a subprocess, so wall time and peak RSS are measured
+per stage. Results go to a JSON file; pass an earlier one as --baseline
+to see the change per stage. Run it from the repository root:
+
+    python -m benchmarks.run --sizes 1000,10000,100000
+"""
+import csv
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+
+from benchmarks import mock_github, mock_openai
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+COMMENTS_PER_PR = 100
+
+
+def serve(server) -> str:
+    """Serve in a daemon thread, returning the base URL"""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def run_stage(name: str,
+              args: list[str],
+              cwd: Path,
+              env: dict,
+              log_dir: Path,
+              stdin: str = '') -> dict:
+    """Run one stage, returning its wall time and peak RSS"""
+    log_path = log_dir / f'{name}.log'
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(args,
+                                   cwd=cwd,
+                                   env=env,
+                                   stdin=subprocess.PIPE,
+                                   stdout=log,
+                                   stderr=subprocess.STDOUT,
+                                   text=True)
+        assert process.stdin is not None
+        process.stdin.write(stdin)
+        process.stdin.close()
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - started
+    if process.returncode != 0:
+        raise click.ClickException(
+            f"{name} exited with {process.returncode}, see {log_path}")
+    return {
+        'wall_time_s': round(wall_time, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def count_rows(path: Path) -> int:
+    with open(path, newline='') as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def bench_size(size: int, work_dir: Path, options: dict) -> dict:
+    """Run every stage on a synthetic dataset of `size` comments"""
+    work_dir.mkdir(parents=True)
+    prs = max((size + COMMENTS_PER_PR - 1) // COMMENTS_PER_PR, 1)
+    github = mock_github.make_server(
+        0,
+        str(work_dir / 'git'),
+        prs_per_repo=prs,
+        comments_per_pr=COMMENTS_PER_PR,
+        latency=options['github_latency'],
+        rate_limit=options['github_rate_limit'],
+    )
+    llm = mock_openai.make_server(0,
+                                  latency=options['llm_latency'],
+                                  requests_per_minute=options['llm_rpm'])
+    github_url = serve(github)
+    llm_url = serve(llm)
+    env = {
+        **os.environ,
+        'PYTHONUNBUFFERED': '1',
+        'GITHUB_API_URL': github_url,
+        'GITHUB_DIFF_URL': f'{github_url}/raw',
+        'GITHUB_GIT_URL': f'file://{work_dir / "git"}',
+        'GH_TOKEN': 'bench-token',
+        'GITHUB_USERNAME': 'bench-user',
+        'GITHUB_EMAIL': 'bench@example.com',
+        'GEMINI_TOKEN': 'bench-token',
+        'GEMINI_BASE_URL': f'{llm_url}/v1',
+        'LLM_REQUESTS_PER_MINUTE': '0',
+        'LLM_CONCURRENCY': str(options['concurrency']),
+        'LLM_CACHE_PATH': '',
+        'LLM_TRANSCRIPT_DIR': str(work_dir / 'llmlogs'),
+        'LLM_METRICS_INTERVAL': '0',
+        'GITHUB_CACHE_PATH': str(work_dir / 'github_cache.sqlite3'),
+    }
+    source_prs = [
+        f'https://github.com/bench-org/service/pull/{n}'
+        for n in range(1, prs + 1)
+    ]
+    stages = {}
+
+    def requests_of(server, counter: str) -> int:
+        return getattr(server.RequestHandlerClass.mock, counter)
+
+    # Clone a handful of PRs, as a user would before installing bots
+    clone_count = min(options['clone_prs'], prs)
+    (work_dir / 'clone_repos.json').write_text(
+        json.dumps({
+            'pr_urls': source_prs[:clone_count],
+            'duplicate_count': options['duplicate_count'],
+            'workers': options['clone_workers'],
+            'output_file': 'pr_records.csv',
+        }))
+    before = requests_of(github, 'requests')
+    clone_args = [sys.executable, str(REPO_ROOT / 'clone_prs.py')]
+    stages['clone'] = run_stage('clone', clone_args, work_dir, env, work_dir)
+    stages['clone']['rows'] = count_rows(work_dir / 'pr_records.csv')
+    stages['clone']['github_requests'] = requests_of(github,
+                                                     'requests') - before
+
+    # Export the review comments of every synthetic PR
+    # Named so the scripts' `.strip('.csv')` keeps the stem intact
+    export_input = work_dir / 'export_input.csv'
+    with open(export_input, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Original PR Link', 'Cloned PR Link'])
+        writer.writerows([url, url] for url in source_prs)
+    before = requests_of(github, 'requests')
+    export_args = [
+        sys.executable,
+        str(REPO_ROOT / 'export_gh_comments_to_csv.py'), '--file_path',
+        export_input.name
+    ]
+    stages['export'] = run_stage('export', export_args, work_dir, env,
+                                 work_dir)
+    comments_csv = work_dir / 'export_input_bot_comment_data.csv'
+    stages['export']['rows'] = count_rows(comments_csv)
+    stages['export']['github_requests'] = requests_of(github,
+                                                      'requests') - before
+
+    # The same export through the GraphQL backend
+    graphql_input = work_dir / 'export_input_graphql.csv'
+    shutil.copy(export_input, graphql_input)
+    before = requests_of(github, 'requests')
+    graphql_args = [
+        sys.executable,
+        str(REPO_ROOT / 'export_gh_comments_to_csv.py'), '--file_path',
+        graphql_input.name, '--backend', 'graphql'
+    ]
+    stages['export_graphql'] = run_stage('export_graphql', graphql_args,
+                                         work_dir, env, work_dir)
+    graphql_csv = work_dir / 'export_input_graphql_bot_comment_data.csv'
+    stages['export_graphql']['rows'] = count_rows(graphql_csv)
+    stages['export_graphql']['github_requests'] = requests_of(
+        github, 'requests') - before
+    stages['export_graphql']['same_rows_as_rest'] = \
+        graphql_csv.read_bytes() == comments_csv.read_bytes()
+
+    # Re-export the unchanged corpus; 304 answers cost no rate limit
+    before = requests_of(github, 'requests')
+    before_304 = requests_of(github, 'not_modified')
+    stages['export_incremental'] = run_stage('export_incremental',
+                                             export_args + ['--incremental'],
+                                             work_dir, env, work_dir)
+    stages['export_incremental']['rows'] = count_rows(comments_csv)
+    stages['export_incremental']['github_requests'] = requests_of(
+        github, 'requests') - before
+    stages['export_incremental']['not_modified'] = requests_of(
+        github, 'not_modified') - before_304
+
+    # Evaluate the exported comments
+    def eval_args(input_csv: Path) -> list[str]:
+        return [
+            sys.executable, 'eval_prs.py', '--input_file',
+            str(input_csv), '--batch_size',
+            str(options['batch_size']), '--no_cache', '--concurrency',
+            str(options['concurrency'])
+        ]
+
+    stages['eval'] = run_stage('eval',
+                               eval_args(comments_csv),
+                               REPO_ROOT,
+                               env,
+                               work_dir,
+                               stdin='y\n')
+    output_csv = work_dir / 'export_input_bot_comment_data.output.csv'
+    stages['eval']['rows'] = count_rows(output_csv)
+    stages['eval']['llm_requests'] = requests_of(llm, 'completions')
+
+    # The same evaluation over streamed structured output
+    streaming_input = work_dir / 'export_input_bot_comment_data_streaming.csv'
+    shutil.copy(comments_csv, streaming_input)
+    before = requests_of(llm, 'completions')
+    stages['eval_streaming'] = run_stage('eval_streaming',
+                                         eval_args(streaming_input) +
+                                         ['--streaming'],
+                                         REPO_ROOT,
+                                         env,
+                                         work_dir,
+                                         stdin='y\n')
+    streaming_csv = work_dir / \
+        'export_input_bot_comment_data_streaming.output.csv'
+    stages['eval_streaming']['rows'] = count_rows(streaming_csv)
+    stages['eval_streaming']['llm_requests'] = requests_of(
+        llm, 'completions') - before
+    stages['eval_streaming']['llm_streamed_requests'] = requests_of(
+        llm, 'streamed')
+    stages['eval_streaming']['same_rows_as_eval'] = \
+        streaming_csv.read_bytes() == output_csv.read_bytes()
+
+    for name, csv_path in (('eval', output_csv), ('eval_streaming',
+                                                  streaming_csv)):
+        metrics_file = csv_path.with_suffix('.metrics.json')
+        if metrics_file.exists():
+            metrics = json.loads(metrics_file.read_text())
+            stages[name]['llm_latency_s'] = metrics['latency_s']['all']
+
+    github.shutdown()
+    llm.shutdown()
+    for stage in stages.values():
+        stage['rows_per_s'] = round(stage['rows'] / stage['wall_time_s'], 1)
+    # A pipeline run exports once
+    pipeline = [stages[name] for name in ('clone', 'export', 'eval')]
+    total_time = sum(stage['wall_time_s'] for stage in pipeline)
+    return {
+        'size': size,
+        'stages': stages,
+        'end_to_end': {
+            'wall_time_s': round(total_time, 3),
+            'comments_per_s': round(size / total_time, 1),
+            'peak_rss_mb': max(stage['peak_rss_mb'] for stage in pipeline),
+        },
+    }
+
+
+def compare(results: list[dict], baseline: dict):
+    """Print each stage's wall time against the baseline run"""
+    previous = {
+        (r['size'], name): stage['wall_time_s']
+        for r in baseline['results']
+        for name, stage in r['stages'].items()
+    }
+    for result in results:
+        for name, stage in result['stages'].items():
+            before = previous.get((result['size'], name))
+            if not before:
+                continue
+            change = (stage['wall_time_s'] - before) / before * 100
+            flag = "  <-- slower" if change > 10 else ""
+            print(f"{result['size']:>7} {name:<18} {before:>9.2f}s -> "
+                  f"{stage['wall_time_s']:>9.2f}s ({change:+.1f}%){flag}")
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                            cwd=REPO_ROOT,
+                            capture_output=True,
+                            text=True)
+    return result.stdout.strip() or None
+
+
+@click.command()
+@click.option("--sizes",
+              type=str,
+              default='1000,10000,100000',
+              show_default=True,
+              help="Comma separated dataset sizes, in review comments")
+@click.option("--batch_size", type=int, default=20, show_default=True)
+@click.option("--concurrency", type=int, default=4, show_default=True)
+@click.option("--clone_prs",
+              type=int,
+              default=5,
+              show_default=True,
+              help="PRs cloned by the clone stage")
+@click.option("--duplicate_count", type=int, default=2, show_default=True)
+@click.option("--clone_workers",
+              type=int,
+              default=1,
+              show_default=True,
+              help="Worker processes of the clone stage")
+@click.option("--github_latency", type=float, default=0.0, show_default=True)
+@click.option("--github_rate_limit",
+              type=int,
+              default=0,
+              show_default=True,
+              help="Mock GitHub requests per minute (0 disables)")
+@click.option("--llm_latency", type=float, default=0.0, show_default=True)
+@click.option("--llm_rpm",
+              type=int,
+              default=0,
+              show_default=True,
+              help="Mock LLM requests per minute (0 disables)")
+@click.option("--output",
+              type=str,
+              default=None,
+              help="Result file (default benchmarks/results/<time>.json)")
+@click.option("--baseline",
+              type=str,
+              default=None,
+              help="Earlier result file to compare against")
+@click.option("--keep_work_dir",
+              is_flag=True,
+              help="Keep the generated data and stage logs")
+def main(sizes, batch_size, concurrency, clone_prs, duplicate_count,
+         clone_workers, github_latency, github_rate_limit, llm_latency,
+         llm_rpm, output, baseline, keep_work_dir):
+    options = {
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'clone_prs': clone_prs,
+        'duplicate_count': duplicate_count,
+        'clone_workers': clone_workers,
+        'github_latency': github_latency,
+        'github_rate_limit': github_rate_limit,
+        'llm_latency': llm_latency,
+        'llm_rpm': llm_rpm,
+    }
+    started_at = datetime.now(timezone.utc)
+    work_root = Path(tempfile.mkdtemp(prefix='pr-bench-'))
+    results = []
+    try:
+        for size in [int(s) for s in sizes.split(',')]:
+            print(f"Benchmarking {size} comments...")
+            result = bench_size(size, work_root / f'size-{size}', options)
+            for name, stage in result['stages'].items():
+                print(f"  {name:<18} {stage['wall_time_s']:>9.2f}s "
+                      f"{stage['peak_rss_mb']:>8.1f} MB "
+                      f"{stage['rows_per_s']:>10.1f} rows/s")
+            results.append(result)
+    finally:
+        if keep_work_dir:
+            print(f"Work files kept in {work_root}")
+        else:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    report = {
+        'started_at': started_at.isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'results': results,
+    }
+    output_path = Path(output) if output else \
+        REPO_ROOT / 'benchmarks' / 'results' / \
+        f"{started_at.strftime('%Y%m%dT%H%M%SZ')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(report, indent=2) + '\n')
+    print(f"Results written to {output_path}")
+    if baseline:
+        compare(results, json.loads(Path(baseline).read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+
+class CloneJournal:
+    """Progress of cloning one PR, saved after every stage so a rerun
+    resumes where the last run stopped.
+
+    The stages are: details fetched, with the branch names chosen for
+    them; base and head branches pushed; then each duplicate PR created.
+    The commit time is fixed with the details, so rebuilt commits and the
+    branches pushed from them stay identical across runs.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        state = json.loads(self.path.read_text()) \
+            if self.path.exists() else {}
+        self.details: dict | None = state.get('details')
+        self.base_branch: str | None = state.get('base_branch')
+        self.head_branches: list[str] = state.get('head_branches', [])
+        self.commit_time: int | None = state.get('commit_time')
+        self.pushed: bool = state.get('pushed', False)
+        # Created PR URL by head branch
+        self.pr_urls: dict[str, str] = state.get('pr_urls', {})
+
+    @classmethod
+    def for_pr(cls, journal_dir: str | Path, pr_url: str) -> 'CloneJournal':
+        name = re.sub(r'[^\w.-]+', '_', pr_url.split('github.com/')[-1])
+        return cls(Path(journal_dir) / f'{name}.json')
+
+    def start(self, details: dict, base_branch: str, head_branches: list[str]):
+        self.details = details
+        self.base_branch = base_branch
+        self.head_branches = head_branches
+        self.commit_time = int(time.time())
+        self.save()
+
+    def mark_pushed(self):
+        self.pushed = True
+        self.save()
+
+    def record_pr(self, head_branch: str, pr_url: str):
+        self.pr_urls[head_branch] = pr_url
+        self.save()
+
+    def save(self):
+        state = {
+            'details': self.details,
+            'base_branch': self.base_branch,
+            'head_branches': self.head_branches,
+            'commit_time': self.commit_time,
+            'pushed': self.pushed,
+            'pr_urls': self.pr_urls,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.path)
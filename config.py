@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -14,3 +15,109 @@ OPENAI_TOKEN = os.getenv("OPENAI_TOKEN")
 GITHUB_TOKEN = os.getenv('GH_TOKEN')
 GITHUB_USERNAME = os.getenv('GITHUB_USERNAME')
 GITHUB_EMAIL = os.getenv('GITHUB_EMAIL')
+# GitHub endpoints, overridable to point the scripts at a local stand-in
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+GITHUB_DIFF_URL = os.getenv('GITHUB_DIFF_URL',
+                            'https://patch-diff.githubusercontent.com/raw')
+GITHUB_GRAPHQL_URL = os.getenv('GITHUB_GRAPHQL_URL',
+                               f'{GITHUB_API_URL}/graphql')
+# Base of git remote URLs, e.g. file:///srv/git for local bare repos
+GITHUB_GIT_URL = os.getenv('GITHUB_GIT_URL', 'https://github.com')
+# Concurrent GitHub API requests of export_gh_comments_to_csv.py
+GITHUB_CONCURRENCY = int(os.getenv('GITHUB_CONCURRENCY', '8'))
+GITHUB_MAX_RETRIES = int(os.getenv('GITHUB_MAX_RETRIES', '5'))
+# Pull requests per GraphQL query of the export's --backend graphql
+GITHUB_GRAPHQL_BATCH_SIZE = int(os.getenv('GITHUB_GRAPHQL_BATCH_SIZE', '25'))
+# Requests left in the rate limit window at which the scripts pause
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '10'))
+# ETag cache of GitHub GET responses, whose 304 answers cost no rate limit
+GITHUB_CACHE_PATH = os.getenv('GITHUB_CACHE_PATH',
+                              'llmlogs/github_cache.sqlite3')
+GITHUB_CACHE_MAX_ENTRIES = int(os.getenv('GITHUB_CACHE_MAX_ENTRIES', '100000'))
+# PRs clone_prs.py clones in parallel, one worker process and git worktree
+# each; "workers" in clone_repos.json overrides it
+CLONE_WORKERS = int(os.getenv('CLONE_WORKERS', '1'))
+# Blobless bare mirrors of the upstream repos, kept between runs
+CLONE_CACHE_DIR = os.getenv('CLONE_CACHE_DIR', 'tmp/mirrors')
+
+# LLM throughput budget for eval_prs.py (0 disables a limit)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "20"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "1"))
+
+# LLM endpoints eval_prs.py routes requests across, a JSON list of
+# {"name", "base_url", "api_key" or "api_key_env", "model", "weight",
+#  "requests_per_minute", "tokens_per_minute", "burst"}, where "burst"
+# (default 1) is how many requests may be sent back to back. Defaults to
+# the single Gemini or OpenAI endpoint above with the throughput budget
+# above.
+LLM_PROVIDERS = json.loads(os.getenv(
+    "LLM_PROVIDERS", "[]")) or [{
+        "name": "gemini" if IS_GEMINI else "openai",
+        "base_url": GEMINI_BASE_URL if IS_GEMINI else None,
+        "api_key": GEMINI_TOKEN if IS_GEMINI else OPENAI_TOKEN,
+        "model": "gemini-2.0-flash" if IS_GEMINI else "o3-mini",
+        "requests_per_minute": LLM_REQUESTS_PER_MINUTE,
+        "tokens_per_minute": LLM_TOKENS_PER_MINUTE,
+    }]
+# "least_loaded" or "weighted"
+LLM_ROUTING = os.getenv("LLM_ROUTING", "least_loaded")
+
+# Model cascade of eval_prs.py --cascade: the fast model answers first with
+# a confidence, suggestions below LLM_CASCADE_MIN_CONFIDENCE or with
+# conflicting verdicts are re-evaluated by the strong model. Both models
+# must be served by LLM_PROVIDERS; they default to the first and the last
+# model LLM_PROVIDERS lists.
+LLM_CASCADE_FAST_MODEL = os.getenv("LLM_CASCADE_FAST_MODEL",
+                                   LLM_PROVIDERS[0]["model"])
+LLM_CASCADE_STRONG_MODEL = os.getenv("LLM_CASCADE_STRONG_MODEL",
+                                     LLM_PROVIDERS[-1]["model"])
+LLM_CASCADE_MIN_CONFIDENCE = float(
+    os.getenv("LLM_CASCADE_MIN_CONFIDENCE", "0.8"))
+
+# Persistent LLM response cache (empty path disables it)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llmlogs/llm_cache.sqlite3")
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+
+# Batch packing limits per LLM request (0 disables a limit)
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "0"))
+LLM_OUTPUT_TOKEN_CAP = int(os.getenv("LLM_OUTPUT_TOKEN_CAP", "8000"))
+# Rows held by one batch, including those reusing an earlier verdict, so
+# duplicated input is committed as it streams instead of piling up
+LLM_BATCH_MAX_ROWS = int(os.getenv("LLM_BATCH_MAX_ROWS", "1000"))
+# Diff hunks above this many estimated tokens are compacted (0 disables),
+# keeping LLM_DIFF_CONTEXT_LINES of context around changes
+LLM_DIFF_TOKEN_BUDGET = int(os.getenv("LLM_DIFF_TOKEN_BUDGET", "0"))
+LLM_DIFF_CONTEXT_LINES = int(os.getenv("LLM_DIFF_CONTEXT_LINES", "3"))
+
+# Results backend for eval_prs.py: "csv" or "sqlite"
+RESULTS_BACKEND = os.getenv("RESULTS_BACKEND", "csv")
+
+# Failure recovery for LLM calls
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+# Attempts per set of ids before it is split in half
+LLM_BATCH_ATTEMPTS = int(os.getenv("LLM_BATCH_ATTEMPTS", "2"))
+
+# Offline Batch API mode of eval_prs.py
+LLM_BATCH_API_MAX_REQUESTS = int(
+    os.getenv("LLM_BATCH_API_MAX_REQUESTS", "50000"))
+LLM_BATCH_API_POLL_SECONDS = float(
+    os.getenv("LLM_BATCH_API_POLL_SECONDS", "60"))
+
+# Compressed JSONL transcript of LLM calls (empty dir disables it)
+LLM_TRANSCRIPT_DIR = os.getenv("LLM_TRANSCRIPT_DIR", "llmlogs")
+# Uncompressed bytes per transcript file before rotating
+LLM_TRANSCRIPT_MAX_BYTES = int(
+    os.getenv("LLM_TRANSCRIPT_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Run metrics of eval_prs.py, exported every LLM_METRICS_INTERVAL seconds
+LLM_METRICS_INTERVAL = float(os.getenv("LLM_METRICS_INTERVAL", "60"))
+# Optional Prometheus textfile (node_exporter textfile collector)
+LLM_METRICS_PROMETHEUS_FILE = os.getenv("LLM_METRICS_PROMETHEUS_FILE", "")
+# USD per million (prompt, completion) tokens, by model
+LLM_PRICES = json.loads(
+    os.getenv("LLM_PRICES", '{"gemini-2.0-flash": [0.10, 0.40], '
+              '"o3-mini": [1.10, 4.40]}'))
@@ -0,0 +1,96 @@
+import hashlib
+import re
+import zlib
+
+# Mersenne prime used for the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+Signature = tuple[int, ...]
+
+
+def normalize_suggestion(text: str) -> str:
+    """Lowercase, drop markdown/punctuation noise and collapse whitespace"""
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+def exact_key(suggestion: str, diff_hunk: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(suggestion.strip().encode())
+    digest.update(b'\0')
+    digest.update(diff_hunk.strip().encode())
+    return digest.hexdigest()
+
+
+class MinHashLSH:
+    """Near-duplicate index over normalized suggestion text.
+
+    Only suggestions on the same diff hunk can collide. Candidates found via
+    LSH banding are confirmed by estimated Jaccard similarity >= threshold.
+    """
+
+    def __init__(self,
+                 threshold: float,
+                 num_perm: int = 64,
+                 bands: int = 16,
+                 shingle_size: int = 3):
+        assert num_perm % bands == 0, "num_perm must be divisible by bands"
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        # Fixed seeds keep signatures stable across runs
+        self.permutations = [(1 + 2 * i * 0x9E3779B1 % _PRIME,
+                              i * 0x7F4A7C15 % _PRIME)
+                             for i in range(1, num_perm + 1)]
+        self.buckets: dict[tuple, list[str]] = {}
+        self.signatures: dict[str, Signature] = {}
+
+    def signature(self, text: str) -> Signature:
+        words = normalize_suggestion(text).split()
+        size = min(self.shingle_size, len(words)) or 1
+        hashes = {
+            zlib.crc32(' '.join(words[i:i + size]).encode())
+            for i in range(max(len(words) - size + 1, 1))
+        }
+        return tuple(
+            min((a * h + b) % _PRIME for h in hashes)
+            for a, b in self.permutations)
+
+    def similarity(self, sig_a: Signature, sig_b: Signature) -> float:
+        return sum(a == b for a, b in zip(sig_a, sig_b)) / self.num_perm
+
+    def find_or_add(self, key: str, text: str, diff_hunk: str) -> str:
+        """Return the key of a near-duplicate already indexed, else `key`"""
+        sig = self.signature(text)
+        diff_id = hashlib.sha256(diff_hunk.strip().encode()).hexdigest()
+        band_keys = [(diff_id, b,
+                      sig[b * self.rows_per_band:(b + 1) * self.rows_per_band])
+                     for b in range(self.bands)]
+        for band_key in band_keys:
+            for candidate in self.buckets.get(band_key, []):
+                if self.similarity(sig,
+                                   self.signatures[candidate]) >= \
+                        self.threshold:
+                    return candidate
+        self.signatures[key] = sig
+        for band_key in band_keys:
+            self.buckets.setdefault(band_key, []).append(key)
+        return key
+
+
+class SuggestionDeduplicator:
+    """Maps each (suggestion, diff hunk) pair to the key it is judged by"""
+
+    def __init__(self, near_dup_threshold: float = 0.0):
+        self.lsh = MinHashLSH(near_dup_threshold) \
+            if near_dup_threshold else None
+        self.known: dict[str, str] = {}
+
+    def key(self, suggestion: str, diff_hunk: str) -> str:
+        key = exact_key(suggestion, diff_hunk)
+        if key not in self.known:
+            self.known[key] = self.lsh.find_or_add(
+                key, suggestion, diff_hunk) if self.lsh else key
+        return self.known[key]
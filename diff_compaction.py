@@ -0,0 +1,72 @@
+from rate_limiter import estimate_tokens
+
+# A kept line, or an elision marker, with the hunk lines it stands for
+KeptLine = tuple[str, int]
+
+
+def _marker(count: int, kind: str) -> str:
+    return f"... [{count} {kind} lines elided] ..."
+
+
+class DiffCompactor:
+    """Shrinks GitHub `diff_hunk`s that exceed `token_budget`.
+
+    A review comment's hunk ends at the commented line, so the tail is
+    what matters most. Over budget, unchanged context further than
+    `context_lines` from a change or from the tail is collapsed; if the
+    hunk is still too large, the lines furthest from the tail are dropped.
+    Every gap is replaced by an explicit elision marker and the `@@` header
+    is kept. A budget of 0 disables compaction.
+    """
+
+    def __init__(self, token_budget: int = 0, context_lines: int = 3):
+        self.token_budget = token_budget
+        self.context_lines = context_lines
+
+    def __call__(self, hunk: str) -> str:
+        if not self.token_budget or \
+                estimate_tokens(hunk) <= self.token_budget:
+            return hunk
+        lines = hunk.splitlines()
+        header = [lines.pop(0)] if lines and lines[0].startswith('@@') \
+            else []
+        kept = self._collapse_context(lines)
+        return '\n'.join(header + self._cap(header, kept))
+
+    def _collapse_context(self, lines: list[str]) -> list[KeptLine]:
+        """Lines with context far from changes replaced by markers"""
+        keep = [False] * len(lines)
+        tail_start = max(len(lines) - self.context_lines - 1, 0)
+        for i, line in enumerate(lines):
+            if i >= tail_start or line[:1] in ('+', '-'):
+                start = max(i - self.context_lines, 0)
+                end = min(i + self.context_lines + 1, len(lines))
+                keep[start:end] = [True] * (end - start)
+        kept: list[KeptLine] = []
+        dropped = 0
+        for line, is_kept in zip(lines, keep):
+            if not is_kept:
+                dropped += 1
+                continue
+            if dropped:
+                kept.append((_marker(dropped, 'unchanged'), dropped))
+                dropped = 0
+            kept.append((line, 1))
+        return kept
+
+    def _cap(self, header: list[str], kept: list[KeptLine]) -> list[str]:
+        """Keep the longest tail that fits the budget, at least one line"""
+        budget = self.token_budget - estimate_tokens(
+            _marker(len(kept), 'earlier'))
+        for line in header:
+            budget -= estimate_tokens(line)
+        start = len(kept)
+        while start > 0:
+            tokens = estimate_tokens(kept[start - 1][0] + '\n')
+            if start < len(kept) and tokens > budget:
+                break
+            budget -= tokens
+            start -= 1
+        elided = sum(count for _, count in kept[:start])
+        tail = [line for line, _ in kept[start:]]
+        return [_marker(elided, 'earlier')] + tail if elided else tail
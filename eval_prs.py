@@ -1,46 +1,301 @@
-import csv
+import functools
+import itertools
 import json
+import random
 import signal
 import time
-from datetime import datetime
+import uuid
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from pathlib import Path
+from typing import Any
 
+import click
+import httpx
 from dateutil import parser
-from jinja2 import Template
-from openai import OpenAI
+from jinja2 import Environment, FileSystemLoader, Template
+from openai import (APIConnectionError, APIError, InternalServerError,
+                    RateLimitError)
 
-from config import GEMINI_BASE_URL, GEMINI_TOKEN, IS_GEMINI, OPENAI_TOKEN
+from batch_api import BatchApiRunner
+from batch_packer import Batch, BatchPacker
+from config import (
+    LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_BATCH_ATTEMPTS, LLM_BATCH_MAX_ROWS,
+    LLM_BATCH_TOKEN_BUDGET, LLM_CACHE_MAX_AGE_DAYS, LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH, LLM_CASCADE_FAST_MODEL, LLM_CASCADE_MIN_CONFIDENCE,
+    LLM_CASCADE_STRONG_MODEL, LLM_CONCURRENCY, LLM_DIFF_CONTEXT_LINES,
+    LLM_DIFF_TOKEN_BUDGET, LLM_MAX_RETRIES, LLM_METRICS_INTERVAL,
+    LLM_METRICS_PROMETHEUS_FILE, LLM_OUTPUT_TOKEN_CAP, LLM_PRICES,
+    LLM_PROVIDERS, LLM_ROUTING, LLM_TRANSCRIPT_DIR, LLM_TRANSCRIPT_MAX_BYTES,
+    RESULTS_BACKEND)
+from dedup import SuggestionDeduplicator
+from diff_compaction import DiffCompactor
+from json_stream import JsonArrayItemParser, parse_llm_json
+from llm_cache import LLMCache
+from metrics import MetricsExporter, RunMetrics
+from provider_pool import Provider, ProviderPool, load_providers
+from rate_limiter import estimate_tokens
+from results_store import (RESULT_FIELDNAMES, SqliteResultsStore,
+                           open_results_store)
+from tables import is_parquet, iter_table_rows, table_columns
+from transcript import TranscriptWriter
+
+
+def parse_date(value: str) -> date:
+    """Date part of a comment timestamp, ISO fast path first"""
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return parser.parse(value).date()
+
+
+@functools.cache
+def load_template(name: str) -> Template:
+    """`prompts/<name>.jinja`, which may include the shared definitions
+    of `prompts/partials/`"""
+    environment = Environment(loader=FileSystemLoader('prompts'))
+    return environment.get_template(f'{name}.jinja')
+
+
+def render_prompt(name: str, render_args: dict) -> str:
+    return load_template(name).render(render_args)
+
+
+@functools.cache
+def render_system_prompt(prompt_name: str, confidence: bool = False) -> str:
+    """Static system prompt, identical across batches so providers can
+    cache the prefix. `confidence` also asks for a confidence per item."""
+    return load_template(f'{prompt_name}_system').render(confidence=confidence)
+
+
+def build_messages(system_prompt: str, user_prompt: str) -> list[dict]:
+    return [{
+        "role": "system",
+        "content": system_prompt
+    }, {
+        "role": "user",
+        "content": user_prompt
+    }]
+
+
+def to_suggestions(rows: list[dict]) -> list[dict]:
+    """Template input for a batch; ids are positions in `rows`"""
+    return [{
+        'id': i,
+        'suggestion': d['Suggestion'],
+        'code_diff': d['compact_diff'],
+        'row_number': d.get('original_row_number'),
+    } for i, d in enumerate(rows)]
+
+
+CATEGORIES = {
+    'CRITICAL_BUG', 'NITPICK', 'REFACTORING', 'VALIDATION',
+    'PERFORMANCE_OPTIMIZATION'
+}
+
+
+def is_confidence(value) -> bool:
+    return isinstance(value, (int, float)) and \
+        not isinstance(value, bool) and 0 <= value <= 1
+
+
+# Validator and JSON schema of each verdict field of the answer items
+RESULT_FIELDS: dict[str, tuple[Callable[[object], bool], dict]] = {
+    'category': (lambda v: v in CATEGORIES, {
+        'type': 'string',
+        'enum': sorted(CATEGORIES)
+    }),
+    'is_false_positive': (lambda v: isinstance(v, bool), {
+        'type': 'boolean'
+    }),
+    'confidence': (is_confidence, {
+        'type': 'number'
+    }),
+}
+
+# Verdict fields answered by each prompt
+PROMPT_RESULT_FIELDS: dict[str, list[str]] = {
+    'categorization': ['category'],
+    'false_positive': ['is_false_positive'],
+    'combined': ['category', 'is_false_positive'],
+}
+
+
+def prompt_fields(prompt_name: str, confidence: bool = False) -> list[str]:
+    """Fields of each answer item, with the cascade's confidence"""
+    result_fields = PROMPT_RESULT_FIELDS[prompt_name]
+    return [*result_fields, 'confidence'] if confidence else result_fields
+
+
+# Prompts sent for every batch in each --prompt_mode
+PROMPT_MODES: dict[str, list[str]] = {
+    'two_pass': ['categorization', 'false_positive'],
+    'combined': ['combined'],
+}
+
+# (provider, model) that answered a prompt
+Source = tuple[str, str]
+# Receives each answer item as soon as it is parsed
+OnItem = Callable[[dict, Source], None]
+
+
+def merge_verdicts(verdicts: list[dict[int, dict]], _id: int) -> dict:
+    """One suggestion's verdict across prompts; dict values such as the
+    sources and confidences by prompt are merged"""
+    result: dict = {}
+    for prompt_verdicts in verdicts:
+        for key, value in prompt_verdicts.get(_id, {}).items():
+            if isinstance(value, dict):
+                result.setdefault(key, {}).update(value)
+            else:
+                result[key] = value
+    return result
+
+
+def escalation_reason(result: dict, min_confidence: float) -> str | None:
+    """Why the cascade sends a fast-model verdict to the strong model"""
+    if 'category' not in result or 'is_false_positive' not in result:
+        return 'missing'
+    if min(result.get('confidence', {}).values(), default=0) < min_confidence:
+        return 'low_confidence'
+    # A critical bug that is not there is a contradiction
+    if result['category'] == 'CRITICAL_BUG' and result['is_false_positive']:
+        return 'disagreement'
+    return None
+
+
+def cascade_error(models: list[str]) -> str | None:
+    """Why the cascade cannot run on providers serving `models`"""
+    missing = {LLM_CASCADE_FAST_MODEL, LLM_CASCADE_STRONG_MODEL} - set(models)
+    if missing:
+        return ("No LLM provider serves the cascade model(s) "
+                f"{', '.join(sorted(missing))}, set LLM_CASCADE_FAST_MODEL "
+                "and LLM_CASCADE_STRONG_MODEL to models of LLM_PROVIDERS")
+    if LLM_CASCADE_FAST_MODEL == LLM_CASCADE_STRONG_MODEL:
+        return (f"The cascade needs two models, {LLM_CASCADE_FAST_MODEL} "
+                "is both the fast and the strong one")
+    return None
+
+
+def source_fields(sources: dict[str, Source]) -> dict:
+    """Provider and model columns from the (provider, model) that
+    answered each prompt, in prompt name order"""
+    answered = [sources[name] for name in sorted(sources)]
+    return {
+        'provider': ','.join(dict.fromkeys(p for p, _ in answered)),
+        'model': ','.join(dict.fromkeys(m for _, m in answered)),
+    }
+
+
+def response_format(prompt_name: str, confidence: bool = False) -> dict:
+    """Structured output schema: {"results": [{"id": .., <field>: ..}]}"""
+    result_fields = prompt_fields(prompt_name, confidence)
+    item_schema = {
+        'type': 'object',
+        'properties': {
+            'id': {
+                'type': 'integer'
+            },
+            **{
+                f: RESULT_FIELDS[f][1]
+                for f in result_fields
+            },
+        },
+        'required': ['id', *result_fields],
+        'additionalProperties': False,
+    }
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': f'{prompt_name}_results',
+            'strict': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'results': {
+                        'type': 'array',
+                        'items': item_schema
+                    }
+                },
+                'required': ['results'],
+                'additionalProperties': False,
+            },
+        },
+    }
 
 
 class QualityChecker:
 
-    def __init__(self, input_file: str, output_file: str):
+    def __init__(self,
+                 input_file: str,
+                 output_file: str,
+                 concurrency: int = LLM_CONCURRENCY,
+                 use_cache: bool = True,
+                 dedup: bool = True,
+                 near_dup_threshold: float = 0.0,
+                 results_backend: str = RESULTS_BACKEND,
+                 streaming: bool = False,
+                 prompt_mode: str = 'two_pass',
+                 cascade: bool = False,
+                 diff_token_budget: int = LLM_DIFF_TOKEN_BUDGET):
         self.input_file = input_file
         self.output_file = output_file
-        self.processed_rows: set[int] = set()
+        self.input_fieldnames: list[str] = []
+        # Verdicts by dedup key, reused for identical suggestions
+        self.verdicts: dict[str, dict] = {}
+        self.deduplicator = SuggestionDeduplicator(
+            near_dup_threshold) if dedup else None
+        self.deduplicated_rows = 0
+        self.results = open_results_store(results_backend, output_file)
         self.load_processed_rows()
         self.running = True
-        self.last_request_time = 0.0
-        self.openai = OpenAI(
-            api_key=GEMINI_TOKEN,
-            base_url=GEMINI_BASE_URL) if IS_GEMINI else OpenAI(
-                api_key=OPENAI_TOKEN)
-        self.model = "gemini-2.0-flash" if IS_GEMINI else "o3-mini"
-        self.min_request_interval = 3  # Minimum seconds between requests
+        self.concurrency = max(1, concurrency)
+        self.streaming = streaming
+        self.prompt_names = PROMPT_MODES[prompt_mode]
+        self.compact_diff = DiffCompactor(diff_token_budget,
+                                          LLM_DIFF_CONTEXT_LINES)
+        self.pool = ProviderPool(load_providers(LLM_PROVIDERS),
+                                 routing=LLM_ROUTING)
+        self.cache = LLMCache(
+            LLM_CACHE_PATH,
+            max_age_days=LLM_CACHE_MAX_AGE_DAYS,
+            max_entries=LLM_CACHE_MAX_ENTRIES,
+        ) if use_cache and LLM_CACHE_PATH else None
+        self.metrics = RunMetrics(LLM_PRICES)
+        self.cascade = cascade
+        if cascade:
+            error = cascade_error(self.pool.models())
+            if error:
+                raise ValueError(error)
+            self.metrics.enable_cascade(LLM_CASCADE_FAST_MODEL,
+                                        LLM_CASCADE_STRONG_MODEL)
+        self.transcript = TranscriptWriter(
+            LLM_TRANSCRIPT_DIR,
+            max_bytes=LLM_TRANSCRIPT_MAX_BYTES) if LLM_TRANSCRIPT_DIR else None
 
     def signal_handler(self, signum, frame):
         print("\nGracefully shutting down...")
         self.running = False
 
     def load_processed_rows(self):
-        """Load already processed row numbers from output file"""
-        if Path(self.output_file).exists():
-            with open(self.output_file, newline='') as f:
-                reader = csv.DictReader(f)
-                self.processed_rows = {
-                    int(row['row_number'])
-                    for row in reader if 'row_number' in row
-                }
+        """Load already processed row numbers from the results store"""
+        self.results.load(self.dedup_key if self.deduplicator else None)
+
+    def dedup_key(self, row: dict) -> str:
+        """Rows sharing a key share one LLM verdict"""
+        if self.deduplicator is None:
+            return f"row:{row['original_row_number']}"
+        return self.deduplicator.key(row['Suggestion'], row['Small Diff'])
+
+    def known_verdict(self, key: str) -> dict | None:
+        """Verdict from this run or from a previous one"""
+        if key not in self.verdicts and self.deduplicator:
+            verdict = self.results.get_verdict(key)
+            if verdict is not None:
+                self.verdicts[key] = verdict
+        return self.verdicts.get(key)
 
     def ask_for_date_range(self) -> tuple:
         """Get date range from user input"""
@@ -63,244 +318,828 @@ class QualityChecker:
             except ValueError:
                 print("Invalid batch size. Please enter a number")
 
-    def get_rows(self) -> list[dict]:
-        """Filter rows based on date range"""
-        filtered_rows = []
-        with open(self.input_file, newline='') as f:
-            reader = csv.DictReader(f)
-            for idx, row in enumerate(reader):
+    def get_rows(self,
+                 since: date | None = None,
+                 until: date | None = None) -> Iterator[dict]:
+        """Stream unprocessed rows, optionally within a date range"""
+        self.input_fieldnames = table_columns(self.input_file)
+        for idx, row in enumerate(iter_table_rows(self.input_file)):
+            if self.results.is_processed(idx):
+                continue
+            if since or until:
                 try:
-                    # Parse the complex timestamp format
-                    row_datetime = parser.parse(row['Date'])
-                    # Compare only the date parts
-                    row_datetime.date()
-                    row['original_row_number'] = idx
-                    filtered_rows.append(row)
-                except (ValueError, TypeError) as e:
+                    row_date = parse_date(row['Date'])
+                except (ValueError, TypeError, OverflowError) as e:
                     print(f"Skipping row with invalid date:"
                           f"{row['Date']}, Error: {e}")
-        return filtered_rows
+                    continue
+                if since and row_date < since or \
+                        until and row_date > until:
+                    continue
+            yield self.prepare_row(row, idx)
 
-    def wait_for_rate_limit(self):
-        """Ensure minimum time between API calls"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
+    def prepare_row(self, row: dict, idx: int) -> dict:
+        """Add the row number and the diff as sent, compacted once here
+        rather than on every render, packing estimate or retry"""
+        row['original_row_number'] = idx
+        row['compact_diff'] = self.compact_diff(row['Small Diff'])
+        return row
 
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            print(f"Rate limiting: waiting {sleep_time:.1f} seconds...")
-            time.sleep(sleep_time)
+    def acquire_provider(self,
+                         tokens: int = 0,
+                         model: str | None = None) -> Provider:
+        """Block until a provider's request and token budget allows
+        another call"""
+        provider, slept = self.pool.acquire(tokens, model)
+        if slept:
+            self.metrics.record_rate_limit_wait(slept)
+            print(f"Rate limiting: waited {slept:.1f} seconds...")
+        return provider
 
-        self.last_request_time = time.time()
+    def record_usage(self, provider_name: str, estimated_tokens: int,
+                     usage) -> dict:
+        """Account a response's token usage against the rate limit"""
+        self.pool.reconcile(provider_name, estimated_tokens,
+                            usage.total_tokens)
+        return {
+            'prompt_tokens': usage.prompt_tokens,
+            'completion_tokens': usage.completion_tokens,
+            'total_tokens': usage.total_tokens,
+        }
 
-    def rate_suggestions_batch(self, data: list[dict]) -> list[dict]:
-        """Rate multiple suggestions using GPT-4 with rate limiting"""
+    def rate_suggestions_batch(
+        self,
+        data: list[dict],
+        on_verdict: Callable[[int, str, object], None] | None = None
+    ) -> list[dict]:
+        """Rate multiple suggestions, running the mode's prompts in parallel.
 
-        self.wait_for_rate_limit()
+        `on_verdict(id, field, value)` is called as soon as each verdict is
+        known, before the batch as a whole completes. In cascade mode that
+        is once the verdict will not be escalated.
+        """
 
-        render_args = {
-            'suggestions': [{
-                'id': i,
-                'suggestion': d['Suggestion'],
-                'code_diff': d['Small Diff'],
-            } for i, d in enumerate(data)],
-        }
+        suggestions = to_suggestions(data)
+        if self.cascade:
+            verdicts = self._run_cascade(suggestions, on_verdict)
+        else:
+            verdicts = self._run_prompts(suggestions, on_verdict)
+        return self._final_results(suggestions, verdicts)
+
+    def _run_prompts(self,
+                     suggestions: list[dict],
+                     on_verdict: Callable[[int, str, object], None]
+                     | None = None,
+                     model: str | None = None,
+                     confidence: bool = False) -> list[dict[int, dict]]:
+        """Verdicts of each of the mode's prompts, run in parallel"""
+        with ThreadPoolExecutor(
+                max_workers=len(self.prompt_names)) as executor:
+            futures = [
+                executor.submit(self._evaluate,
+                                prompt_name,
+                                suggestions,
+                                on_verdict,
+                                model=model,
+                                confidence=confidence)
+                for prompt_name in self.prompt_names
+            ]
+            return [future.result() for future in futures]
+
+    def _run_cascade(
+        self,
+        suggestions: list[dict],
+        on_verdict: Callable[[int, str, object], None] | None = None
+    ) -> list[dict[int, dict]]:
+        """Fast model with confidences first, then the strong model for
+        suggestions it is unsure or self-contradictory about"""
+        verdicts = self._run_prompts(suggestions,
+                                     model=LLM_CASCADE_FAST_MODEL,
+                                     confidence=True)
+        reasons = {}
+        for s in suggestions:
+            reason = escalation_reason(merge_verdicts(verdicts, s['id']),
+                                       LLM_CASCADE_MIN_CONFIDENCE)
+            if reason:
+                reasons[s['id']] = reason
+        self.metrics.record_escalations(len(suggestions),
+                                        list(reasons.values()))
+        if on_verdict:
+            # Rows that stay with the fast model can be written already
+            for s in suggestions:
+                if s['id'] in reasons:
+                    continue
+                result = merge_verdicts(verdicts, s['id'])
+                on_verdict(s['id'], 'sources', result['sources'])
+                on_verdict(s['id'], 'category', result['category'])
+                on_verdict(s['id'], 'is_false_positive',
+                           result['is_false_positive'])
+        escalated = [s for s in suggestions if s['id'] in reasons]
+        if escalated:
+            print(f"Escalating {len(escalated)}/{len(suggestions)} "
+                  f"suggestions to {LLM_CASCADE_STRONG_MODEL}")
+            strong_verdicts = self._run_prompts(escalated,
+                                                on_verdict,
+                                                model=LLM_CASCADE_STRONG_MODEL)
+            # Strong verdicts replace fast ones; a fast verdict stays only
+            # when the strong model gave none
+            for prompt_verdicts, strong in zip(verdicts, strong_verdicts):
+                prompt_verdicts.update(strong)
+        return verdicts
 
+    def rate_from_answers(
+        self,
+        data: list[dict],
+        answers: dict[str, list | None],
+        source: Source,
+    ) -> list[dict]:
+        """Like rate_suggestions_batch, starting from answers obtained
+        elsewhere (e.g. the Batch API) from the (provider, model) `source`;
+        only invalid ids hit the LLM"""
+        suggestions = to_suggestions(data)
+        verdicts = [
+            self._evaluate(prompt_name,
+                           suggestions,
+                           results=answers.get(prompt_name),
+                           source=source) for prompt_name in self.prompt_names
+        ]
+        return self._final_results(suggestions, verdicts)
+
+    def render_messages(self, prompt_name: str,
+                        rows: list[dict]) -> list[dict]:
+        render_args = {'suggestions': to_suggestions(rows)}
+        return build_messages(
+            render_system_prompt(prompt_name),
+            render_prompt(f'{prompt_name}_user', render_args))
+
+    def output_fieldnames(self) -> list[str]:
+        return self.input_fieldnames + RESULT_FIELDNAMES
+
+    @staticmethod
+    def _final_results(suggestions: list[dict],
+                       verdicts: list[dict[int, dict]]) -> list[dict]:
         final_results: list[dict] = []
-        for i, _ in enumerate(data):
+        for s in suggestions:
+            _id = s['id']
+            result = merge_verdicts(verdicts, _id)
+            if 'category' not in result:
+                print(f"{_id} has no valid category, recording -1")
+            if 'is_false_positive' not in result:
+                print(f"{_id} has no valid false positive verdict, "
+                      "recording False")
             final_results.append({
-                'id': i,
-                'category': None,
-                'is_false_positive': None
+                'id':
+                _id,
+                'category':
+                result.get('category', "-1"),
+                'is_false_positive':
+                result.get('is_false_positive', False),
+                **source_fields(result.get('sources', {})),
             })
 
-        with open('prompts/categorization_system.jinja') as f0:
-            category_system_template = Template(f0.read().strip())
-            category_system_prompt = category_system_template.render(
-                render_args)
+        print("Final results: " + str(final_results))
+
+        return final_results
 
-        with open('prompts/categorization_user.jinja') as f1:
-            category_user_template = Template(f1.read().strip())
-            category_user_prompt = category_user_template.render(render_args)
-        txn_id = str(time.time())
+    def _evaluate(
+        self,
+        prompt_name: str,
+        suggestions: list[dict],
+        on_verdict: Callable[[int, str, object], None] | None = None,
+        results: list | None = None,
+        source: Source | None = None,
+        model: str | None = None,
+        confidence: bool = False,
+    ) -> dict:
+        """Map suggestion id to the `prompt_name` verdict fields, plus the
+        (provider, model) that answered under `sources` and, when asked
+        for, the `confidence` by prompt. `model` pins the LLM model.
 
-        category_results = self._call_llm(
-            txn_id=txn_id,
-            system_prompt=category_system_prompt,
-            user_prompt=category_user_prompt,
-        )
-        category_results_map = {r['id']: r for r in category_results}
+        `results` is an answer already at hand, from `source`, to validate
+        before calling the LLM. Only missing or invalid ids are re-issued.
+        When a set of ids keeps failing it is split in half, down to single
+        suggestions; ids that still fail are left out of the result.
+        """
+        verdict_fields = PROMPT_RESULT_FIELDS[prompt_name]
+        result_fields = prompt_fields(prompt_name, confidence)
+        verdicts: dict[int, dict] = {}
+        pending = suggestions
+        requested = {s['id'] for s in suggestions}
 
-        for f in final_results:
-            _id = f['id']
-            if _id in category_results_map:
-                f['category'] = category_results_map[_id]['category']
-            else:
-                f['category'] = "-1"
-                print(f"{id} not in category_results_map")
-
-        with open('prompts/false_positive_system.jinja') as f2:
-            false_positive_system_template = Template(f2.read().strip())
-            false_positive_system_prompt = false_positive_system_template \
-                .render(render_args)
-
-        with open('prompts/false_positive_user.jinja') as f3:
-            false_positive_user_template = Template(f3.read().strip())
-            false_positive_user_prompt = false_positive_user_template.render(
-                render_args)
-        txn_id = str(time.time())
-        false_positive_results = self._call_llm(
-            txn_id=txn_id,
-            system_prompt=false_positive_system_prompt,
-            user_prompt=false_positive_user_prompt,
+        def is_valid_item(r) -> bool:
+            return isinstance(r, dict) and r.get('id') in requested and \
+                all(RESULT_FIELDS[f][0](r.get(f)) for f in result_fields)
+
+        def is_complete(results) -> bool:
+            return isinstance(results, list) and {
+                r['id']
+                for r in results if is_valid_item(r)
+            } >= {s['id']
+                  for s in pending}
+
+        def accept(r, source: Source):
+            if is_valid_item(r) and r['id'] not in verdicts:
+                sources = {prompt_name: source}
+                verdicts[r['id']] = {f: r[f] for f in verdict_fields}
+                verdicts[r['id']]['sources'] = sources
+                if confidence:
+                    verdicts[r['id']]['confidence'] = {
+                        prompt_name: r['confidence']
+                    }
+                if on_verdict:
+                    # Sources first, the row may be written as soon as
+                    # its fields are in
+                    on_verdict(r['id'], 'sources', sources)
+                    for f in verdict_fields:
+                        on_verdict(r['id'], f, r[f])
+
+        if results is not None:
+            assert source is not None, "An answer at hand needs its source"
+            for r in results if isinstance(results, list) else []:
+                accept(r, source)
+            pending = [s for s in pending if s['id'] not in verdicts]
+            if not pending:
+                return verdicts
+
+        for attempt in range(LLM_BATCH_ATTEMPTS):
+            try:
+                results, answered_by = self._run_prompt(
+                    prompt_name, {'suggestions': pending},
+                    is_complete=is_complete,
+                    on_item=accept,
+                    model=model,
+                    confidence=confidence)
+            except json.JSONDecodeError as e:
+                print(f"Invalid JSON for {prompt_name}: {e}")
+                results = []
+            for r in results if isinstance(results, list) else []:
+                accept(r, answered_by)
+            pending = [s for s in pending if s['id'] not in verdicts]
+            if not pending:
+                return verdicts
+            print(f"{len(pending)} {prompt_name} results missing or invalid "
+                  f"(attempt {attempt + 1}/{LLM_BATCH_ATTEMPTS})")
+
+        if len(pending) > 1:
+            middle = len(pending) // 2
+            print(f"Splitting {len(pending)} {prompt_name} suggestions")
+            for half in (pending[:middle], pending[middle:]):
+                verdicts.update(
+                    self._evaluate(prompt_name,
+                                   half,
+                                   on_verdict,
+                                   model=model,
+                                   confidence=confidence))
+        return verdicts
+
+    def _run_prompt(self,
+                    prompt_name: str,
+                    render_args: dict,
+                    is_complete: Callable[[list], bool] | None = None,
+                    on_item: OnItem | None = None,
+                    model: str | None = None,
+                    confidence: bool = False) -> tuple[list, Source]:
+        """Render `prompts/<prompt_name>_*.jinja` and call the LLM, returning
+        the answer and the (provider, model) that gave it"""
+        system_prompt = render_system_prompt(prompt_name, confidence)
+        user_prompt = render_prompt(f'{prompt_name}_user', render_args)
+        if self.cache:
+            cached = self.cache.get([model] if model else self.pool.models(),
+                                    system_prompt, user_prompt)
+            if cached is not None:
+                cached_model, answer = cached
+                self.metrics.record_cache_hit(cached_model)
+                return json.loads(answer), ('cache', cached_model)
+        estimated_tokens = estimate_tokens(system_prompt + user_prompt)
+        results, source = self._call_llm(
+            txn_id=uuid.uuid4().hex,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            estimated_tokens=estimated_tokens,
+            prompt_name=prompt_name,
+            on_item=on_item,
+            model=model,
+            confidence=confidence,
+            row_numbers=[
+                s['row_number'] for s in render_args['suggestions']
+                if 'row_number' in s
+            ],
         )
-        false_positive_results_map = {
-            r['id']: r
-            for r in false_positive_results
+        # Incomplete answers are retried, never replayed from the cache
+        if self.cache and (is_complete is None or is_complete(results)):
+            self.cache.set(source[1], system_prompt, user_prompt,
+                           json.dumps(results))
+        return results, source
+
+    def _create_completion(self, record: dict, estimated_tokens: int,
+                           model: str | None, **kwargs):
+        """chat.completions.create on a provider leased from the pool, one
+        serving `model` if given, and named in `record`. On 429, 5xx and
+        timeouts that provider is suspended with backoff and the request
+        fails over to another."""
+        for attempt in itertools.count():
+            provider = self.acquire_provider(estimated_tokens, model)
+            record['provider'] = provider.name
+            record['model'] = provider.model
+            try:
+                return provider.client.chat.completions.create(
+                    model=provider.model, **kwargs)
+            except (RateLimitError, InternalServerError,
+                    APIConnectionError) as e:
+                if attempt + 1 >= LLM_MAX_RETRIES:
+                    raise
+                # Full jitter, but never earlier than the server asked for
+                delay = random.uniform(
+                    0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**attempt))
+                response = getattr(e, 'response', None)
+                retry_after = response.headers.get('retry-after') \
+                    if response is not None else None
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                self.pool.release(record.pop('provider'), suspend_for=delay)
+                self.metrics.record_retry(provider.name)
+                print(f"{type(e).__name__} from {provider.name}, suspending "
+                      f"it for {delay:.1f} seconds and retrying "
+                      f"({attempt + 1}/{LLM_MAX_RETRIES})...")
+
+    def _call_llm(self,
+                  txn_id: str,
+                  system_prompt: str,
+                  user_prompt: str,
+                  estimated_tokens: int = 0,
+                  prompt_name: str | None = None,
+                  on_item: OnItem | None = None,
+                  row_numbers: list[int] | None = None,
+                  model: str | None = None,
+                  confidence: bool = False) -> tuple[list, Source]:
+        msgs = build_messages(system_prompt, user_prompt)
+        record: dict[str, Any] = {
+            'txn_id': txn_id,
+            'time': time.time(),
+            'model': None,
+            'prompt_name': prompt_name,
+            'rows': row_numbers or [],
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt,
+            'streaming': bool(self.streaming and prompt_name),
         }
+        started = time.perf_counter()
+        try:
+            if prompt_name and record['streaming']:
+                items = self._stream_llm(record, msgs, prompt_name,
+                                         estimated_tokens, on_item, model,
+                                         confidence)
+                return items, (record['provider'], record['model'])
 
-        for f in final_results:
-            _id = f['id']
-            if _id in false_positive_results_map:
-                f['is_false_positive'] = false_positive_results_map[_id][
-                    'is_false_positive']
-            else:
-                f['is_false_positive'] = False
-                print(f"{id} not in false_positive_results_map")
+            response = self._create_completion(record,
+                                               estimated_tokens,
+                                               model,
+                                               messages=msgs)
 
-        print("Final results: " + str(final_results))
+            if response.usage:
+                record['usage'] = self.record_usage(record['provider'],
+                                                    estimated_tokens,
+                                                    response.usage)
 
-        return final_results
+            record['answer'] = response.choices[0].message.content or ""
+            source = (record['provider'], record['model'])
+            return parse_llm_json(record['answer']), source
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['latency_s'] = round(time.perf_counter() - started, 3)
+            # No provider was leased when acquiring one failed
+            self.metrics.record_call(record['model'] or model,
+                                     prompt_name,
+                                     record['latency_s'],
+                                     record.get('usage'),
+                                     bool(record.get('error')),
+                                     provider=record.get('provider'),
+                                     items=len(record['rows']))
+            if 'provider' in record:
+                self.pool.release(record['provider'])
+            if self.transcript:
+                self.transcript.log(record)
 
-    def _call_llm(self, txn_id: str, system_prompt: str,
-                  user_prompt: str) -> dict:
-        with open(f'llmlogs/{txn_id}.txt', 'a') as f:
-            f.write(f"System:\n{system_prompt}\n\nUser:\n{user_prompt}")
-            msgs = [{
-                "role": "system",
-                "content": system_prompt
-            }, {
-                "role": "user",
-                "content": user_prompt
-            }]
-            response = self.openai.chat.completions.create(
-                model=self.model,
-                messages=msgs,
-            )
-
-            result_text = response.choices[0].message.content
-
-            if result_text.startswith("```"):
-                result_text = result_text[3:-3].strip()
-            if result_text.startswith("json"):
-                result_text = result_text[4:].strip()
-            f.write(f"\n\nAnswer:\n{result_text}")
-            results = json.loads(result_text)
-
-        return results
-
-    def process_rows(self, filtered_rows: list[dict], batch_size: int):
-        """Process filtered rows and write results"""
-        if not filtered_rows:
-            print("No rows to process")
-            return
+    def _stream_llm(self, record: dict, msgs: list[dict], prompt_name: str,
+                    estimated_tokens: int, on_item: OnItem | None,
+                    model: str | None, confidence: bool) -> list:
+        """Stream a structured-output answer, handing over items as they
+        complete. A dropped connection keeps the items received so far."""
+        stream = self._create_completion(
+            record,
+            estimated_tokens,
+            model,
+            messages=msgs,
+            response_format=response_format(prompt_name, confidence),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        source = (record['provider'], record['model'])
+        item_parser = JsonArrayItemParser()
+        items: list[dict] = []
+        answer: list[str] = []
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    record['usage'] = self.record_usage(
+                        record['provider'], estimated_tokens, chunk.usage)
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ""
+                answer.append(text)
+                for item in item_parser.feed(text):
+                    items.append(item)
+                    if on_item:
+                        on_item(item, source)
+        except (APIError, httpx.TransportError) as e:
+            print(f"Stream for {prompt_name} interrupted after "
+                  f"{len(items)} items: {e}")
+            record['error'] = f"{type(e).__name__}: {e}"
+        record['answer'] = ''.join(answer)
+        return items
+
+    def close(self):
+        self.results.close()
+        if self.transcript:
+            self.transcript.close()
+        if self.cache:
+            print(self.cache.stats())
+            self.cache.close()
 
-        # Calculate total number of batches
-        total_unprocessed = sum(
-            1 for row in filtered_rows
-            if int(row['original_row_number']) not in self.processed_rows)
-        total_batches = (total_unprocessed + batch_size - 1) // batch_size
+    def process_rows(self, filtered_rows: Iterable[dict], packer: BatchPacker):
+        """Process filtered rows and write results"""
         current_batch_no = 0
 
-        print(f"Found {len(filtered_rows)} rows"
-              f" to process ({total_unprocessed} unprocessed)")
+        print(f"{self.results.processed_count()} rows already processed")
         proceed = input("Proceed with processing? (y/n): ").lower()
         if proceed != 'y':
             return
 
+        filtered_rows = iter(filtered_rows)
+        first_row = next(filtered_rows, None)
+        if first_row is None:
+            print("No rows to process")
+            return
+
         # Setup signal handler for graceful shutdown
         signal.signal(signal.SIGINT, self.signal_handler)
+        self.metrics.start()
 
         # Maintain fixed column order
-        # input_fieldnames = next(csv.reader(open(self.input_file)))
-        # Update line 178 in process_rows:
-        with open(self.input_file, newline='') as infile:
-            input_fieldnames = next(csv.reader(infile))
-        output_fieldnames = input_fieldnames + [
-            'results', "is_false_positive", "final_result", 'row_number'
-        ]
+        self.results.open(self.output_fieldnames())
 
-        file_exists = Path(self.output_file).exists()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
 
-        with open(self.output_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=output_fieldnames)
-            if not file_exists:
-                writer.writeheader()
+            # Batches are evaluated concurrently but written in
+            # submission order so the output stays sorted by row number
+            in_flight: deque[Batch] = deque()
 
-            current_batch = []
-            current_rows = []
+            for batch in self.iter_batches(
+                    itertools.chain([first_row], filtered_rows), packer):
+                current_batch_no += 1
+                size = f"~{batch.pending_tokens} tokens, " \
+                    if packer.token_budget else ""
+                print(f"Processing batch {current_batch_no} "
+                      f"({len(batch.pending_rows)} suggestions, {size}"
+                      f"{len(batch.rows)} rows)...")
+                if batch.pending_rows:
+                    batch.future = executor.submit(self.rate_suggestions_batch,
+                                                   batch.pending_rows,
+                                                   batch.record_verdict)
+                    batch.future.add_done_callback(batch.notify)
+                in_flight.append(batch)
+                while len(in_flight) >= self.concurrency:
+                    self.write_batch(in_flight.popleft())
 
-            for row in filtered_rows:
-                if not self.running:
-                    break
+            # Drain batches already sent, also on graceful shutdown
+            while in_flight:
+                self.write_batch(in_flight.popleft())
 
-                original_row_num = int(row['original_row_number'])
-                if original_row_num in self.processed_rows:
-                    continue
+        if self.deduplicator:
+            print(f"Deduplication reused verdicts for "
+                  f"{self.deduplicated_rows} rows")
+
+    def iter_batches(self, rows: Iterable[dict],
+                     packer: BatchPacker) -> Iterator[Batch]:
+        """Group rows into batches. Rows whose suggestion is already judged
+        or scheduled ride along without being sent to the LLM again; a
+        batch is cut at LLM_BATCH_MAX_ROWS rows even if none of them is
+        sent."""
+        scheduled_keys: set[str] = set()
+        current_batch = Batch()
+
+        for row in rows:
+            if not self.running:
+                return
+
+            original_row_num = int(row['original_row_number'])
+            key = self.dedup_key(row)
+            if key not in scheduled_keys and self.known_verdict(key) is None:
+                scheduled_keys.add(key)
+                tokens = packer.row_tokens(row)
+                if not packer.can_add(len(current_batch.pending_rows),
+                                      current_batch.pending_tokens, tokens):
+                    yield current_batch
+                    current_batch = Batch()
+                if packer.is_oversized(tokens):
+                    print(f"Row {original_row_num} is ~{tokens} tokens, "
+                          "sending it on its own")
+                self.metrics.record_compaction(
+                    estimate_tokens(row['Small Diff']),
+                    estimate_tokens(row['compact_diff']),
+                    prompts=len(self.prompt_names))
+                current_batch.pending_rows.append(row)
+                current_batch.pending_keys.append(key)
+                current_batch.pending_tokens += tokens
+            current_batch.rows.append(row)
+            current_batch.keys.append(key)
+
+            if packer.is_full(len(current_batch.pending_rows),
+                              current_batch.pending_tokens) or \
+                    len(current_batch.rows) >= LLM_BATCH_MAX_ROWS:
+                yield current_batch
+                current_batch = Batch()
+
+        # Flush the tail of the stream
+        if current_batch.rows:
+            yield current_batch
+
+    def write_batch(self, batch: Batch):
+        """Commit a batch's rows in order, each as soon as its verdict is
+        known, and the remaining ones once the batch completes"""
+        pending_index = {key: i for i, key in enumerate(batch.pending_keys)}
+        written = 0
+        finished = False
+        while written < len(batch.rows):
+            with batch.updated:
+                while True:
+                    done = batch.future is None or batch.future.done()
+                    ready = self._count_ready_rows(batch, written,
+                                                   pending_index)
+                    if done or ready:
+                        break
+                    batch.updated.wait()
+            if done:
+                self._finish_batch(batch)
+                finished = True
+                ready = len(batch.rows) - written
+            output_rows = []
+            for row_data, key in zip(batch.rows[written:written + ready],
+                                     batch.keys[written:written + ready]):
+                verdict = self._row_verdict(batch, key, pending_index)
+                assert verdict is not None, \
+                    f"No verdict for row {row_data['original_row_number']}"
+                output_rows.append((key, self._output_row(row_data, verdict)))
+            self.results.write_rows(output_rows)
+            self.metrics.record_rows(ready)
+            written += ready
+
+        # Later batches look verdicts up by key, also for rows that were
+        # all written from streamed verdicts
+        if not finished:
+            self._finish_batch(batch)
+        if self.deduplicator is None:
+            for key in batch.keys:
+                self.verdicts.pop(key, None)
+
+    def _finish_batch(self, batch: Batch):
+        results = batch.future.result() if batch.future else []
+        assert len(results) == len(batch.pending_rows), \
+            "Invalid results length"
+        for key, result in zip(batch.pending_keys, results):
+            self.verdicts[key] = result
+        self.deduplicated_rows += len(batch.rows) - len(batch.pending_rows)
+
+    def _row_verdict(self, batch: Batch, key: str,
+                     pending_index: dict[str, int]) -> dict | None:
+        if key in self.verdicts:
+            return self.verdicts[key]
+        if key not in pending_index:
+            # Judged in an earlier batch, possibly by an interrupted run
+            # whose batches are not replayed (Batch API resume)
+            return self.known_verdict(key)
+        partial = batch.partial.get(pending_index[key], {})
+        if 'category' in partial and 'is_false_positive' in partial:
+            return {**partial, **source_fields(partial.get('sources', {}))}
+        return None
+
+    def _count_ready_rows(self, batch: Batch, start: int,
+                          pending_index: dict[str, int]) -> int:
+        """Consecutive rows from `start` whose verdict is already known"""
+        count = 0
+        for key in batch.keys[start:]:
+            if self._row_verdict(batch, key, pending_index) is None:
+                break
+            count += 1
+        return count
 
-                current_batch.append(row)
-                current_rows.append(row)
-
-                if len(current_batch
-                       ) >= batch_size or row == filtered_rows[-1]:
-                    current_batch_no += 1
-                    print(
-                        f"Processing batch {current_batch_no}/{total_batches} "
-                        f"({len(current_batch)} suggestions)...")
-                    results = self.rate_suggestions_batch(current_batch)
-                    assert len(results) == len(
-                        current_batch), "Invalid results length"
-
-                    # Write results for the batch
-                    for row_data, result in zip(current_rows, results):
-                        output_row = {
-                            k: v
-                            for k, v in row_data.items()
-                            if k != 'original_row_number'
-                        }
-                        output_row['results'] = result.get('category')
-                        output_row['is_false_positive'] = result.get(
-                            'is_false_positive')
-                        output_row[
-                            'final_result'] = "FALSE_POSITIVE" if result.get(
-                                'is_false_positive') else result.get(
-                                    'category')
-                        output_row['row_number'] = row_data[
-                            'original_row_number']
-                        writer.writerow(output_row)
-                        self.processed_rows.add(
-                            int(row_data['original_row_number']))
-
-                    f.flush()
-                    current_batch = []
-                    current_rows = []
-
-
-def quality_analysis(input_file: str):
+    @staticmethod
+    def _output_row(row_data: dict, result: dict) -> dict:
+        output_row = {
+            k: v
+            for k, v in row_data.items()
+            if k not in ('original_row_number', 'compact_diff')
+        }
+        output_row['results'] = result.get('category')
+        output_row['is_false_positive'] = result.get('is_false_positive')
+        output_row['final_result'] = "FALSE_POSITIVE" if result.get(
+            'is_false_positive') else result.get('category')
+        output_row['row_number'] = row_data['original_row_number']
+        output_row['provider'] = result.get('provider')
+        output_row['model'] = result.get('model')
+        return output_row
+
+
+def quality_analysis(input_file: str,
+                     batch_size: int | None = None,
+                     token_budget: int = LLM_BATCH_TOKEN_BUDGET,
+                     output_token_cap: int = LLM_OUTPUT_TOKEN_CAP,
+                     concurrency: int = LLM_CONCURRENCY,
+                     use_cache: bool = True,
+                     dedup: bool = True,
+                     near_dup_threshold: float = 0.0,
+                     since: date | None = None,
+                     until: date | None = None,
+                     results_backend: str = RESULTS_BACKEND,
+                     streaming: bool = False,
+                     batch_api: bool = False,
+                     prompt_mode: str = 'two_pass',
+                     cascade: bool = False,
+                     diff_token_budget: int = LLM_DIFF_TOKEN_BUDGET):
     output_file = f"{input_file.strip('.csv')}.output.csv"
-    processor = QualityChecker(input_file, output_file)
-    batch_size = processor.ask_for_batch_size()
-    rows = processor.get_rows()
-    processor.process_rows(rows, batch_size)
+    processor = QualityChecker(input_file,
+                               output_file,
+                               concurrency=concurrency,
+                               use_cache=use_cache,
+                               dedup=dedup,
+                               near_dup_threshold=near_dup_threshold,
+                               results_backend=results_backend,
+                               streaming=streaming,
+                               prompt_mode=prompt_mode,
+                               cascade=cascade,
+                               diff_token_budget=diff_token_budget)
+    if batch_size is None and not token_budget:
+        batch_size = processor.ask_for_batch_size()
+    packer = BatchPacker(
+        render_prompt,
+        processor.prompt_names,
+        max_rows=batch_size,
+        token_budget=token_budget,
+        output_token_cap=output_token_cap,
+    )
+    exporter = MetricsExporter(
+        processor.metrics,
+        str(Path(output_file).with_suffix('.metrics.json')),
+        prometheus_path=LLM_METRICS_PROMETHEUS_FILE or None,
+        interval=LLM_METRICS_INTERVAL)
+    exporter.start()
+    try:
+        rows = processor.get_rows(since=since, until=until)
+        if batch_api:
+            work_dir = Path(output_file).with_suffix('.batch')
+            BatchApiRunner(processor, packer, str(work_dir)).run(rows)
+        else:
+            processor.process_rows(rows, packer)
+    finally:
+        exporter.stop()
+        processor.close()
 
 
-if __name__ == '__main__':
-    input_file = input("Enter the input CSV file path: ")
+def export_results_csv(input_file: str):
+    """Materialize the sqlite results store as the usual output CSV"""
+    output_file = f"{input_file.strip('.csv')}.output.csv"
+    db_path = Path(output_file).with_suffix('.sqlite3')
+    if not db_path.exists():
+        print(f"No sqlite results found at {db_path}")
+        exit(1)
+    store = SqliteResultsStore(str(db_path))
+    try:
+        count = store.export_csv(output_file)
+    finally:
+        store.close()
+    print(f"Exported {count} rows to {output_file}")
+
+
+@click.command()
+@click.option("--input_file",
+              type=str,
+              prompt="Enter the input CSV file path",
+              help="CSV or Parquet comments table exported by "
+              "export_gh_comments_to_csv.py")
+@click.option("--batch_size",
+              type=int,
+              default=None,
+              help="Max suggestions per LLM request (asked if omitted "
+              "and no --token_budget)")
+@click.option("--token_budget",
+              type=int,
+              default=LLM_BATCH_TOKEN_BUDGET,
+              show_default=True,
+              help="Max estimated prompt tokens per LLM request (0 disables)")
+@click.option("--output_token_cap",
+              type=int,
+              default=LLM_OUTPUT_TOKEN_CAP,
+              show_default=True,
+              help="Max estimated completion tokens per LLM request")
+@click.option("--diff_token_budget",
+              type=int,
+              default=LLM_DIFF_TOKEN_BUDGET,
+              show_default=True,
+              help="Compact diff hunks above this many estimated tokens, "
+              "keeping the lines nearest the comment (0 disables)")
+@click.option("--concurrency",
+              type=int,
+              default=LLM_CONCURRENCY,
+              show_default=True,
+              help="Batches kept in flight at once")
+@click.option("--no_cache",
+              is_flag=True,
+              help="Always call the LLM, ignoring the response cache")
+@click.option("--no_dedup",
+              is_flag=True,
+              help="Evaluate identical suggestions on the same diff "
+              "separately")
+@click.option("--near_dup_threshold",
+              type=float,
+              default=0.0,
+              help="Also share verdicts between suggestions on the same "
+              "diff whose MinHash similarity is at least this (0 disables)")
+@click.option("--since",
+              type=click.DateTime(formats=["%Y-%m-%d"]),
+              default=None,
+              help="Only evaluate comments made on or after this date")
+@click.option("--until",
+              type=click.DateTime(formats=["%Y-%m-%d"]),
+              default=None,
+              help="Only evaluate comments made on or before this date")
+@click.option("--results_backend",
+              type=click.Choice(['csv', 'sqlite']),
+              default=RESULTS_BACKEND,
+              show_default=True,
+              help="Where verdicts are stored while the run progresses")
+@click.option("--export_results",
+              is_flag=True,
+              help="Write the sqlite results to the .output.csv and exit")
+@click.option("--streaming",
+              is_flag=True,
+              help="Request JSON-schema output and commit rows as their "
+              "verdicts stream in")
+@click.option("--batch_api",
+              is_flag=True,
+              help="Submit all requests through the offline Batch API and "
+              "ingest the answers when the jobs complete (rerun to resume)")
+@click.option("--prompt_mode",
+              type=click.Choice(list(PROMPT_MODES)),
+              default='two_pass',
+              show_default=True,
+              help="Separate categorization and false-positive prompts, or "
+              "one combined prompt answering both")
+@click.option("--cascade",
+              is_flag=True,
+              help="Answer with LLM_CASCADE_FAST_MODEL first and re-evaluate "
+              "uncertain or contradictory verdicts with "
+              "LLM_CASCADE_STRONG_MODEL")
+def main(input_file, batch_size, token_budget, output_token_cap,
+         diff_token_budget, concurrency, no_cache, no_dedup,
+         near_dup_threshold, since, until, results_backend, export_results,
+         streaming, batch_api, prompt_mode, cascade):
     if not Path(input_file).exists():
         print("File does not exist. Please check the path.")
         exit(1)
-    if not input_file.endswith('.csv'):
-        print("Please provide a CSV file.")
+    if not input_file.endswith('.csv') and not is_parquet(input_file):
+        print("Please provide a CSV or Parquet file.")
+        exit(1)
+    if export_results:
+        export_results_csv(input_file)
+        return
+    if cascade and batch_api:
+        print("--cascade cannot be combined with --batch_api.")
         exit(1)
+    if cascade:
+        error = cascade_error([p['model'] for p in LLM_PROVIDERS])
+        if error:
+            print(f"{error}.")
+            exit(1)
     # Perform quality analysis
-    quality_analysis(input_file)
+    quality_analysis(input_file,
+                     batch_size=batch_size,
+                     token_budget=token_budget,
+                     output_token_cap=output_token_cap,
+                     diff_token_budget=diff_token_budget,
+                     concurrency=concurrency,
+                     use_cache=not no_cache,
+                     dedup=not no_dedup,
+                     near_dup_threshold=near_dup_threshold,
+                     since=since.date() if since else None,
+                     until=until.date() if until else None,
+                     results_backend=results_backend,
+                     streaming=streaming,
+                     batch_api=batch_api,
+                     prompt_mode=prompt_mode,
+                     cascade=cascade)
+
+
+if __name__ == '__main__':
+    main()
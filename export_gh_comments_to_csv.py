@@ -1,114 +1,524 @@
+import json
+import os
 import re
 import sys
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
 
 import click
 import pandas as pd
-import requests
 
-from config import GITHUB_TOKEN
+from config import (GITHUB_API_URL, GITHUB_CACHE_MAX_ENTRIES,
+                    GITHUB_CACHE_PATH, GITHUB_CONCURRENCY,
+                    GITHUB_GRAPHQL_BATCH_SIZE)
+from export_state import ExportState
+from github_cache import GitHubCache
+from github_client import GitHubClient
+from tables import iter_table_rows, open_table, table_columns
 
-headers = {
-    "Accept": "application/vnd.github+json",
-    "Authorization": f"Bearer {GITHUB_TOKEN}",
-    "X-GitHub-Api-Version": "2022-11-28",
-}
+BACKENDS = ('rest', 'graphql')
+PR_STATES = ('open', 'closed', 'all')
+LAYOUTS = ('flat', 'normalized')
+FORMATS = ('csv', 'parquet')
+OUTPUT_COLUMNS = [
+    "Repository", "PR No", "Pr Description", "Suggestion", "Comment By",
+    "Date", "Small Diff"
+]
+# Normalized layout: one row per original PR, and comments referencing it
+PR_COLUMNS = ["Original PR Link", "Pr Description"]
+COMMENT_COLUMNS = [
+    "Repository", "PR No", "Original PR Link", "Suggestion", "Comment By",
+    "Date", "Small Diff"
+]
+# Page sizes of the GraphQL backend; per query it asks for at most
+# batch size x threads x comments nodes, well under GitHub's 500,000
+GRAPHQL_THREADS_PAGE = 100
+GRAPHQL_COMMENTS_PAGE = 50
 
+# A PR to export and the original PR it was cloned from
+PrLink = tuple[str, str]
 
-def get_pr_reviews(api_url: str, pr_url: str):
+
+def pr_comments_api_url(pr_url: str) -> str:
+    return re.sub(r'https?://github\.com/([^/]+)/([^/]+)/pull/(\d+)',
+                  GITHUB_API_URL + r'/repos/\1/\2/pulls/\3/comments', pr_url)
+
+
+def pull_api_url(pr_url: str) -> str:
+    return pr_comments_api_url(pr_url).removesuffix('/comments')
+
+
+def pulls_api_url(repo_url: str) -> str:
+    match = re.fullmatch(r'https?://github\.com/([^/]+)/([^/]+?)(?:\.git)?/?',
+                         repo_url)
+    if not match:
+        raise ValueError(f"Not a repository URL: {repo_url}")
+    return f"{GITHUB_API_URL}/repos/{match[1]}/{match[2]}/pulls"
+
+
+def comment_row(pr_url: str, pr_description: str | None, login: str, body: str,
+                created_at: str, diff_hunk: str) -> dict:
+    return {
+        "Repository": re.sub(r'/pull/\d+', '', pr_url),
+        "PR No": pr_url.split("/")[-1],
+        "Pr Description": pr_description,
+        "Suggestion": body,
+        "Comment By": login,
+        "Date": created_at,
+        "Small Diff": diff_hunk
+    }
+
+
+@dataclass
+class PullComments:
+    """A PR's description and review comments, in REST API shape"""
+    pr_url: str
+    original_url: str
+    description: str | None
+    comments: list[dict]
+
+
+class Descriptions:
+    """PR descriptions fetched at most once per PR, shared by the worker
+    threads; clones of a PR share the description of the original"""
+
+    def __init__(self, fetch: Callable[[str], str | None]):
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.futures: dict[str, Future[str | None]] = {}
+
+    def has(self, pr_url: str) -> bool:
+        with self.lock:
+            return pr_url in self.futures
+
+    def store(self, pr_url: str, description: str | None):
+        with self.lock:
+            if pr_url in self.futures:
+                return
+            future = self.futures[pr_url] = Future()
+        future.set_result(description)
+
+    def get(self, pr_url: str) -> str | None:
+        with self.lock:
+            future = self.futures.get(pr_url)
+            owner = future is None
+            if future is None:
+                future = self.futures[pr_url] = Future()
+        if owner:
+            try:
+                future.set_result(self.fetch(pr_url))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+def bot_rows(pull: PullComments,
+             state: ExportState | None = None) -> list[dict]:
+    """Output rows of the bot comments, with `state` only those not
+    exported yet"""
     results = []
-    pull_response = requests.get(api_url.replace('/comments', ''),
-                                 headers=headers)
+    for data in pull.comments:
+
+        if '[bot]' not in data['user']['login']:
+            continue
+        if state and not state.is_new(pull.pr_url, data['id']):
+            continue
+
+        row = comment_row(pull.pr_url, pull.description, data['user']['login'],
+                          data['body'], data['created_at'], data['diff_hunk'])
+        row["Original PR Link"] = pull.original_url
+        results.append(row)
+    return results
+
+
+def fetch_pr_description(client: GitHubClient, pull_api_url: str):
+    pull_response = client.get(pull_api_url)
     if pull_response.status_code != 200:
         print("ERROR: ", pull_response.json())
         pull_response.raise_for_status()
     pull_data = pull_response.json()
-    pr_description = pull_data['body']
+    return pull_data['body']
 
-    while api_url:
-        comment_response = requests.get(api_url, headers=headers)
-        print("this is response", comment_response)
 
-        comment_datas = comment_response.json()
+def fetch_pr_comments(client: GitHubClient,
+                      api_url: str,
+                      since: str | None = None) -> list[dict]:
+    comments = []
+    params = {'since': since} if since else None
+    for comment_response in client.paginate(api_url, params=params):
+        comments.extend(comment_response.json())
 
-        for data in comment_datas:
+    # https://api.github.com/repos/microsoft/vscode/pulls
 
-            if '[bot]' not in data['user']['login']:
-                continue
+    return comments
 
-            results.append({
-                "Repository": re.sub(r'/pull/\d+', '', pr_url),
-                "PR No": pr_url.split("/")[-1],
-                "Pr Description": pr_description,
-                "Suggestion": data['body'],
-                "Comment By": data['user']['login'],
-                "Date": data['created_at'],
-                "Small Diff": data['diff_hunk']
-            })
-        link_header = comment_response.headers.get('Link')
-        api_url = extract_next_link(link_header)
 
-    # https://api.github.com/repos/microsoft/vscode/pulls
+def pr_reference(pr_url: str) -> tuple[str, str, int]:
+    match = re.search(r'github\.com/([^/]+)/([^/]+)/pull/(\d+)', pr_url)
+    if not match:
+        raise ValueError(f"Not a pull request URL: {pr_url}")
+    return match[1], match[2], int(match[3])
 
-    return results
+
+def graphql_after(cursor: str | None) -> str:
+    return f', after: {json.dumps(cursor)}' if cursor else ''
+
+
+def graphql_comments(cursor: str | None = None) -> str:
+    return (f'comments(first: {GRAPHQL_COMMENTS_PAGE}{graphql_after(cursor)})'
+            ' { pageInfo { hasNextPage endCursor } nodes { databaseId '
+            'author { __typename login } body createdAt updatedAt diffHunk '
+            '} }')
+
+
+def graphql_pull_request(alias: str, pr_url: str, selection: str) -> str:
+    owner, repo, number = pr_reference(pr_url)
+    return (f'{alias}: repository(owner: {json.dumps(owner)}, '
+            f'name: {json.dumps(repo)}) {{ pullRequest(number: {number}) '
+            f'{{ {selection} }} }}')
+
+
+def graphql_pull(alias: str, pr_url: str, cursor: str | None) -> str:
+    """Aliased selection of one page of a PR's review threads"""
+    threads = f'first: {GRAPHQL_THREADS_PAGE}{graphql_after(cursor)}'
+    return graphql_pull_request(
+        alias, pr_url, f'reviewThreads({threads}) {{ pageInfo {{ '
+        f'hasNextPage endCursor }} nodes {{ id {graphql_comments()} }} }}')
 
 
-def extract_next_link(link_header):
-    if not link_header:
+def graphql_thread(alias: str, thread_id: str, cursor: str) -> str:
+    """Aliased selection of the next page of a long thread's comments"""
+    return (f'{alias}: node(id: {json.dumps(thread_id)}) {{ ... on '
+            f'PullRequestReviewThread {{ {graphql_comments(cursor)} }} }}')
+
+
+def graphql_login(author: dict | None) -> str | None:
+    """Login as the REST API spells it, which suffixes bots with [bot]"""
+    if author is None:
         return None
-    links = link_header.split(',')
-    for link in links:
-        url, rel = link.split(';')
-        url = url.strip('<>')
-        if 'rel="next"' in rel:
-            return url
-    return None
+    if author['__typename'] == 'Bot':
+        return f"{author['login']}[bot]"
+    return author['login']
 
 
-def get_pull_requests(api_url: str):
-    results = []
-    response = requests.get(api_url, headers=headers)
-    datas = response.json()
+def graphql_comment(node: dict) -> dict:
+    """A GraphQL review comment in REST API shape"""
+    return {
+        'id': node['databaseId'],
+        'user': {
+            'login': graphql_login(node['author']) or ''
+        },
+        'body': node['body'],
+        'created_at': node['createdAt'],
+        'updated_at': node['updatedAt'],
+        'diff_hunk': node['diffHunk'],
+    }
 
-    for data in datas:
 
-        pr_data = get_pr_reviews(data['url'] + '/comments', data['html_url'])
-        if pr_data:
-            results.append(pr_data)
+def fetch_graphql_batch(client: GitHubClient, prs: list[PrLink],
+                        descriptions: Descriptions) -> list[PullComments]:
+    """Review comments of `prs` from aliased GraphQL queries, each asking
+    for the next page of review threads of every PR at once; long threads
+    are then paged through their node ids. The first query also asks for
+    the descriptions of original PRs not fetched yet."""
+    pr_urls = [pr_url for pr_url, _ in prs]
+    originals = dict.fromkeys(original for _, original in prs)
+    missing = [url for url in originals if not descriptions.has(url)]
+    comments: list[list[dict]] = [[] for _ in pr_urls]
+    # Long threads as (PR index, thread id, cursor)
+    long_threads: list[tuple[int, str, str]] = []
 
-    return results
+    def collect(index: int, page: dict):
+        comments[index].extend(map(graphql_comment, page['nodes']))
+        return page['pageInfo']['endCursor'] \
+            if page['pageInfo']['hasNextPage'] else None
+
+    pending: dict[int, str | None] = dict.fromkeys(range(len(pr_urls)))
+    selections = [
+        graphql_pull_request(f'd{j}', original, 'body')
+        for j, original in enumerate(missing)
+    ]
+    while pending:
+        selections += [
+            graphql_pull(f'pr{i}', pr_urls[i], cursor)
+            for i, cursor in pending.items()
+        ]
+        data = client.graphql('query { ' + ' '.join(selections) + ' }')
+        selections = []
+        for j, original in enumerate(missing):
+            descriptions.store(original, data[f'd{j}']['pullRequest']['body'])
+        missing = []
+        next_pending = {}
+        for i in pending:
+            threads = data[f'pr{i}']['pullRequest']['reviewThreads']
+            for thread in threads['nodes']:
+                if cursor := collect(i, thread['comments']):
+                    long_threads.append((i, thread['id'], cursor))
+            if threads['pageInfo']['hasNextPage']:
+                next_pending[i] = threads['pageInfo']['endCursor']
+        pending = next_pending
+
+    while long_threads:
+        batch = long_threads[:GRAPHQL_THREADS_PAGE]
+        long_threads = long_threads[GRAPHQL_THREADS_PAGE:]
+        data = client.graphql('query { ' + ' '.join(
+            graphql_thread(f't{n}', thread_id, cursor)
+            for n, (_, thread_id, cursor) in enumerate(batch)) + ' }')
+        for n, (i, thread_id, _) in enumerate(batch):
+            if cursor := collect(i, data[f't{n}']['comments']):
+                long_threads.append((i, thread_id, cursor))
+
+    # Threads group replies; the REST API lists comments by id
+    return [
+        PullComments(pr_url, original, descriptions.get(original),
+                     sorted(comments[i], key=lambda c: c['id']))
+        for i, (pr_url, original) in enumerate(prs)
+    ]
+
+
+def fetch_prs_comments(
+    client: GitHubClient,
+    prs: list[PrLink],
+    concurrency: int,
+    backend: str,
+    graphql_batch_size: int,
+    state: ExportState,
+    known_descriptions: dict[str, str | None] | None = None
+) -> Iterator[PullComments]:
+    """Comments of every PR, fetched concurrently but yielded in the order
+    of `prs`, with the description of its original PR fetched once unless
+    in `known_descriptions`. The REST backend fetches a PR per task,
+    listing only comments updated since the PR's high-water mark in
+    `state`; the GraphQL backend fetches `graphql_batch_size` PRs per
+    query."""
+    descriptions = Descriptions(
+        lambda pr_url: fetch_pr_description(client, pull_api_url(pr_url)))
+    for pr_url, description in (known_descriptions or {}).items():
+        descriptions.store(pr_url, description)
+    size = graphql_batch_size if backend == 'graphql' else 1
+    batches = [prs[i:i + size] for i in range(0, len(prs), size)]
+
+    def fetch(batch: list[PrLink]) -> list[PullComments]:
+        if backend == 'graphql':
+            return fetch_graphql_batch(client, batch, descriptions)
+        pr_url, original = batch[0]
+        comments = fetch_pr_comments(client, pr_comments_api_url(pr_url),
+                                     state.since(pr_url))
+        return [
+            PullComments(pr_url, original, descriptions.get(original),
+                         comments)
+        ]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # map yields in submission order whatever the completion order
+        for pulls in executor.map(fetch, batches):
+            yield from pulls
+
+
+def pr_table_path(output_file: str) -> Path:
+    path = Path(output_file)
+    return path.with_name(f"{path.stem}_prs{path.suffix}")
+
+
+class ExportWriter:
+    """Writes each PR's rows as soon as it is fetched.
+
+    The flat layout is a single table repeating the PR description on
+    every comment. The normalized layout writes each original PR's
+    description once to a PR table (`<output>_prs`), which comments
+    reference by `Original PR Link`.
+    """
+
+    def __init__(self, output_file: str, layout: str, append: bool):
+        columns = COMMENT_COLUMNS if layout == 'normalized' \
+            else OUTPUT_COLUMNS
+        if append and table_columns(output_file) != columns:
+            raise ValueError(f"{output_file} was not written with the "
+                             f"{layout} layout")
+        self.comments = open_table(output_file, columns, append)
+        self.prs = None
+        self.written_prs: set[str] = set()
+        if layout == 'normalized':
+            prs_file = pr_table_path(output_file)
+            append_prs = append and prs_file.exists()
+            if append_prs:
+                self.written_prs = {
+                    row["Original PR Link"]
+                    for row in iter_table_rows(prs_file)
+                }
+            self.prs = open_table(prs_file, PR_COLUMNS, append_prs)
+
+    def write(self, pull: PullComments, rows: list[dict]):
+        if self.prs and pull.original_url not in self.written_prs:
+            self.written_prs.add(pull.original_url)
+            self.prs.write([{
+                "Original PR Link": pull.original_url,
+                "Pr Description": pull.description
+            }])
+        self.comments.write(rows)
+
+    def close(self):
+        self.comments.close()
+        if self.prs:
+            self.prs.close()
+
+
+def get_pull_requests(client: GitHubClient,
+                      repo_url: str,
+                      pr_state: str,
+                      concurrency: int,
+                      since: datetime | None = None,
+                      until: datetime | None = None) -> list[dict]:
+    """Every PR of a repository in `pr_state`, oldest first, created
+    between `since` and `until` inclusive. Listing pages are fetched
+    concurrently once the first one reveals the last."""
+    # Oldest first, so PRs opened mid-sweep land on the last page instead
+    # of shifting the pages still being fetched
+    params = {
+        'state': pr_state,
+        'sort': 'created',
+        'direction': 'asc',
+        'per_page': 100
+    }
+    first_day = since.strftime('%Y-%m-%d') if since else ''
+    last_day = until.strftime('%Y-%m-%d') if until else '9999-12-31'
+    pulls: dict[int, dict] = {}
+    for response in client.get_all_pages(pulls_api_url(repo_url),
+                                         concurrency,
+                                         params=params):
+        for pull in response.json():
+            if first_day <= pull['created_at'][:10] <= last_day:
+                pulls.setdefault(pull['number'], pull)
+    return list(pulls.values())
 
 
 @click.command()
 @click.option("--pr_url", type=str, help="GitHub Pull Request URL")
 @click.option("--file_path", type=str, help="Path to the csv file")
-def main(pr_url, file_path):
+@click.option("--repo_url",
+              type=str,
+              help="GitHub repository URL, to export all of its PRs")
+@click.option("--state",
+              "pr_state",
+              type=click.Choice(PR_STATES),
+              default='all',
+              show_default=True,
+              help="State of the PRs listed in --repo_url mode")
+@click.option("--since",
+              type=click.DateTime(formats=["%Y-%m-%d"]),
+              default=None,
+              help="Only PRs created on or after this date (--repo_url)")
+@click.option("--until",
+              type=click.DateTime(formats=["%Y-%m-%d"]),
+              default=None,
+              help="Only PRs created on or before this date (--repo_url)")
+@click.option("--concurrency",
+              type=int,
+              default=GITHUB_CONCURRENCY,
+              show_default=True,
+              help="Requests sent in parallel")
+@click.option("--backend",
+              type=click.Choice(BACKENDS),
+              default='rest',
+              show_default=True,
+              help="graphql fetches many PRs per request")
+@click.option("--graphql_batch_size",
+              type=int,
+              default=GITHUB_GRAPHQL_BATCH_SIZE,
+              show_default=True,
+              help="PRs per GraphQL query")
+@click.option("--incremental",
+              is_flag=True,
+              help="Append only comments not in the existing output")
+@click.option("--no_cache",
+              is_flag=True,
+              help="Skip the ETag cache of GitHub responses")
+@click.option("--layout",
+              type=click.Choice(LAYOUTS),
+              default='flat',
+              show_default=True,
+              help="normalized writes PR descriptions to a separate table")
+@click.option("--format",
+              "output_format",
+              type=click.Choice(FORMATS),
+              default='csv',
+              show_default=True,
+              help="parquet needs pyarrow")
+def main(pr_url, file_path, repo_url, pr_state, since, until, concurrency,
+         backend, graphql_batch_size, incremental, no_cache, layout,
+         output_format):
+    if not (pr_url or file_path or repo_url):
+        print("Error: Enter either --pr_url or \
+                  --repo_url or pr_records.csv file required")
+        sys.exit(1)
+
+    if incremental and output_format == 'parquet':
+        print("Error: --incremental appends to CSV output only")
+        sys.exit(1)
+
+    cache = None if no_cache else GitHubCache(GITHUB_CACHE_PATH,
+                                              GITHUB_CACHE_MAX_ENTRIES)
+    client = GitHubClient(max_workers=concurrency, cache=cache)
+    known_descriptions = None
     if pr_url:
-        api_url = re.sub(r'github\.com/([^/]+)/([^/]+)/pull/(\d+)',
-                         r'api.github.com/repos/\1/\2/pulls/\3/comments',
-                         pr_url)
-        json_data = get_pr_reviews(api_url, pr_url)
+        prs = [(pr_url, pr_url)]
     elif file_path:
         df = pd.read_csv(file_path)
-        json_data = []
-        for index, row in df.iterrows():
-            pr_url = row['Cloned PR Link']
-            api_url = re.sub(r'github\.com/([^/]+)/([^/]+)/pull/(\d+)',
-                             r'api.github.com/repos/\1/\2/pulls/\3/comments',
-                             pr_url)
-            pr_data = get_pr_reviews(api_url, pr_url)
-            if pr_data:
-                json_data.extend(pr_data)
+        clones = df['Cloned PR Link'].tolist()
+        originals = df['Original PR Link'].tolist() \
+            if 'Original PR Link' in df else clones
+        prs = list(zip(clones, originals))
+    else:
+        try:
+            listing = get_pull_requests(client, repo_url, pr_state,
+                                        concurrency, since, until)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"{repo_url}: {len(listing)} PRs")
+        prs = [(pull['html_url'], pull['html_url']) for pull in listing]
+        # The listing already carries the descriptions
+        known_descriptions = {
+            pull['html_url']: pull['body']
+            for pull in listing
+        }
 
+    if file_path:
+        output_file = f"{file_path.strip('.csv')}_bot_comment_data.csv"
+    elif pr_url:
+        output_file = f"{pr_url.split('/')[-1]}.bot_comment_data.csv"
     else:
-        print("Error: Enter either --pr_url or \
-                  --repo_url or pr_records.csv file required")
-        sys.exit(1)
+        output_file = f"{pulls_api_url(repo_url).split('/')[-2]}" \
+            "_bot_comment_data.csv"
+    if output_format == 'parquet':
+        output_file = str(Path(output_file).with_suffix('.parquet'))
+    append = incremental and os.path.exists(output_file)
+    state = ExportState(Path(output_file).with_suffix('.state.json'),
+                        resume=append)
 
-    df = pd.DataFrame(json_data)
-    output_file = f"{file_path.strip('.csv')}_bot_comment_data.csv"  \
-        if file_path else f"{pr_url.split('/')[-1]}.bot_comment_data.csv"
+    try:
+        writer = ExportWriter(output_file, layout, append)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    pulls = fetch_prs_comments(client, prs, concurrency, backend,
+                               graphql_batch_size, state, known_descriptions)
+    for pull in pulls:
+        rows = bot_rows(pull, state)
+        writer.write(pull, rows)
+        state.record(pull.pr_url, pull.comments)
+        print(f"{pull.pr_url}: {len(rows)} {'new ' if append else ''}"
+              "bot comments")
 
-    df.to_csv(output_file, index=False)
+    writer.close()
+    state.close()
+    if cache:
+        cache.close()
+    print(client.stats())
     print("Quality analysis of data done.")
 
 
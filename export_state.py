@@ -0,0 +1,93 @@
+import json
+import os
+from pathlib import Path
+
+
+class ExportState:
+    """Per-PR high-water marks of a comment export, saved next to its CSV.
+
+    `since` is the latest `updated_at` among a PR's fetched comments and
+    is sent as `?since=` so the next run only lists newer or edited ones;
+    the ids of fetched comments keep them from being appended twice.
+
+    Every `record` is appended to a `.jsonl` log right away, so a run that
+    stops between two `save`s still knows each PR whose rows it wrote.
+    `save` folds the log into the JSON snapshot.
+    """
+
+    def __init__(self, path: str | Path, resume: bool = True):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix('.jsonl')
+        prs = json.loads(self.path.read_text()) \
+            if resume and self.path.exists() else {}
+        self.since_by_pr: dict[str, str | None] = {
+            pr_url: state['since']
+            for pr_url, state in prs.items()
+        }
+        self.seen: dict[str, set[int]] = {
+            pr_url: set(state['comment_ids'])
+            for pr_url, state in prs.items()
+        }
+        if resume and self.log_path.exists():
+            self._replay()
+        self.log = open(self.log_path, 'a' if resume else 'w')
+        # Folds the log, torn trailing entry aside, or forgets the state
+        # of an output that is being rewritten
+        self.save()
+
+    def _replay(self):
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(entry['pr_url'], entry['since'],
+                            entry['comment_ids'])
+
+    def _apply(self, pr_url: str, since: str | None, comment_ids: list[int]):
+        self.seen.setdefault(pr_url, set()).update(comment_ids)
+        previous = self.since_by_pr.get(pr_url)
+        self.since_by_pr[pr_url] = max((s for s in (since, previous) if s),
+                                       default=None)
+
+    def since(self, pr_url: str) -> str | None:
+        return self.since_by_pr.get(pr_url)
+
+    def is_new(self, pr_url: str, comment_id: int) -> bool:
+        return comment_id not in self.seen.get(pr_url, ())
+
+    def record(self, pr_url: str, comments: list[dict]):
+        """Mark `comments`, in REST API shape, as exported. Call it once
+        their rows are written."""
+        since = max((c['updated_at'] for c in comments if c.get('updated_at')),
+                    default=None)
+        comment_ids = [c['id'] for c in comments]
+        self._apply(pr_url, since, comment_ids)
+        self.log.write(
+            json.dumps({
+                'pr_url': pr_url,
+                'since': since,
+                'comment_ids': comment_ids
+            }) + '\n')
+        self.log.flush()
+
+    def save(self):
+        prs = {
+            pr_url: {
+                'since': self.since_by_pr.get(pr_url),
+                'comment_ids': sorted(ids)
+            }
+            for pr_url, ids in self.seen.items()
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.write_text(json.dumps(prs))
+        os.replace(tmp_path, self.path)
+        # Replaying the log over the new snapshot changes nothing, so a
+        # crash before the truncation is harmless
+        self.log.seek(0)
+        self.log.truncate()
+
+    def close(self):
+        self.save()
+        self.log.close()
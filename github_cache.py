@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class GitHubCache:
+    """On-disk cache of GitHub GET responses for conditional requests.
+
+    Bodies are stored with their `ETag` and `Link` headers; a 304 answer to
+    `If-None-Match` is served from here and, on GitHub, does not count
+    against the rate limit. Past `max_entries`, the least recently used
+    responses are evicted first.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                link TEXT,
+                body BLOB NOT NULL,
+                last_used_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used "
+                          "ON responses (last_used_at)")
+
+    def get(self, url: str) -> tuple[str, str | None, bytes] | None:
+        """ETag, Link header and body cached for `url`"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, link, body FROM responses WHERE url = ?",
+                (url, )).fetchone()
+        return row
+
+    def touch(self, url: str):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE responses SET last_used_at = ? WHERE url = ?",
+                (time.time(), url))
+            self.conn.commit()
+
+    def set(self, url: str, etag: str, link: str | None, body: bytes):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (url, etag, link, body, time.time()))
+            self.conn.commit()
+
+    def evict(self):
+        """Trim to `max_entries` by LRU"""
+        with self.lock:
+            if self.max_entries:
+                self.conn.execute(
+                    """DELETE FROM responses WHERE url IN (
+                        SELECT url FROM responses
+                        ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)""",
+                    (self.max_entries, ))
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
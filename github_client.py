@@ -0,0 +1,246 @@
+import random
+import re
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (GITHUB_GRAPHQL_URL, GITHUB_MAX_RETRIES,
+                    GITHUB_RATE_LIMIT_RESERVE, GITHUB_TOKEN)
+from github_cache import GitHubCache
+
+# Wait when a secondary rate limit gives no Retry-After, as GitHub advises
+SECONDARY_RATE_LIMIT_WAIT = 60
+
+
+def parse_link_header(link_header: str | None) -> dict[str, str]:
+    """URLs of a Link header by relation (next, last, ...)"""
+    links = {}
+    for link in (link_header or '').split(','):
+        if ';' not in link:
+            continue
+        url, rel = link.split(';', 1)
+        if match := re.search(r'rel="(\w+)"', rel):
+            links[match[1]] = url.strip(' <>')
+    return links
+
+
+def extract_next_link(link_header):
+    return parse_link_header(link_header).get('next')
+
+
+def page_url(url: str, page: int) -> str:
+    """`url` with its `page` query parameter set to `page`"""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['page'] = str(page)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def cached_response(url: str, etag: str, link: str | None,
+                    body: bytes) -> requests.Response:
+    """200 response rebuilt from the cache after a 304"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers['ETag'] = etag
+    if link:
+        response.headers['Link'] = link
+    response._content = body
+    return response
+
+
+class GitHubClient:
+    """Thread-safe GitHub REST client over one keep-alive session.
+
+    The connection pool is sized for `max_workers` threads. Every response's
+    `X-RateLimit-Remaining` / `X-RateLimit-Reset` headers are tracked, and
+    once fewer than GITHUB_RATE_LIMIT_RESERVE requests remain all threads
+    pause until the reset. Primary and secondary rate limit responses
+    (403/429) are retried after `Retry-After` or the reset, 5xx responses
+    and connection errors with jittered backoff. With a `cache`, GETs are
+    conditional on the cached ETag and 304 answers are served from it.
+    """
+
+    def __init__(self,
+                 token: str | None = GITHUB_TOKEN,
+                 max_workers: int = 1,
+                 cache: GitHubCache | None = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=max(max_workers, 1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Accept": "application/vnd.github+json",
+            "Authorization": f"Bearer {token}",
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+        self.lock = threading.Lock()
+        self.remaining: int | None = None
+        self.reset_at = 0.0
+        # time.time() before which no request is sent
+        self.paused_until = 0.0
+        self.requests = 0
+        self.not_modified = 0
+        self.cache = cache
+
+    def _wait_for_budget(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                wait = self.paused_until - now
+                if wait <= 0 and self.remaining is not None and \
+                        self.remaining <= GITHUB_RATE_LIMIT_RESERVE and \
+                        self.reset_at > now:
+                    self._pause_locked(self.reset_at - now)
+                    wait = self.reset_at - now
+                if wait <= 0:
+                    self.requests += 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+            time.sleep(wait)
+
+    def _pause_locked(self, seconds: float):
+        until = time.time() + seconds
+        if until > self.paused_until:
+            print(f"GitHub rate limit: pausing for {seconds:.0f} seconds...")
+            self.paused_until = until
+
+    def _track(self, response: requests.Response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self.lock:
+            if remaining is not None and remaining.isdigit():
+                self.remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.reset_at = float(reset)
+
+    def _pause(self, seconds: float):
+        with self.lock:
+            self._pause_locked(seconds)
+
+    def _rate_limit_wait(self, response: requests.Response) -> float | None:
+        """Seconds to wait before retrying a rate limited response"""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = response.headers.get('X-RateLimit-Reset', '')
+            if reset.isdigit():
+                return max(float(reset) - time.time(), 1)
+        if 'rate limit' in response.text.lower():
+            return SECONDARY_RATE_LIMIT_WAIT
+        return None
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        for attempt in range(GITHUB_MAX_RETRIES):
+            self._wait_for_budget()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if attempt + 1 >= GITHUB_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, 2**attempt)
+                print(f"{type(e).__name__} for {url}, retrying in "
+                      f"{delay:.1f} seconds...")
+                time.sleep(delay)
+                continue
+            self._track(response)
+            wait = self._rate_limit_wait(response)
+            if wait is not None:
+                self._pause(wait)
+                continue
+            if response.status_code >= 500 and \
+                    attempt + 1 < GITHUB_MAX_RETRIES:
+                time.sleep(random.uniform(0, 2**attempt))
+                continue
+            return response
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        if self.cache is None:
+            return self.request('GET', url, **kwargs)
+        key = requests.Request('GET', url,
+                               params=kwargs.get('params')).prepare().url
+        assert key, "A prepared request has a URL"
+        cached = self.cache.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self.request('GET', url, headers=headers, **kwargs)
+        if response.status_code == 304 and cached:
+            with self.lock:
+                self.not_modified += 1
+            self.cache.touch(key)
+            return cached_response(key, *cached)
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag:
+            self.cache.set(key, etag, response.headers.get('Link'),
+                           response.content)
+        return response
+
+    def graphql(self, query: str) -> dict:
+        """`data` of a GraphQL query, waiting out RATE_LIMITED errors;
+        other errors, and rate limits past the last attempt, raise
+        RuntimeError"""
+        errors: list[dict] = []
+        for attempt in range(GITHUB_MAX_RETRIES):
+            response = self.request('POST',
+                                    GITHUB_GRAPHQL_URL,
+                                    json={'query': query})
+            response.raise_for_status()
+            payload = response.json()
+            errors = payload.get('errors') or []
+            if not errors:
+                return payload['data']
+            rate_limited = any(e.get('type') == 'RATE_LIMITED' for e in errors)
+            if not rate_limited or attempt + 1 >= GITHUB_MAX_RETRIES:
+                break
+            wait = self.reset_at - time.time()
+            self._pause(wait if wait > 0 else SECONDARY_RATE_LIMIT_WAIT)
+        messages = '; '.join(e.get('message', '') for e in errors)
+        raise RuntimeError(f"GitHub GraphQL errors: {messages}")
+
+    def stats(self) -> str:
+        return (f"GitHub: {self.requests} requests, {self.not_modified} "
+                "not modified (304)")
+
+    def paginate(self, url: str, **kwargs) -> Iterator[requests.Response]:
+        """Responses of `url` and every page after it via the Link header"""
+        while url:
+            response = self.get(url, **kwargs)
+            response.raise_for_status()
+            yield response
+            url = extract_next_link(response.headers.get('Link'))
+            # The next link already carries the query parameters
+            kwargs.pop('params', None)
+
+    def get_all_pages(self, url: str, max_workers: int,
+                      **kwargs) -> list[requests.Response]:
+        """Responses of every page of `url`, in order. When the first page
+        links to the `last` one, the pages in between are fetched
+        `max_workers` at a time; otherwise `next` links are followed."""
+        first = self.get(url, **kwargs)
+        first.raise_for_status()
+        links = parse_link_header(first.headers.get('Link'))
+        last = links.get('last')
+        last_page = dict(parse_qsl(urlsplit(last).query)).get('page') \
+            if last else None
+        if not last or not last_page or not last_page.isdigit():
+            return [first] + list(self.paginate(links['next'])) \
+                if 'next' in links else [first]
+
+        def fetch(page: int) -> requests.Response:
+            response = self.get(page_url(last, page))
+            response.raise_for_status()
+            return response
+
+        pages = range(2, int(last_page) + 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return [first] + list(executor.map(fetch, pages))
@@ -0,0 +1,60 @@
+import json
+
+
+def parse_llm_json(text: str):
+    """Parse a JSON answer, tolerating a surrounding ```json fence"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:-3].strip()
+    if text.startswith("json"):
+        text = text[4:].strip()
+    return json.loads(text)
+
+
+class JsonArrayItemParser:
+    """Incrementally extracts objects that are direct items of a JSON array.
+
+    Works on `[{...}, ...]` as well as `{"results": [{...}, ...]}` and
+    ignores anything outside of the JSON value, such as markdown fences.
+    Feed it text as it streams in and it returns each item once its closing
+    brace has arrived.
+    """
+
+    def __init__(self):
+        self.stack: list[str] = []
+        self.in_string = False
+        self.escaped = False
+        self.item_depth: int | None = None
+        self.item_chars: list[str] = []
+
+    def feed(self, text: str) -> list[dict]:
+        items = []
+        for char in text:
+            if self.item_depth is not None:
+                self.item_chars.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                if char == '{' and self.item_depth is None and \
+                        self.stack and self.stack[-1] == '[':
+                    self.item_depth = len(self.stack)
+                    self.item_chars = [char]
+                self.stack.append(char)
+            elif char in ']}' and self.stack:
+                self.stack.pop()
+                if self.item_depth is not None and \
+                        len(self.stack) == self.item_depth:
+                    self.item_depth = None
+                    try:
+                        items.append(json.loads(''.join(self.item_chars)))
+                    except json.JSONDecodeError as e:
+                        print(f"Skipping unparsable streamed item: {e}")
+        return items
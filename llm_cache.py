@@ -0,0 +1,103 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class LLMCache:
+    """On-disk LLM response cache keyed by model and rendered prompts.
+
+    Entries older than `max_age_days` are dropped and, past `max_entries`,
+    the least recently used ones are evicted first.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_age_days: float = 30,
+                 max_entries: int = 100_000):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_age_days = max_age_days
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used "
+                          "ON responses (last_used_at)")
+        self.evict()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, system_prompt, user_prompt):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, models: list[str], system_prompt: str,
+            user_prompt: str) -> tuple[str, str] | None:
+        """First cached (model, response) among `models`, counted as a
+        single hit or miss"""
+        with self.lock:
+            for model in models:
+                key = self.make_key(model, system_prompt, user_prompt)
+                row = self.conn.execute(
+                    "SELECT response FROM responses WHERE key = ?",
+                    (key, )).fetchone()
+                if row is not None:
+                    break
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE responses SET last_used_at = ? WHERE key = ?",
+                (time.time(), key))
+            self.conn.commit()
+        return model, row[0]
+
+    def set(self, model: str, system_prompt: str, user_prompt: str,
+            response: str):
+        key = self.make_key(model, system_prompt, user_prompt)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now))
+            self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then trim to `max_entries` by LRU"""
+        with self.lock:
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                self.conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                  (cutoff, ))
+            if self.max_entries:
+                self.conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses
+                        ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)""",
+                    (self.max_entries, ))
+            self.conn.commit()
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"LLM cache: {self.hits} hits, {self.misses} misses "
+                f"({rate:.1f}% hit rate)")
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,424 @@
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+PERCENTILES = (50, 90, 95, 99)
+
+
+def sum_costs(
+        costs: dict[str, float | None]) -> tuple[float | None, list[str]]:
+    """Total of the known costs by model, None when none is known, and the
+    models whose cost is unknown"""
+    known = [c for c in costs.values() if c is not None]
+    unknown = sorted(m for m, c in costs.items() if c is None)
+    return (round(sum(known), 6) if known else None), unknown
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path.write_text(text)
+    tmp_path.replace(path)
+
+
+class RunMetrics:
+    """Thread-safe counters and latency samples of one eval_prs.py run.
+
+    `prices` maps a model to its (prompt, completion) USD price per million
+    tokens; models without a price report no cost and are listed apart
+    from the total.
+    """
+
+    def __init__(self, prices: dict[str, list[float]] | None = None):
+        self.prices = prices or {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.tokens: dict[str, Counter[str]] = defaultdict(Counter)
+        # Calls, errors and retries by provider
+        self.providers: dict[str, Counter[str]] = defaultdict(Counter)
+        # Suggestions sent and seconds spent waiting, by model
+        self.items: Counter[str] = Counter()
+        self.model_latency: defaultdict[str, float] = defaultdict(float)
+        # (fast, strong) models of a cascade run
+        self.cascade: tuple[str, str] | None = None
+        self.cascade_items = 0
+        self.escalations: Counter[str] = Counter()
+        self.retries = 0
+        self.cache_hits: Counter[str] = Counter()
+        self.rate_limit_waits = 0
+        self.rate_limit_sleep = 0.0
+        self.rows_written = 0
+        # Estimated prompt tokens of the diffs sent, before and after
+        # compaction, counted once per prompt
+        self.diff_tokens_before = 0
+        self.diff_tokens_after = 0
+        self.compacted_diffs = 0
+
+    def start(self):
+        """Restart the clock, e.g. once interactive prompts are answered"""
+        with self.lock:
+            self.started = time.time()
+
+    def record_call(self,
+                    model: str | None,
+                    prompt_name: str | None,
+                    latency: float,
+                    usage: dict | None,
+                    failed: bool,
+                    provider: str | None = None,
+                    items: int = 0):
+        model = model or 'unknown'
+        with self.lock:
+            self.latencies[prompt_name or 'unknown'].append(latency)
+            self.calls[model] += 1
+            self.items[model] += items
+            self.model_latency[model] += latency
+            self.providers[provider or 'unknown']['calls'] += 1
+            if failed:
+                self.errors[model] += 1
+                self.providers[provider or 'unknown']['errors'] += 1
+            for key, value in (usage or {}).items():
+                self.tokens[model][key] += value
+
+    def record_retry(self, provider: str | None = None):
+        with self.lock:
+            self.retries += 1
+            self.providers[provider or 'unknown']['retries'] += 1
+
+    def record_cache_hit(self, model: str):
+        with self.lock:
+            self.cache_hits[model] += 1
+
+    def record_rate_limit_wait(self, seconds: float):
+        with self.lock:
+            self.rate_limit_waits += 1
+            self.rate_limit_sleep += seconds
+
+    def record_compaction(self, before: int, after: int, prompts: int = 1):
+        with self.lock:
+            self.diff_tokens_before += before * prompts
+            self.diff_tokens_after += after * prompts
+            if after < before:
+                self.compacted_diffs += 1
+
+    def record_rows(self, count: int):
+        with self.lock:
+            self.rows_written += count
+
+    def enable_cascade(self, fast_model: str, strong_model: str):
+        self.cascade = (fast_model, strong_model)
+
+    def record_escalations(self, items: int, reasons: list[str]):
+        """Outcome of one cascade batch: `reasons` has one entry per
+        suggestion sent on to the strong model"""
+        with self.lock:
+            self.cascade_items += items
+            self.escalations.update(reasons)
+
+    def cost(self, model: str, tokens: Counter[str]) -> float | None:
+        if model not in self.prices:
+            return None
+        prompt_price, completion_price = self.prices[model]
+        return (tokens['prompt_tokens'] * prompt_price +
+                tokens['completion_tokens'] * completion_price) / 1_000_000
+
+    def summary(self) -> dict:
+        with self.lock:
+            elapsed = time.time() - self.started
+            latencies = {
+                name: sorted(values)
+                for name, values in self.latencies.items()
+            }
+            all_latencies = sorted(v for values in latencies.values()
+                                   for v in values)
+            models = {
+                model: {
+                    'calls': self.calls[model],
+                    'errors': self.errors[model],
+                    'prompt_tokens': self.tokens[model]['prompt_tokens'],
+                    'completion_tokens':
+                    self.tokens[model]['completion_tokens'],
+                    'cache_hits': self.cache_hits[model],
+                    'cost_usd': self.cost(model, self.tokens[model]),
+                }
+                for model in self.calls | self.cache_hits
+            }
+            providers = {
+                name: {
+                    'calls': counts['calls'],
+                    'errors': counts['errors'],
+                    'retries': counts['retries'],
+                }
+                for name, counts in self.providers.items()
+            }
+            total_cost, unknown_cost_models = sum_costs({
+                model: m['cost_usd']
+                for model, m in models.items()
+                if m['prompt_tokens'] or m['completion_tokens']
+            })
+            rows_per_minute = self.rows_written / elapsed * 60
+            cascade = self._cascade_summary(
+                *self.cascade) if self.cascade else None
+            latency_stats = {'all': self._latency_stats(all_latencies)}
+            for name, values in latencies.items():
+                latency_stats[name] = self._latency_stats(values)
+            return {
+                'elapsed_s': round(elapsed, 3),
+                'rows_written': self.rows_written,
+                'rows_per_minute': round(rows_per_minute, 2),
+                'llm_calls': sum(self.calls.values()),
+                'llm_errors': sum(self.errors.values()),
+                'retries': self.retries,
+                'cache_hits': sum(self.cache_hits.values()),
+                'rate_limit_waits': self.rate_limit_waits,
+                'rate_limit_sleep_s': round(self.rate_limit_sleep, 3),
+                'latency_s': latency_stats,
+                'latency_histogram': self._histogram(all_latencies),
+                'diff_compaction': {
+                    'compacted_diffs':
+                    self.compacted_diffs,
+                    'tokens_before':
+                    self.diff_tokens_before,
+                    'tokens_after':
+                    self.diff_tokens_after,
+                    'tokens_saved':
+                    self.diff_tokens_before - self.diff_tokens_after,
+                },
+                'models': models,
+                'providers': providers,
+                'cost_usd': total_cost,
+                'cost_unknown_models': unknown_cost_models,
+                'cascade': cascade,
+            }
+
+    def _cascade_summary(self, fast: str, strong: str) -> dict:
+        """Escalation rate, and cost and LLM time against an estimate of
+        sending every suggestion to the strong model. The estimate scales
+        the strong model's per-suggestion cost and latency seen in this
+        run; without escalations the cost prices fast-model tokens at the
+        strong model's rates and the latency is unknown."""
+        escalated = sum(self.escalations.values())
+        # The fast model saw every suggestion once per prompt
+        all_items = self.items[fast]
+        strong_items = self.items[strong]
+        costs = [self.cost(m, self.tokens[m]) for m in (fast, strong)]
+        cost, unknown_cost_models = sum_costs(dict(zip((fast, strong), costs)))
+        latency = self.model_latency[fast] + self.model_latency[strong]
+        if strong_items:
+            strong_cost = costs[1]
+            all_strong_cost = strong_cost / strong_items * all_items \
+                if strong_cost is not None else None
+            all_strong_latency = self.model_latency[strong] / strong_items \
+                * all_items
+        else:
+            all_strong_cost = self.cost(strong, self.tokens[fast])
+            all_strong_latency = None
+
+        def saved(actual, baseline):
+            if actual is None or baseline is None:
+                return None
+            return round(baseline - actual, 6)
+
+        def rounded(value, digits):
+            return None if value is None else round(value, digits)
+
+        return {
+            'fast_model':
+            fast,
+            'strong_model':
+            strong,
+            'suggestions':
+            self.cascade_items,
+            'escalated':
+            escalated,
+            'escalation_rate':
+            round(escalated /
+                  self.cascade_items, 4) if self.cascade_items else 0.0,
+            'escalation_reasons':
+            dict(self.escalations),
+            'cost_usd':
+            cost,
+            'cost_unknown_models':
+            unknown_cost_models,
+            'all_strong_cost_usd':
+            rounded(all_strong_cost, 6),
+            'cost_saved_usd':
+            None if unknown_cost_models else saved(cost, all_strong_cost),
+            'llm_seconds':
+            round(latency, 3),
+            'all_strong_llm_seconds':
+            rounded(all_strong_latency, 3),
+            'llm_seconds_saved':
+            rounded(saved(latency, all_strong_latency), 3),
+        }
+
+    @staticmethod
+    def _latency_stats(values: list[float]) -> dict:
+        stats = {f'p{p}': round(percentile(values, p), 3) for p in PERCENTILES}
+        stats['count'] = len(values)
+        stats['sum'] = round(sum(values), 3)
+        stats['mean'] = round(sum(values) / len(values), 3) if values else 0.0
+        stats['max'] = round(values[-1], 3) if values else 0.0
+        return stats
+
+    @staticmethod
+    def _histogram(values: list[float]) -> dict[str, int]:
+        """Cumulative counts per bucket upper bound, Prometheus style"""
+        buckets = {
+            str(bound): sum(v <= bound for v in values)
+            for bound in LATENCY_BUCKETS
+        }
+        buckets['+Inf'] = len(values)
+        return buckets
+
+    def prometheus(self) -> str:
+        """Summary in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str,
+                   samples: list[tuple[str, float]]):
+            lines.append(f"# HELP eval_prs_{name} {help_text}")
+            lines.append(f"# TYPE eval_prs_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"eval_prs_{name}{labels} {value}")
+
+        metric('rows_written_total', 'counter', 'Rows written to results',
+               [('', summary['rows_written'])])
+        metric('rows_per_minute', 'gauge', 'Rows written per minute',
+               [('', summary['rows_per_minute'])])
+        metric('rate_limit_sleep_seconds_total', 'counter',
+               'Time spent waiting on the rate limiter',
+               [('', summary['rate_limit_sleep_s'])])
+        metric('diff_tokens_saved_total', 'counter',
+               'Estimated prompt tokens saved by diff compaction',
+               [('', summary['diff_compaction']['tokens_saved'])])
+        metric('retries_total', 'counter', 'Retried LLM requests',
+               [('', summary['retries'])])
+        metric('cache_hits_total', 'counter', 'Answers served from cache',
+               [('', summary['cache_hits'])])
+        models = summary['models']
+        metric('llm_calls_total', 'counter', 'LLM calls by model',
+               [(f'{{model="{m}"}}', v['calls']) for m, v in models.items()])
+        metric('llm_errors_total', 'counter', 'Failed LLM calls by model',
+               [(f'{{model="{m}"}}', v['errors']) for m, v in models.items()])
+        metric('llm_tokens_total', 'counter', 'Tokens reported by model',
+               [(f'{{model="{m}",kind="{kind}"}}', v[f'{kind}_tokens'])
+                for m, v in models.items()
+                for kind in ('prompt', 'completion')])
+        metric('llm_cost_usd_total', 'counter', 'Estimated cost by model',
+               [(f'{{model="{m}"}}', v['cost_usd'])
+                for m, v in models.items() if v['cost_usd'] is not None])
+        providers = summary['providers']
+        metric('provider_calls_total', 'counter', 'LLM calls by provider',
+               [(f'{{provider="{p}"}}', v['calls'])
+                for p, v in providers.items()])
+        metric('provider_retries_total', 'counter',
+               'Throttled or failed calls failed over, by provider',
+               [(f'{{provider="{p}"}}', v['retries'])
+                for p, v in providers.items()])
+        cascade = summary['cascade']
+        if cascade:
+            metric('cascade_suggestions_total', 'counter',
+                   'Suggestions answered first by the fast model',
+                   [('', cascade['suggestions'])])
+            metric('cascade_escalations_total', 'counter',
+                   'Suggestions sent on to the strong model, by reason',
+                   [(f'{{reason="{r}"}}', n)
+                    for r, n in cascade['escalation_reasons'].items()])
+        histogram = summary['latency_histogram']
+        all_latency = summary['latency_s']['all']
+        metric('llm_request_duration_seconds', 'histogram',
+               'LLM request latency', [(f'_bucket{{le="{bound}"}}', count)
+                                       for bound, count in histogram.items()] +
+               [('_sum', all_latency['sum']),
+                ('_count', all_latency['count'])])
+        return '\n'.join(lines) + '\n'
+
+    def report_line(self) -> str:
+        summary = self.summary()
+        latency = summary['latency_s']['all']
+        cost = summary['cost_usd']
+        line = (f"Metrics: {summary['rows_written']} rows "
+                f"({summary['rows_per_minute']}/min), "
+                f"{summary['llm_calls']} LLM calls "
+                f"(p50 {latency['p50']}s, p95 {latency['p95']}s), "
+                f"{summary['rate_limit_sleep_s']}s rate limited, cost "
+                f"{'n/a' if cost is None else f'${cost:.4f}'}")
+        if summary['cost_unknown_models']:
+            line += (" plus unpriced "
+                     f"{', '.join(summary['cost_unknown_models'])}")
+        compaction = summary['diff_compaction']
+        if compaction['compacted_diffs']:
+            line += (f"\nDiff compaction: {compaction['compacted_diffs']} "
+                     f"diffs compacted, ~{compaction['tokens_saved']} of "
+                     f"{compaction['tokens_before']} diff tokens saved")
+        cascade = summary['cascade']
+        if cascade:
+            saved_cost = cascade['cost_saved_usd']
+            saved_time = cascade['llm_seconds_saved']
+            line += (f"\nCascade: {cascade['escalated']}/"
+                     f"{cascade['suggestions']} escalated to "
+                     f"{cascade['strong_model']} "
+                     f"({cascade['escalation_rate']:.1%}), saved "
+                     f"{'n/a' if saved_cost is None else f'${saved_cost:.4f}'}"
+                     f" and {'n/a' if saved_time is None else saved_time}s "
+                     f"of LLM time vs {cascade['strong_model']} only")
+        return line
+
+
+class MetricsExporter:
+    """Writes the metrics summary as JSON, and optionally a Prometheus
+    textfile, every `interval` seconds and once more on `stop`"""
+
+    def __init__(self,
+                 metrics: RunMetrics,
+                 json_path: str,
+                 prometheus_path: str | None = None,
+                 interval: float = 60):
+        self.metrics = metrics
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run,
+                                       name='metrics-exporter',
+                                       daemon=True)
+
+    def start(self):
+        if self.interval:
+            self.thread.start()
+
+    def export(self):
+        _write_atomic(self.json_path,
+                      json.dumps(self.metrics.summary(), indent=2) + '\n')
+        if self.prometheus_path:
+            _write_atomic(self.prometheus_path, self.metrics.prometheus())
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.export()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.export()
+        print(self.metrics.report_line())
+        print(f"Metrics written to {self.json_path}")
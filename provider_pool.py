@@ -0,0 +1,142 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from openai import OpenAI
+
+from rate_limiter import TokenBucketRateLimiter
+
+ROUTING_STRATEGIES = ('least_loaded', 'weighted')
+
+
+@dataclass
+class Provider:
+    """One LLM endpoint and key, with its own rate budget"""
+    name: str
+    client: OpenAI
+    model: str
+    rate_limiter: TokenBucketRateLimiter
+    weight: float = 1.0
+    in_flight: int = 0
+    # time.monotonic() before which the endpoint is skipped
+    suspended_until: float = 0.0
+    suspensions: int = 0
+
+
+def load_providers(specs: list[dict]) -> list[Provider]:
+    """Providers from LLM_PROVIDERS entries. The key is `api_key`, or read
+    from the environment variable named by `api_key_env`."""
+    providers = []
+    for i, spec in enumerate(specs):
+        api_key = spec.get('api_key') or os.getenv(spec.get('api_key_env', ''))
+        providers.append(
+            Provider(
+                name=spec.get('name', f"provider-{i}"),
+                # Retries are handled by QualityChecker._create_completion
+                client=OpenAI(api_key=api_key,
+                              base_url=spec.get('base_url'),
+                              max_retries=0),
+                model=spec['model'],
+                rate_limiter=TokenBucketRateLimiter(
+                    requests_per_minute=spec.get('requests_per_minute', 0),
+                    tokens_per_minute=spec.get('tokens_per_minute', 0),
+                    burst=spec.get('burst', 1),
+                ),
+                weight=float(spec.get('weight', 1)),
+            ))
+    names = [p.name for p in providers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate provider names in {names}")
+    return providers
+
+
+class ProviderPool:
+    """Routes requests across providers within their rate budgets.
+
+    `least_loaded` picks the provider with the fewest requests in flight
+    per unit of weight, `weighted` picks at random in proportion to weight.
+    A throttled or failing provider is suspended for a while and requests
+    fail over to the others; when every provider is suspended or out of
+    budget, `acquire` waits for the first one to free up.
+    """
+
+    def __init__(self,
+                 providers: list[Provider],
+                 routing: str = 'least_loaded'):
+        if not providers:
+            raise ValueError("At least one LLM provider is required")
+        if routing not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown routing strategy {routing!r}")
+        self.providers = providers
+        self.by_name = {p.name: p for p in providers}
+        self.routing = routing
+        self.lock = threading.Lock()
+
+    @property
+    def primary(self) -> Provider:
+        """First configured provider, used where one endpoint must serve
+        a whole job (e.g. the Batch API)"""
+        return self.providers[0]
+
+    def models(self) -> list[str]:
+        return list(dict.fromkeys(p.model for p in self.providers))
+
+    def _route(self, providers: list[Provider]) -> list[Provider]:
+        """Providers in order of preference"""
+        if self.routing == 'weighted':
+            # Weighted random order (Efraimidis-Spirakis keys)
+            return sorted(providers,
+                          key=lambda p: random.random()**(1 / p.weight),
+                          reverse=True)
+        return sorted(providers,
+                      key=lambda p: (p.in_flight / p.weight, -p.weight))
+
+    def acquire(self,
+                tokens: int = 0,
+                model: str | None = None) -> tuple[Provider, float]:
+        """Lease a provider, serving `model` if given, with budget for one
+        request of `tokens`; returns it and the seconds spent waiting for
+        rate budget"""
+        candidates = [
+            p for p in self.providers if model is None or p.model == model
+        ]
+        if not candidates:
+            raise ValueError(f"No LLM provider serves {model}")
+        slept = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                budget_waits = []
+                available = [p for p in candidates if p.suspended_until <= now]
+                for provider in self._route(available):
+                    wait = provider.rate_limiter.try_acquire(tokens)
+                    if not wait:
+                        provider.in_flight += 1
+                        return provider, slept
+                    budget_waits.append(wait)
+                suspension_waits = [
+                    p.suspended_until - now for p in candidates
+                    if p.suspended_until > now
+                ]
+            wait = min(budget_waits + suspension_waits)
+            time.sleep(wait)
+            # Waiting out a suspension is backoff, not rate limiting
+            if budget_waits and wait == min(budget_waits):
+                slept += wait
+
+    def release(self, name: str, suspend_for: float = 0.0):
+        """End a lease; `suspend_for` seconds keep requests away from a
+        throttled or failing provider"""
+        with self.lock:
+            provider = self.by_name[name]
+            provider.in_flight -= 1
+            if suspend_for:
+                provider.suspensions += 1
+                provider.suspended_until = max(provider.suspended_until,
+                                               time.monotonic() + suspend_for)
+
+    def reconcile(self, name: str, estimated_tokens: int, actual_tokens: int):
+        self.by_name[name].rate_limiter.reconcile(estimated_tokens,
+                                                  actual_tokens)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucketRateLimiter:
+    """Thread-safe requests-per-minute and tokens-per-minute budget.
+
+    Both buckets start full and refill continuously. The request bucket
+    holds at most `burst` requests, so requests are spread over the minute
+    instead of all being sent at once. A limit of 0 disables that bucket.
+    """
+
+    def __init__(self,
+                 requests_per_minute: int,
+                 tokens_per_minute: int = 0,
+                 burst: int = 1):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_capacity = float(min(requests_per_minute, max(burst, 1)))
+        self.request_allowance = self.request_capacity
+        self.token_allowance = float(tokens_per_minute)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.request_allowance = min(
+            self.request_capacity,
+            self.request_allowance + elapsed * self.requests_per_minute / 60)
+        self.token_allowance = min(
+            float(self.tokens_per_minute),
+            self.token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests_per_minute and self.request_allowance < 1:
+            wait = max(wait, (1 - self.request_allowance) * 60 /
+                       self.requests_per_minute)
+        if self.tokens_per_minute and self.token_allowance < tokens:
+            wait = max(wait, (tokens - self.token_allowance) * 60 /
+                       self.tokens_per_minute)
+        return wait
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """Take one request of `tokens` if it fits now and return 0,
+        otherwise return the seconds until it would fit"""
+        # A single request larger than the whole budget would never fit
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        with self.lock:
+            self._refill()
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                return wait
+            if self.requests_per_minute:
+                self.request_allowance -= 1
+            if self.tokens_per_minute:
+                self.token_allowance -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request of `tokens` fits, return seconds slept"""
+        slept = 0.0
+        while wait := self.try_acquire(tokens):
+            time.sleep(wait)
+            slept += wait
+        return slept
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once real usage is known"""
+        if not self.tokens_per_minute:
+            return
+        with self.lock:
+            self.token_allowance -= actual_tokens - estimated_tokens
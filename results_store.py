@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+import sqlite3
+from collections.abc import Iterator
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+# Columns QualityChecker appends to the input CSV columns
+RESULT_FIELDNAMES = [
+    'results', "is_false_positive", "final_result", 'row_number', 'provider',
+    'model'
+]
+
+
+def verdict_from_row(row: dict) -> dict:
+    return {
+        'category': row['results'],
+        'is_false_positive': row['is_false_positive'] == 'True',
+        'provider': row.get('provider', ''),
+        'model': row.get('model', ''),
+    }
+
+
+def _csv_records(f: BinaryIO) -> Iterator[tuple[list[str], int]]:
+    """Yield CSV records with the byte offset at which each one ends"""
+    offset = 0
+
+    def lines():
+        nonlocal offset
+        for line in f:
+            offset += len(line)
+            yield line.decode()
+
+    for record in csv.reader(lines()):
+        yield record, offset
+
+
+class CsvResultsStore:
+    """Results appended to the `.output.csv` file, loaded fully on resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.processed_rows: set[int] = set()
+        self.verdicts: dict[str, dict] = {}
+        self.file: TextIO | None = None
+        self.writer: csv.DictWriter | None = None
+
+    def load(self, dedup_key=None):
+        """Read processed rows, dropping a torn trailing row if any"""
+        if not Path(self.path).exists():
+            return
+        with open(self.path, 'rb') as f:
+            records = _csv_records(f)
+            header, good_end = next(records, ([], 0))
+            for record, end in records:
+                row = dict(zip(header, record))
+                if len(record) != len(header) or \
+                        not row.get('row_number', '').isdigit():
+                    break
+                good_end = end
+                self.processed_rows.add(int(row['row_number']))
+                if dedup_key:
+                    self.verdicts[dedup_key(row)] = verdict_from_row(row)
+        if good_end < os.path.getsize(self.path):
+            print(f"Dropping torn row at the end of {self.path}")
+            os.truncate(self.path, good_end)
+
+    def processed_count(self) -> int:
+        return len(self.processed_rows)
+
+    def is_processed(self, row_number: int) -> bool:
+        return row_number in self.processed_rows
+
+    def get_verdict(self, key: str) -> dict | None:
+        return self.verdicts.get(key)
+
+    def open(self, fieldnames: list[str]):
+        file_exists = Path(self.path).exists() and \
+            os.path.getsize(self.path) > 0
+        if file_exists:
+            # Keep the layout of a file written by an older version
+            with open(self.path, newline='') as f:
+                fieldnames = next(csv.reader(f))
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file,
+                                     fieldnames=fieldnames,
+                                     extrasaction='ignore')
+        if not file_exists:
+            self.writer.writeheader()
+
+    def write_rows(self, rows: list[tuple[str, dict]]):
+        """Append (dedup key, output row) pairs"""
+        assert self.file and self.writer, "Store is not open"
+        for _, output_row in rows:
+            self.writer.writerow(output_row)
+            self.processed_rows.add(int(output_row['row_number']))
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class SqliteResultsStore:
+    """Results keyed by row_number in a WAL-mode SQLite database.
+
+    Each `write_rows` call is one transaction, so an interrupted run never
+    leaves a partial batch behind, and resume lookups hit the primary key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                row_number INTEGER PRIMARY KEY,
+                dedup_key TEXT NOT NULL,
+                data TEXT NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_dedup_key "
+                          "ON results (dedup_key)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta "
+                          "(key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+        self.fieldnames: list[str] = []
+
+    def load(self, dedup_key=None):
+        """Nothing to preload, resume lookups go through the indexes"""
+
+    def processed_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def is_processed(self, row_number: int) -> bool:
+        return self.conn.execute("SELECT 1 FROM results WHERE row_number = ?",
+                                 (row_number, )).fetchone() is not None
+
+    def get_verdict(self, key: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT data FROM results WHERE dedup_key = ? LIMIT 1",
+            (key, )).fetchone()
+        return verdict_from_row(json.loads(row[0])) if row else None
+
+    def open(self, fieldnames: list[str]):
+        self.fieldnames = fieldnames
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('fieldnames', ?)",
+                (json.dumps(fieldnames), ))
+
+    def write_rows(self, rows: list[tuple[str, dict]]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                [(int(output_row['row_number']), key,
+                  json.dumps({
+                      k:
+                      '' if output_row.get(k) is None else str(output_row[k])
+                      for k in self.fieldnames
+                  })) for key, output_row in rows])
+
+    def export_csv(self, path: str) -> int:
+        """Write the stored results in the CSV layout of CsvResultsStore"""
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'fieldnames'").fetchone()
+        if row is None:
+            return 0
+        fieldnames = json.loads(row[0])
+        count = 0
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for (data, ) in self.conn.execute(
+                    "SELECT data FROM results ORDER BY row_number"):
+                writer.writerow(json.loads(data))
+                count += 1
+        return count
+
+    def close(self):
+        self.conn.close()
+
+
+def open_results_store(backend: str, output_file: str):
+    if backend == 'sqlite':
+        return SqliteResultsStore(
+            str(Path(output_file).with_suffix('.sqlite3')))
+    return CsvResultsStore(output_file)
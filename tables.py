@@ -0,0 +1,104 @@
+import csv
+from collections.abc import Iterator
+from pathlib import Path
+
+# Rows buffered per Parquet row group
+PARQUET_ROW_GROUP_ROWS = 10_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError(
+            "Parquet files need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def is_parquet(path: str | Path) -> bool:
+    return str(path).endswith('.parquet')
+
+
+class CsvTable:
+    """Appends rows to a CSV file, flushed after every write"""
+
+    def __init__(self,
+                 path: str | Path,
+                 columns: list[str],
+                 append: bool = False):
+        self.file = open(path, 'a' if append else 'w', newline='')
+        self.writer = csv.DictWriter(self.file,
+                                     fieldnames=columns,
+                                     extrasaction='ignore',
+                                     lineterminator='\n')
+        if not append:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def write(self, rows: list[dict]):
+        if rows:
+            self.writer.writerows(rows)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetTable:
+    """Writes rows of string columns to a Parquet file, one row group per
+    PARQUET_ROW_GROUP_ROWS rows"""
+
+    def __init__(self, path: str | Path, columns: list[str]):
+        pa = _pyarrow()
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(c, pa.string()) for c in columns])
+        self.writer = pa.parquet.ParquetWriter(str(path), self.schema)
+        self.buffer: list[dict] = []
+
+    def write(self, rows: list[dict]):
+        for row in rows:
+            self.buffer.append({c: row.get(c) for c in self.columns})
+        if len(self.buffer) >= PARQUET_ROW_GROUP_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(
+                self.pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def open_table(path: str | Path,
+               columns: list[str],
+               append: bool = False) -> CsvTable | ParquetTable:
+    if is_parquet(path):
+        if append:
+            raise ValueError("Parquet files cannot be appended to")
+        return ParquetTable(path, columns)
+    return CsvTable(path, columns, append)
+
+
+def table_columns(path: str | Path) -> list[str]:
+    if is_parquet(path):
+        parquet_file = _pyarrow().parquet.ParquetFile(str(path))
+        return list(parquet_file.schema_arrow.names)
+    with open(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def iter_table_rows(path: str | Path) -> Iterator[dict]:
+    """Rows of a CSV or Parquet file as dicts of strings, streamed"""
+    if not is_parquet(path):
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    parquet_file = _pyarrow().parquet.ParquetFile(str(path))
+    for batch in parquet_file.iter_batches():
+        for row in batch.to_pylist():
+            yield {k: '' if v is None else str(v) for k, v in row.items()}
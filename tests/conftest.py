@@ -0,0 +1,109 @@
+import csv
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# The scripts are top-level modules of the repository root
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks import mock_github, mock_openai  # noqa: E402
+
+PR_URLS = [
+    f'https://github.com/bench-org/service/pull/{n}' for n in range(1, 7)
+]
+
+
+def serve(server) -> str:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+@pytest.fixture
+def openai_url():
+    """Base URL of a mock OpenAI endpoint with instant batches"""
+    server = mock_openai.make_server(0, batch_latency=0)
+    yield f'{serve(server)}/v1'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def llm(openai_url, monkeypatch):
+    """eval_prs.py pointed at the mock OpenAI endpoint as its only
+    provider, without transcript, run from the repository root for its
+    prompts"""
+    import eval_prs
+
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setattr(eval_prs, 'LLM_PROVIDERS', [{
+        'name': 'mock',
+        'base_url': openai_url,
+        'api_key': 'mock',
+        'model': 'mock-model',
+    }])
+    monkeypatch.setattr(eval_prs, 'LLM_TRANSCRIPT_DIR', '')
+    return openai_url
+
+
+@pytest.fixture
+def github(tmp_path, monkeypatch):
+    """Mock GitHub with six PRs of twelve comments per repository, which
+    the export script and GitHub client are pointed at"""
+    import export_gh_comments_to_csv
+    import github_client
+
+    server = mock_github.make_server(0,
+                                     str(tmp_path / 'git'),
+                                     prs_per_repo=6,
+                                     comments_per_pr=12,
+                                     comments_per_thread=5)
+    url = serve(server)
+    monkeypatch.setattr(export_gh_comments_to_csv, 'GITHUB_API_URL', url)
+    monkeypatch.setattr(github_client, 'GITHUB_GRAPHQL_URL', f'{url}/graphql')
+    yield getattr(server.RequestHandlerClass, 'mock')
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def export_input(tmp_path, github, monkeypatch):
+    """Export input listing the mock's PRs, in a temporary working
+    directory"""
+    monkeypatch.chdir(tmp_path)
+    # Named so the script's `.strip('.csv')` keeps the stem intact
+    with open('export_input.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Original PR Link', 'Cloned PR Link'])
+        writer.writerows([url, url] for url in PR_URLS)
+    return 'export_input.csv'
+
+
+def export(input_file: str, *options: str):
+    """Run export_gh_comments_to_csv.py without its ETag cache"""
+    from export_gh_comments_to_csv import main
+
+    main.main(['--file_path', input_file, '--no_cache', *options],
+              standalone_mode=False)
+
+
+@pytest.fixture
+def clone_env(tmp_path, github, monkeypatch):
+    """clone_prs.py pointed at the mock GitHub and its git remotes, with
+    mirrors and scratch space under `tmp_path`; returns the scratch
+    directory"""
+    import clone_prs
+
+    monkeypatch.setattr(clone_prs, 'GITHUB_API_URL', github.base_url)
+    monkeypatch.setattr(clone_prs, 'GITHUB_DIFF_URL', f'{github.base_url}/raw')
+    monkeypatch.setattr(clone_prs, 'GITHUB_GIT_URL',
+                        f'file://{tmp_path / "git"}')
+    monkeypatch.setattr(clone_prs, 'GITHUB_USERNAME', github.user_login)
+    monkeypatch.setattr(clone_prs, 'GITHUB_EMAIL', 'bench@example.com')
+    monkeypatch.setattr(clone_prs, 'CLONE_CACHE_DIR',
+                        str(tmp_path / 'mirrors'))
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    return str(scratch)
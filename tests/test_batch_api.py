@@ -0,0 +1,130 @@
+import csv
+import json
+import signal
+from pathlib import Path
+
+import pytest
+
+import batch_api
+from batch_api import BatchApiRunner
+from batch_packer import BatchPacker
+from eval_prs import QualityChecker, render_prompt
+from results_store import SqliteResultsStore
+from tables import iter_table_rows
+
+FIELDNAMES = ['Original PR Link', 'Suggestion', 'Small Diff']
+
+
+@pytest.fixture
+def input_file(tmp_path, llm, monkeypatch):
+    """Ten rows in two batches of five, row 5 repeating row 0"""
+    # One group of two prompts per job
+    monkeypatch.setattr(batch_api, 'LLM_BATCH_API_MAX_REQUESTS', 2)
+    monkeypatch.setattr(batch_api, 'LLM_BATCH_API_POLL_SECONDS', 0.01)
+    path = tmp_path / 'comments.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(10):
+            n = 0 if i == 5 else i
+            writer.writerow({
+                'Original PR Link': f'https://github.com/o/r/pull/{i}',
+                'Suggestion': f'Suggestion {n}',
+                'Small Diff': f'+line {n}',
+            })
+    return str(path)
+
+
+def run_batch_api(input_file: str,
+                  backend: str,
+                  kill_at_chunk=None,
+                  interrupt_after_rows=None):
+    output_file = input_file.replace('.csv', '.output.csv')
+    checker = QualityChecker(input_file,
+                             output_file,
+                             use_cache=False,
+                             results_backend=backend)
+    packer = BatchPacker(render_prompt, checker.prompt_names, max_rows=5)
+    runner = BatchApiRunner(checker, packer, f'{output_file}.batch')
+    if kill_at_chunk is not None:
+        ingest = runner.ingest
+
+        def killed_ingest(chunk, batch_job):
+            if chunk['first_group'] == kill_at_chunk:
+                raise KeyboardInterrupt
+            ingest(chunk, batch_job)
+
+        runner.ingest = killed_ingest  # type: ignore[method-assign]
+    rows = checker.get_rows()
+    if interrupt_after_rows is not None:
+        rows = interrupted(checker, rows, interrupt_after_rows)
+    try:
+        runner.run(rows)
+    finally:
+        checker.close()
+    return output_file
+
+
+def interrupted(checker: QualityChecker, rows, count: int):
+    """`rows`, as if SIGINT arrived after `count` of them"""
+    for i, row in enumerate(rows):
+        if i == count:
+            checker.signal_handler(signal.SIGINT, None)
+        yield row
+
+
+def read_output(output_file: str, backend: str) -> dict[int, dict]:
+    if backend == 'sqlite':
+        store = SqliteResultsStore(
+            str(Path(output_file).with_suffix('.sqlite3')))
+        rows = [
+            json.loads(data)
+            for data, in store.conn.execute("SELECT data FROM results")
+        ]
+        store.close()
+    else:
+        with open(output_file, newline='') as f:
+            rows = list(csv.DictReader(f))
+    return {int(row['row_number']): row for row in rows}
+
+
+@pytest.mark.parametrize('backend', ['csv', 'sqlite'])
+def test_resume_reuses_verdict_committed_by_interrupted_run(
+        input_file, backend):
+    with pytest.raises(KeyboardInterrupt):
+        run_batch_api(input_file, backend, kill_at_chunk=1)
+    assert set(read_output(input_file.replace('.csv', '.output.csv'),
+                           backend)) == set(range(5))
+
+    output = read_output(run_batch_api(input_file, backend), backend)
+
+    assert set(output) == set(range(10))
+    for field in ('results', 'is_false_positive', 'final_result'):
+        assert output[5][field] == output[0][field]
+
+
+def test_interrupted_render_is_rendered_again(input_file):
+    output_file = run_batch_api(input_file, 'csv', interrupt_after_rows=7)
+    assert not Path(output_file).exists()
+    assert not json.loads(Path(
+        f'{output_file}.batch/state.json').read_text())['rendered_complete']
+
+    output = read_output(run_batch_api(input_file, 'csv'), 'csv')
+
+    assert set(output) == set(range(10))
+    assert not Path(f'{output_file}.batch').exists()
+
+
+def test_ingest_reads_the_input_once(input_file, monkeypatch):
+    passes = []
+
+    def counted_rows(path):
+        passes.append(path)
+        yield from iter_table_rows(path)
+
+    monkeypatch.setattr(batch_api, 'iter_table_rows', counted_rows)
+    output_file = run_batch_api(input_file, 'csv')
+
+    assert len(read_output(output_file, 'csv')) == 10
+    # Two chunks, one pass
+    assert passes == [input_file]
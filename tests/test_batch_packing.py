@@ -0,0 +1,79 @@
+import csv
+
+import pytest
+
+from batch_packer import BatchPacker
+from eval_prs import QualityChecker, render_prompt
+from rate_limiter import estimate_tokens
+
+FIELDNAMES = ['Original PR Link', 'Suggestion', 'Small Diff']
+TOKEN_BUDGET = 1500
+# Row whose suggestion alone is over the budget
+OVERSIZED_ROW = 7
+
+
+@pytest.fixture
+def checker(tmp_path, llm):
+    """Twenty suggestions of growing length, one of them oversized"""
+    input_file = tmp_path / 'comments.csv'
+    with open(input_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(20):
+            words = 2000 if i == OVERSIZED_ROW else 10 * i
+            writer.writerow({
+                'Original PR Link': f'https://github.com/o/r/pull/{i}',
+                'Suggestion': f'Suggestion {i}: ' + 'word ' * words,
+                'Small Diff': f'+line {i}',
+            })
+    checker = QualityChecker(str(input_file),
+                             str(tmp_path / 'comments.output.csv'),
+                             use_cache=False)
+    yield checker
+    checker.close()
+
+
+def request_tokens(checker: QualityChecker, rows: list[dict]) -> int:
+    """Estimated tokens of the largest request of a batch"""
+    return max(
+        sum(
+            estimate_tokens(m['content'])
+            for m in checker.render_messages(prompt_name, rows))
+        for prompt_name in checker.prompt_names)
+
+
+def test_batches_stay_within_the_token_budget(checker):
+    packer = BatchPacker(render_prompt,
+                         checker.prompt_names,
+                         token_budget=TOKEN_BUDGET)
+
+    batches = list(checker.iter_batches(checker.get_rows(), packer))
+
+    rows = [r for b in batches for r in b.pending_rows]
+    assert [r['original_row_number'] for r in rows] == list(range(20))
+    for batch in batches:
+        numbers = [r['original_row_number'] for r in batch.pending_rows]
+        if OVERSIZED_ROW in numbers:
+            assert numbers == [OVERSIZED_ROW]
+            continue
+        assert request_tokens(checker, batch.pending_rows) <= TOKEN_BUDGET
+    # Each batch is cut only once the next row no longer fits
+    for batch, following in zip(batches, batches[1:]):
+        if OVERSIZED_ROW in (batch.pending_rows[0]['original_row_number'],
+                             following.pending_rows[0]['original_row_number']):
+            continue
+        grown = batch.pending_rows + following.pending_rows[:1]
+        assert request_tokens(checker, grown) > TOKEN_BUDGET
+    # Short rows share a batch, long ones do not
+    assert len(batches[0].pending_rows) > 1
+    assert len(batches) < 20
+
+
+def test_output_token_cap_limits_the_rows_per_batch(checker):
+    packer = BatchPacker(render_prompt,
+                         checker.prompt_names,
+                         output_token_cap=3 * 24)
+
+    batches = list(checker.iter_batches(checker.get_rows(), packer))
+
+    assert [len(b.pending_rows) for b in batches] == [3] * 6 + [2]
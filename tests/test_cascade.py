@@ -0,0 +1,67 @@
+import pytest
+
+import eval_prs
+from eval_prs import QualityChecker
+
+
+@pytest.fixture
+def providers(llm, monkeypatch):
+    """A fast and a strong model, both served by the mock endpoint"""
+    monkeypatch.setattr(eval_prs, 'LLM_PROVIDERS', [{
+        'name': name,
+        'base_url': llm,
+        'api_key': 'mock',
+        'model': f'{name}-model',
+    } for name in ('fast', 'strong')])
+    monkeypatch.setattr(eval_prs, 'LLM_CASCADE_FAST_MODEL', 'fast-model')
+    monkeypatch.setattr(eval_prs, 'LLM_CASCADE_STRONG_MODEL', 'strong-model')
+
+
+def make_checker(tmp_path) -> QualityChecker:
+    return QualityChecker(str(tmp_path / 'comments.csv'),
+                          str(tmp_path / 'comments.output.csv'),
+                          use_cache=False,
+                          cascade=True)
+
+
+def test_unsure_and_contradictory_verdicts_go_to_the_strong_model(
+        tmp_path, providers, monkeypatch):
+    checker = make_checker(tmp_path)
+    evaluate = checker._evaluate
+
+    def contradicting(prompt_name, suggestions, *args, **kwargs):
+        verdicts = evaluate(prompt_name, suggestions, *args, **kwargs)
+        # The mock is sure of suggestion 2 and calls it a false positive
+        if kwargs.get('model') == 'fast-model' and \
+                prompt_name == 'categorization':
+            verdicts[2]['category'] = 'CRITICAL_BUG'
+        return verdicts
+
+    monkeypatch.setattr(checker, '_evaluate', contradicting)
+    rows = [{
+        'Suggestion': f'Suggestion {i}',
+        'compact_diff': f'+line {i}'
+    } for i in range(8)]
+
+    results = checker.rate_suggestions_batch(rows)
+    checker.close()
+
+    # The mock answers ids divisible by four with a confidence of 0.5
+    assert {r['id'] for r in results if r['model'] == 'strong-model'} == \
+        {0, 2, 4}
+    assert {r['id'] for r in results if r['model'] == 'fast-model'} == \
+        {1, 3, 5, 6, 7}
+    assert results[2]['category'] == 'NITPICK'
+
+
+def test_unserved_cascade_model_fails_at_startup(tmp_path, llm):
+    # The single mock provider serves neither cascade default
+    with pytest.raises(ValueError, match='No LLM provider serves'):
+        make_checker(tmp_path)
+
+
+def test_cascade_needs_two_models(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_CASCADE_FAST_MODEL', 'mock-model')
+    monkeypatch.setattr(eval_prs, 'LLM_CASCADE_STRONG_MODEL', 'mock-model')
+    with pytest.raises(ValueError, match='needs two models'):
+        make_checker(tmp_path)
@@ -0,0 +1,93 @@
+import pytest
+from conftest import PR_URLS
+
+import clone_prs
+from clone_journal import CloneJournal
+
+DUPLICATES = 3
+
+
+class Crash(Exception):
+    pass
+
+
+def crash(*args, **kwargs):
+    raise Crash('crash')
+
+
+def crash_on_call(call: int, function, after: bool = False):
+    """`function`, raising Crash on its `call`th call, before or `after`
+    it runs"""
+    calls = []
+
+    def crashing(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == call and not after:
+            raise Crash('crash')
+        result = function(*args, **kwargs)
+        if len(calls) == call:
+            raise Crash('crash')
+        return result
+
+    return crashing
+
+
+def clone(clone_env: str, journal_dir) -> tuple[list[str], str | None]:
+    return clone_prs.clone_pr(PR_URLS[0], clone_env, DUPLICATES, journal_dir)
+
+
+def created_prs(github) -> list[str]:
+    return [
+        pull['html_url'] for pulls in github.created_prs.values()
+        for pull in pulls
+    ]
+
+
+@pytest.mark.parametrize('stage', ['push', 'create_pr', 'record_pr'])
+def test_rerun_resumes_without_repeating_done_stages(clone_env, github,
+                                                     tmp_path, monkeypatch,
+                                                     stage):
+    journal_dir = tmp_path / 'journal'
+    pushes = []
+    push_branches = clone_prs.push_branches
+
+    def counted_push(**kwargs):
+        pushes.append(kwargs['refs'])
+        push_branches(**kwargs)
+
+    monkeypatch.setattr(clone_prs, 'push_branches', counted_push)
+    with monkeypatch.context() as m:
+        if stage == 'push':
+            m.setattr(clone_prs, 'push_branches', crash)
+        elif stage == 'create_pr':
+            m.setattr(clone_prs, 'create_pr',
+                      crash_on_call(2, clone_prs.create_pr))
+        else:
+            # The second PR is opened, but the journal never hears of it
+            m.setattr(CloneJournal, 'record_pr',
+                      crash_on_call(2, CloneJournal.record_pr, after=True))
+        urls, error = clone(clone_env, journal_dir)
+    assert error == 'crash'
+    planned = CloneJournal.for_pr(journal_dir, PR_URLS[0]).head_branches
+
+    resumed_urls, error = clone(clone_env, journal_dir)
+
+    assert error is None
+    assert len(resumed_urls) == DUPLICATES
+    assert resumed_urls[:len(urls)] == urls
+    assert sorted(created_prs(github)) == sorted(resumed_urls)
+    assert CloneJournal.for_pr(journal_dir,
+                               PR_URLS[0]).head_branches == planned
+    assert len(pushes) == 1
+
+
+def test_finished_pr_is_not_touched_again(clone_env, github, tmp_path,
+                                          monkeypatch):
+    journal_dir = tmp_path / 'journal'
+    urls, error = clone(clone_env, journal_dir)
+    assert error is None
+    requests = github.requests
+
+    monkeypatch.setattr(clone_prs, 'push_branches', crash)
+    assert clone(clone_env, journal_dir) == (urls, None)
+    assert github.requests == requests
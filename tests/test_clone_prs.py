@@ -0,0 +1,158 @@
+import csv
+import json
+import subprocess
+from pathlib import Path
+
+from conftest import PR_URLS
+
+import clone_prs
+
+COMMIT_TIME = 1_700_000_000
+
+
+def git(args: list[str], cwd) -> str:
+    return subprocess.run(['git', *args],
+                          cwd=cwd,
+                          check=True,
+                          capture_output=True,
+                          text=True).stdout.strip()
+
+
+def mirror_of(details: dict, tmp_path: Path) -> str:
+    mirror = str(tmp_path / 'mirror.git')
+    clone_prs.update_mirror(mirror=mirror,
+                            repo_url=clone_prs.git_remote_url(
+                                details['repo_owner'], details['repo_name']),
+                            sha=details['base_commit_sha'])
+    return mirror
+
+
+def test_duplicate_commits_are_reproducible(clone_env, tmp_path):
+    details = clone_prs.get_pr_details(PR_URLS[0])
+    mirror = mirror_of(details, tmp_path)
+    base_sha = details['base_commit_sha']
+
+    def build(scratch: str) -> list[str]:
+        return clone_prs.build_duplicate_commits(mirror=mirror,
+                                                 base_sha=base_sha,
+                                                 pr_diff=details['pr_diff'],
+                                                 branches=['first', 'second'],
+                                                 commit_time=COMMIT_TIME,
+                                                 tmp_dir=scratch)
+
+    # The scratch directory is created when missing
+    commits = build(str(tmp_path / 'missing' / 'tmp'))
+
+    assert build(clone_env) == commits
+    assert len(set(commits)) == 2
+    for commit in commits:
+        assert git(['rev-parse', f'{commit}^'], mirror) == base_sha
+        assert git(['log', '-1', '--format=%at %ct', commit],
+                   mirror) == f'{COMMIT_TIME} {COMMIT_TIME}'
+    # Both share the tree of the diff applied in a working tree
+    work = tmp_path / 'work'
+    git([
+        'clone', '-q', f"{clone_prs.GITHUB_GIT_URL}/bench-org/service.git",
+        str(work)
+    ], tmp_path)
+    git(['checkout', '-q', base_sha], work)
+    subprocess.run(['git', 'apply'],
+                   input=details['pr_diff'].encode(),
+                   cwd=work,
+                   check=True)
+    git(['add', '-A'], work)
+    expected_tree = git(['write-tree'], work)
+    assert {git(['rev-parse', f'{c}^{{tree}}'], mirror)
+            for c in commits} == {expected_tree}
+
+
+def test_branches_are_pushed_at_once(clone_env, github, tmp_path):
+    details = clone_prs.get_pr_details(PR_URLS[0])
+    mirror = mirror_of(details, tmp_path)
+    commits = clone_prs.build_duplicate_commits(
+        mirror=mirror,
+        base_sha=details['base_commit_sha'],
+        pr_diff=details['pr_diff'],
+        branches=['head_0', 'head_1'],
+        commit_time=COMMIT_TIME,
+        tmp_dir=clone_env)
+    github.create_repo('service-auto-clones')
+    remote = clone_prs.add_new_origin_if_needed(
+        cwd=mirror,
+        new_repo_url=clone_prs.git_remote_url(github.user_login,
+                                              'service-auto-clones'))
+    refs = {
+        'base': details['base_commit_sha'],
+        'head_0': commits[0],
+        'head_1': commits[1],
+    }
+
+    clone_prs.push_branches(mirror=mirror, new_origin=remote, refs=refs)
+
+    pushed = git(['ls-remote', '--heads', remote], mirror).splitlines()
+    heads = [line.split('\t') for line in pushed]
+    assert {ref.removeprefix('refs/heads/'): sha for sha, ref in heads} == refs
+    # No remote-tracking refs are left in the mirror
+    assert git(['for-each-ref', 'refs/remotes'], mirror) == ''
+
+
+def test_mirror_is_blobless_and_shared(clone_env, tmp_path, monkeypatch):
+    details = clone_prs.get_pr_details(PR_URLS[0])
+    mirror = mirror_of(details, tmp_path)
+    clone_prs.build_duplicate_commits(mirror=mirror,
+                                      base_sha=details['base_commit_sha'],
+                                      pr_diff=details['pr_diff'],
+                                      branches=['head'],
+                                      commit_time=COMMIT_TIME,
+                                      tmp_dir=clone_env)
+
+    local_objects = git([
+        'cat-file', '--batch-all-objects',
+        '--batch-check=%(objectname) %(objecttype)'
+    ], mirror).splitlines()
+    untouched = [
+        line.split()[2]
+        for line in git(['ls-tree', '-r', details['base_commit_sha'], 'lib'],
+                        mirror).splitlines()
+    ]
+    assert untouched
+    # Files the diff leaves alone were never fetched
+    assert not {f'{sha} blob' for sha in untouched} & set(local_objects)
+    assert git(['config', 'remote.origin.partialclonefilter'],
+               mirror) == 'blob:none'
+
+    commands = []
+    monkeypatch.setattr(clone_prs, 'subprocess_run',
+                        lambda args, **kwargs: commands.append(args))
+    mirror_of(details, tmp_path)
+    assert commands == []
+
+
+def test_prs_are_cloned_in_parallel_and_recorded_in_order(
+        clone_env, github, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path('clone_repos.json').write_text(
+        json.dumps({
+            'pr_urls': PR_URLS[:4],
+            'duplicate_count': 2,
+            'workers': 3,
+            'output_file': 'pr_records.csv',
+        }))
+
+    clone_prs.main()
+
+    with open('pr_records.csv', newline='') as f:
+        records = list(csv.reader(f))[1:]
+    assert [original for original, _ in records] == \
+        [url for url in PR_URLS[:4] for _ in range(2)]
+    clones = [clone for _, clone in records]
+    assert sorted(clones) == sorted(pull['html_url']
+                                    for pulls in github.created_prs.values()
+                                    for pull in pulls)
+    # Every clone has branches of its own
+    heads = {
+        pull['head']['ref']
+        for pulls in github.created_prs.values()
+        for pull in pulls
+    }
+    assert len(heads) == len(clones)
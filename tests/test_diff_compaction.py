@@ -0,0 +1,63 @@
+from diff_compaction import DiffCompactor
+from rate_limiter import estimate_tokens
+
+HEADER = '@@ -1,80 +1,81 @@'
+
+
+def hunk(*changed: int, length: int = 80) -> str:
+    """Unchanged lines of code, with an added line at each of `changed`"""
+    lines = [
+        f'+    added_call({i})' if i in changed else f'     context_line({i})'
+        for i in range(length)
+    ]
+    return '\n'.join([HEADER] + lines)
+
+
+def test_small_hunks_and_a_zero_budget_are_left_alone():
+    small = hunk(3, length=6)
+    large = hunk(10)
+
+    assert DiffCompactor(token_budget=500)(small) == small
+    assert DiffCompactor(token_budget=0)(large) == large
+
+
+def test_context_away_from_changes_and_the_tail_is_elided():
+    compacted = DiffCompactor(token_budget=400, context_lines=2)(hunk(20))
+
+    assert compacted.splitlines() == [
+        HEADER,
+        '... [18 unchanged lines elided] ...',
+        '     context_line(18)',
+        '     context_line(19)',
+        '+    added_call(20)',
+        '     context_line(21)',
+        '     context_line(22)',
+        '... [52 unchanged lines elided] ...',
+        '     context_line(75)',
+        '     context_line(76)',
+        '     context_line(77)',
+        '     context_line(78)',
+        '     context_line(79)',
+    ]
+
+
+def test_lines_furthest_from_the_tail_go_first_over_budget():
+    compactor = DiffCompactor(token_budget=40, context_lines=2)
+    original = hunk(*range(0, 80, 2))
+
+    lines = compactor(original).splitlines()
+
+    assert lines[0] == HEADER
+    assert lines[1].startswith('... [') and lines[1].endswith(
+        'earlier lines elided] ...')
+    assert lines[-1] == original.splitlines()[-1]
+    assert estimate_tokens('\n'.join(lines)) <= 40
+
+
+def test_the_commented_line_survives_a_tiny_budget():
+    original = hunk(79)
+
+    lines = DiffCompactor(token_budget=1)(original).splitlines()
+
+    assert lines == [HEADER, '... [79 earlier lines elided] ...'] + \
+        original.splitlines()[-1:]
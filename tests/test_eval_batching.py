@@ -0,0 +1,56 @@
+import csv
+
+import pytest
+
+import eval_prs
+from batch_packer import BatchPacker
+from eval_prs import QualityChecker, render_prompt
+
+FIELDNAMES = ['Original PR Link', 'Suggestion', 'Small Diff']
+
+
+@pytest.fixture
+def checker(tmp_path, llm):
+    """Thirty rows repeating three suggestions"""
+    input_file = tmp_path / 'comments.csv'
+    with open(input_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i in range(30):
+            writer.writerow({
+                'Original PR Link': f'https://github.com/o/r/pull/{i}',
+                'Suggestion': f'Suggestion {i % 3}',
+                'Small Diff': f'+line {i % 3}',
+            })
+    checker = QualityChecker(str(input_file),
+                             str(tmp_path / 'comments.output.csv'),
+                             use_cache=False)
+    yield checker
+    checker.close()
+
+
+def test_ride_along_rows_are_cut_into_batches(checker, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_BATCH_MAX_ROWS', 4)
+    packer = BatchPacker(render_prompt, checker.prompt_names, max_rows=5)
+
+    batches = list(checker.iter_batches(checker.get_rows(), packer))
+
+    assert [len(b.rows) for b in batches] == [4] * 7 + [2]
+    assert [len(b.pending_rows) for b in batches] == [3] + [0] * 7
+
+
+def test_ride_along_batches_are_written(checker, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_BATCH_MAX_ROWS', 4)
+    monkeypatch.setattr('builtins.input', lambda prompt: 'y')
+    packer = BatchPacker(render_prompt, checker.prompt_names, max_rows=5)
+
+    checker.process_rows(checker.get_rows(), packer)
+    checker.close()
+
+    with open(checker.output_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r['row_number']) for r in rows] == list(range(30))
+    for row in rows:
+        first = rows[int(row['row_number']) % 3]
+        assert (row['results'], row['is_false_positive']) == \
+            (first['results'], first['is_false_positive'])
@@ -0,0 +1,36 @@
+import csv
+
+from conftest import PR_URLS, export
+
+import github_client
+
+OUTPUT = 'export_input_bot_comment_data.csv'
+
+
+def exported(input_file: str, *options: str) -> list[dict]:
+    """Rows of a fresh export, which overwrites the previous one"""
+    export(input_file, *options)
+    with open(OUTPUT, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_concurrent_export_keeps_the_input_order(export_input):
+    sequential = exported(export_input, '--concurrency', '1')
+    concurrent = exported(export_input, '--concurrency', '4')
+
+    assert concurrent == sequential
+    pr_numbers = [url.rsplit('/', 1)[1] for url in PR_URLS]
+    assert list(dict.fromkeys(r['PR No'] for r in concurrent)) == pr_numbers
+
+
+def test_rate_limited_export_waits_and_completes(export_input, github,
+                                                 monkeypatch):
+    expected = exported(export_input, '--concurrency', '4')
+    unlimited_requests = github.requests
+    # Every worker runs into the limit, and waits for the next window
+    monkeypatch.setattr(github_client, 'GITHUB_RATE_LIMIT_RESERVE', 0)
+    github.rate_limit = 8
+    github.rate_window = 1.0
+
+    assert exported(export_input, '--concurrency', '4') == expected
+    assert github.requests - unlimited_requests > unlimited_requests
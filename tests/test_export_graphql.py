@@ -0,0 +1,34 @@
+import csv
+
+import pytest
+from conftest import PR_URLS, export
+
+import export_gh_comments_to_csv
+
+OUTPUT = 'export_input_bot_comment_data.csv'
+
+
+def exported(input_file: str, *options: str) -> list[dict]:
+    export(input_file, *options)
+    with open(OUTPUT, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize('batch_size, page', [(25, 100), (4, 2)])
+def test_graphql_rows_match_rest_rows(export_input, github, monkeypatch,
+                                      batch_size, page):
+    # Small pages make PRs page through threads and threads through comments
+    monkeypatch.setattr(export_gh_comments_to_csv, 'GRAPHQL_THREADS_PAGE',
+                        page)
+    monkeypatch.setattr(export_gh_comments_to_csv, 'GRAPHQL_COMMENTS_PAGE',
+                        page)
+    rest = exported(export_input, '--backend', 'rest')
+    rest_requests = github.requests
+    graphql = exported(export_input, '--backend', 'graphql',
+                       '--graphql_batch_size', str(batch_size))
+
+    assert rest
+    assert graphql == rest
+    batches = -(-len(PR_URLS) // batch_size)
+    queries = github.requests - rest_requests
+    assert queries == batches if page == 100 else queries > batches
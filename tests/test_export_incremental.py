@@ -0,0 +1,57 @@
+import csv
+from collections import Counter
+
+import pytest
+from conftest import export
+
+import export_gh_comments_to_csv
+
+
+def output_rows() -> list[tuple]:
+    with open('export_input_bot_comment_data.csv', newline='') as f:
+        return [(row['PR No'], row['Date'], row['Suggestion'])
+                for row in csv.DictReader(f)]
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after(prs: int, monkeypatch):
+    fetch = export_gh_comments_to_csv.fetch_prs_comments
+
+    def fetch_then_crash(*args, **kwargs):
+        for count, pull in enumerate(fetch(*args, **kwargs)):
+            if count == prs:
+                raise Crash
+            yield pull
+
+    monkeypatch.setattr(export_gh_comments_to_csv, 'fetch_prs_comments',
+                        fetch_then_crash)
+
+
+@pytest.mark.parametrize('torn_log', [False, True])
+def test_rerun_after_crash_appends_no_duplicates(export_input, monkeypatch,
+                                                 torn_log):
+    export(export_input)
+    expected = Counter(output_rows())
+    assert expected and max(expected.values()) == 1
+
+    with monkeypatch.context() as m:
+        crash_after(3, m)
+        with pytest.raises(Crash):
+            export(export_input)
+    assert {pr for pr, _, _ in output_rows()} == {'1', '2', '3'}
+    if torn_log:
+        with open('export_input_bot_comment_data.state.jsonl', 'a') as f:
+            f.write('{"pr_url": "https://github.com/bench-org/ser')
+
+    export(export_input, '--incremental')
+    assert Counter(output_rows()) == expected
+
+
+def test_incremental_rerun_of_complete_export_appends_nothing(export_input):
+    export(export_input)
+    rows = output_rows()
+    export(export_input, '--incremental')
+    assert output_rows() == rows
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from json_stream import JsonArrayItemParser, parse_llm_json
+
+ITEMS = [
+    {
+        'id': 0,
+        'category': 'NITPICK',
+        'note': 'a "quoted" } brace'
+    },
+    {
+        'id': 1,
+        'category': 'CRITICAL_BUG',
+        'nested': {
+            'list': [1, {
+                'x': '[]'
+            }]
+        }
+    },
+    {
+        'id': 2,
+        'category': 'REFACTORING',
+        'note': 'back\\slash'
+    },
+]
+ANSWER = json.dumps({'results': ITEMS})
+
+
+def feed_chunks(chunks: list[str]) -> list[dict]:
+    parser = JsonArrayItemParser()
+    return [item for chunk in chunks for item in parser.feed(chunk)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16, len(ANSWER)])
+def test_items_split_across_chunks(size):
+    chunks = [ANSWER[i:i + size] for i in range(0, len(ANSWER), size)]
+    assert feed_chunks(chunks) == ITEMS
+
+
+def test_item_returned_once_its_brace_arrives():
+    parser = JsonArrayItemParser()
+    first_end = ANSWER.index('}, {') + 1
+    assert parser.feed(ANSWER[:first_end - 1]) == []
+    assert parser.feed(ANSWER[first_end - 1:first_end]) == ITEMS[:1]
+    assert parser.feed(ANSWER[first_end:]) == ITEMS[1:]
+
+
+def test_bare_array_in_markdown_fence():
+    answer = f"```json\n{json.dumps(ITEMS)}\n```"
+    assert feed_chunks([answer[:10], answer[10:50], answer[50:]]) == ITEMS
+
+
+def test_escaped_quote_at_chunk_boundary():
+    answer = json.dumps([{'id': 0, 'note': 'say \\"hi\\" }'}])
+    split = answer.index('\\') + 1
+    assert feed_chunks([answer[:split], answer[split:]]) == json.loads(answer)
+
+
+def test_truncated_stream_keeps_complete_items():
+    cut = ANSWER.index('"id": 2')
+    assert feed_chunks([ANSWER[:cut]]) == ITEMS[:2]
+
+
+def test_parse_llm_json_strips_fence():
+    assert parse_llm_json(f"```json\n{ANSWER}\n```") == {'results': ITEMS}
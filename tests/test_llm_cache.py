@@ -0,0 +1,78 @@
+import pytest
+
+import eval_prs
+import llm_cache
+from eval_prs import QualityChecker
+from llm_cache import LLMCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.sqlite3'))
+    yield cache
+    cache.close()
+
+
+def test_key_covers_model_and_both_prompts(cache):
+    cache.set('m1', 'system', 'user', 'answer')
+
+    assert cache.get(['m1'], 'system', 'user') == ('m1', 'answer')
+    assert cache.get(['m2'], 'system', 'user') is None
+    assert cache.get(['m1'], 'other system', 'user') is None
+    assert cache.get(['m1'], 'system', 'other user') is None
+    # Parts are delimited, so moving text between them changes the key
+    assert cache.get(['m1'], 'systemuser', '') is None
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_first_cached_model_answers(cache):
+    cache.set('m2', 'system', 'user', 'from m2')
+    cache.set('m3', 'system', 'user', 'from m3')
+
+    assert cache.get(['m1', 'm2', 'm3'], 'system', 'user') == ('m2', 'from m2')
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_expired_and_least_recently_used_entries_are_evicted(
+        tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+    cache = LLMCache(str(tmp_path / 'cache.sqlite3'),
+                     max_age_days=1,
+                     max_entries=2)
+    for i in range(3):
+        cache.set('m', 'system', f'user {i}', f'answer {i}')
+        now[0] += 1
+    cache.get(['m'], 'system', 'user 0')
+    cache.evict()
+
+    assert cache.get(['m'], 'system', 'user 1') is None
+    assert cache.get(['m'], 'system', 'user 0') is not None
+
+    now[0] += 86400
+    cache.evict()
+    assert cache.get(['m'], 'system', 'user 2') is None
+    cache.close()
+
+
+def test_second_run_is_answered_from_the_cache(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_CACHE_PATH',
+                        str(tmp_path / 'cache.sqlite3'))
+    rows = [{
+        'Suggestion': f'Suggestion {i}',
+        'compact_diff': f'+line {i}'
+    } for i in range(4)]
+    results = []
+    for run in range(2):
+        checker = QualityChecker(str(tmp_path / 'comments.csv'),
+                                 str(tmp_path / f'run{run}.output.csv'))
+        results.append(checker.rate_suggestions_batch(rows))
+        calls = sum(checker.metrics.calls.values())
+        checker.close()
+
+    assert calls == 0
+    assert {r['provider'] for r in results[1]} == {'cache'}
+    assert {r['model'] for r in results[1]} == {'mock-model'}
+    verdicts = [[(r['category'], r['is_false_positive']) for r in run]
+                for run in results]
+    assert verdicts[0] == verdicts[1]
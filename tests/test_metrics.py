@@ -0,0 +1,36 @@
+from metrics import RunMetrics, sum_costs
+
+USAGE = {'prompt_tokens': 1_000_000, 'completion_tokens': 500_000}
+
+
+def test_sum_costs_reports_unknown_costs_apart():
+    assert sum_costs({'a': 1.5, 'b': None, 'c': 0.25}) == (1.75, ['b'])
+    assert sum_costs({'b': None}) == (None, ['b'])
+    assert sum_costs({}) == (None, [])
+
+
+def test_total_cost_keeps_priced_models_when_one_is_unpriced():
+    metrics = RunMetrics({'priced': [1.0, 2.0]})
+    metrics.record_call('priced', 'combined', 1.0, USAGE, False, 'p1')
+    metrics.record_call('unpriced', 'combined', 1.0, USAGE, False, 'p2')
+
+    summary = metrics.summary()
+
+    assert summary['cost_usd'] == 2.0
+    assert summary['cost_unknown_models'] == ['unpriced']
+    assert 'plus unpriced unpriced' in metrics.report_line()
+
+
+def test_calls_without_a_model_and_cache_hits_are_keyed_by_model():
+    metrics = RunMetrics({'priced': [1.0, 2.0]})
+    metrics.record_call(None, 'combined', 0.1, None, True)
+    metrics.record_cache_hit('priced')
+
+    summary = metrics.summary()
+
+    assert set(summary['models']) == {'unknown', 'priced'}
+    assert summary['models']['priced']['cache_hits'] == 1
+    assert summary['cache_hits'] == 1
+    # Neither spent tokens, so no cost is missing
+    assert summary['cost_usd'] is None
+    assert summary['cost_unknown_models'] == []
@@ -0,0 +1,97 @@
+import pytest
+
+import eval_prs
+from eval_prs import QualityChecker
+
+SOURCE = ('mock', 'mock-model')
+
+
+@pytest.fixture
+def checker(tmp_path, llm, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_BATCH_ATTEMPTS', 2)
+    checker = QualityChecker(str(tmp_path / 'comments.csv'),
+                             str(tmp_path / 'comments.output.csv'),
+                             use_cache=False,
+                             prompt_mode='combined')
+    yield checker
+    checker.close()
+
+
+def fake_llm(checker, monkeypatch, answer):
+    """Replace the LLM with `answer(ids, request_no)` and return the ids
+    of each request"""
+    requests: list[list[int]] = []
+
+    def run_prompt(prompt_name, render_args, **kwargs):
+        ids = [s['id'] for s in render_args['suggestions']]
+        requests.append(ids)
+        return answer(ids, len(requests)), SOURCE
+
+    monkeypatch.setattr(checker, '_run_prompt', run_prompt)
+    return requests
+
+
+def verdict(_id: int) -> dict:
+    return {'id': _id, 'category': 'NITPICK', 'is_false_positive': False}
+
+
+def suggestions(count: int) -> list[dict]:
+    return [{'id': i, 'suggestion': f'Suggestion {i}'} for i in range(count)]
+
+
+def test_only_missing_and_invalid_ids_are_asked_again(checker, monkeypatch):
+
+    def answer(ids, request_no):
+        if request_no == 1:
+            # 2 is missing, 3 has an unknown category
+            invalid = {**verdict(3), 'category': 'X'}
+            return [verdict(0), verdict(1), invalid, verdict(4)]
+        return [verdict(i) for i in ids]
+
+    requests = fake_llm(checker, monkeypatch, answer)
+
+    verdicts = checker._evaluate('combined', suggestions(5))
+
+    assert requests == [[0, 1, 2, 3, 4], [2, 3]]
+    assert sorted(verdicts) == [0, 1, 2, 3, 4]
+    assert verdicts[2]['sources'] == {'combined': SOURCE}
+
+
+def test_failing_ids_are_bisected_down_to_the_culprit(checker, monkeypatch):
+    # The answer breaks whenever suggestion 5 is in the request
+    requests = fake_llm(
+        checker, monkeypatch, lambda ids, _: []
+        if 5 in ids else [verdict(i) for i in ids])
+
+    verdicts = checker._evaluate('combined', suggestions(8))
+
+    assert sorted(verdicts) == [0, 1, 2, 3, 4, 6, 7]
+    assert requests == [
+        [0, 1, 2, 3, 4, 5, 6, 7],
+        [0, 1, 2, 3, 4, 5, 6, 7],
+        [0, 1, 2, 3],
+        [4, 5, 6, 7],
+        [4, 5, 6, 7],
+        [4, 5],
+        [4, 5],
+        [4],
+        [5],
+        [5],
+        [6, 7],
+    ]
+
+
+def test_ids_left_out_are_recorded_as_unknown(checker, monkeypatch):
+    fake_llm(checker, monkeypatch,
+             lambda ids, _: [verdict(i) for i in ids if i != 1])
+
+    results = checker.rate_suggestions_batch([{
+        'Suggestion': f'Suggestion {i}',
+        'compact_diff': f'+line {i}'
+    } for i in range(3)])
+
+    assert [(r['category'], r['is_false_positive']) for r in results] == [
+        ('NITPICK', False),
+        ('-1', False),
+        ('NITPICK', False),
+    ]
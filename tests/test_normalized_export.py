@@ -0,0 +1,76 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from conftest import REPO_ROOT, export
+
+import eval_prs
+from tables import iter_table_rows
+
+
+def export_layout(export_input: Path, layout: str, output_format: str,
+                  monkeypatch) -> str:
+    """Comments table exported with `layout` and `output_format`, in a
+    directory of its own"""
+    directory = export_input.parent / f'{layout}_{output_format}'
+    directory.mkdir()
+    shutil.copy(export_input, directory)
+    with monkeypatch.context() as m:
+        m.chdir(directory)
+        export(export_input.name, '--layout', layout, '--format',
+               output_format)
+    return str(directory / f'export_input_bot_comment_data.{output_format}')
+
+
+def evaluate(input_file: str, monkeypatch) -> list[dict]:
+    """Verdict columns of eval_prs.py run over `input_file`"""
+    with monkeypatch.context() as m:
+        m.chdir(REPO_ROOT)
+        m.setattr('builtins.input', lambda prompt: 'y')
+        eval_prs.quality_analysis(input_file,
+                                  batch_size=5,
+                                  token_budget=0,
+                                  use_cache=False)
+    output_file = f"{input_file.strip('.csv')}.output.csv"
+    return [{
+        k: row[k]
+        for k in ('Suggestion', 'results', 'is_false_positive', 'row_number')
+    } for row in iter_table_rows(output_file)]
+
+
+@pytest.mark.parametrize('layout, output_format', [
+    ('normalized', 'csv'),
+    ('flat', 'parquet'),
+    ('normalized', 'parquet'),
+])
+def test_layouts_round_trip_through_eval(export_input, llm, monkeypatch,
+                                         tmp_path, layout, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    export_input = tmp_path / export_input
+    flat_file = export_layout(export_input, 'flat', 'csv', monkeypatch)
+    comments_file = export_layout(export_input, layout, output_format,
+                                  monkeypatch)
+    flat = list(iter_table_rows(flat_file))
+    comments = list(iter_table_rows(comments_file))
+
+    if layout == 'normalized':
+        prs = list(
+            iter_table_rows(comments_file.replace('_data.', '_data_prs.')))
+        descriptions = {
+            pr['Original PR Link']: pr['Pr Description']
+            for pr in prs
+        }
+        # One row per original PR
+        assert len(descriptions) == len(prs)
+        comments = [{
+            'Pr Description': descriptions[row.pop('Original PR Link')],
+            **row
+        } for row in comments]
+    assert flat
+    assert [sorted(r.items()) for r in comments] == \
+        [sorted(r.items()) for r in flat]
+
+    verdicts = evaluate(comments_file, monkeypatch)
+    assert len(verdicts) == len(flat)
+    assert verdicts == evaluate(flat_file, monkeypatch)
@@ -0,0 +1,22 @@
+import pytest
+from conftest import REPO_ROOT
+
+from eval_prs import render_system_prompt
+
+PARTIALS = REPO_ROOT / 'prompts' / 'partials'
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+
+
+@pytest.mark.parametrize('partial, prompt_name', [
+    ('categories', 'categorization'),
+    ('false_positive', 'false_positive'),
+])
+def test_combined_prompt_shares_the_two_pass_definitions(partial, prompt_name):
+    definition = (PARTIALS / f'{partial}.jinja').read_text().strip()
+
+    assert definition in render_system_prompt(prompt_name)
+    assert definition in render_system_prompt('combined')
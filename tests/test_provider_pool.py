@@ -0,0 +1,82 @@
+import pytest
+from conftest import serve
+
+import eval_prs
+from benchmarks import mock_openai
+from eval_prs import QualityChecker
+from provider_pool import ProviderPool, load_providers
+
+
+def specs(*names: str, **options) -> list[dict]:
+    return [{
+        'name': name,
+        'base_url': 'http://127.0.0.1:9/v1',
+        'api_key': 'mock',
+        'model': f'{name}-model',
+        **options,
+    } for name in names]
+
+
+@pytest.fixture
+def failing_url():
+    """Mock OpenAI endpoint answering every completion with a 500"""
+    server = mock_openai.make_server(0, error_rate=1.0)
+    yield f'{serve(server)}/v1'
+    server.shutdown()
+    server.server_close()
+
+
+def test_least_loaded_provider_is_leased_first():
+    pool = ProviderPool(load_providers(specs('a', 'b')))
+
+    first, _ = pool.acquire()
+    second, _ = pool.acquire()
+    pool.release(first.name)
+    third, _ = pool.acquire()
+
+    assert {first.name, second.name} == {'a', 'b'}
+    assert third is first
+
+
+def test_model_pins_and_suspensions_narrow_the_candidates():
+    pool = ProviderPool(load_providers(specs('a', 'b', 'c')))
+
+    provider, _ = pool.acquire(model='b-model')
+    assert provider.name == 'b'
+    pool.release('b', suspend_for=60)
+    assert {pool.acquire()[0].name for _ in range(4)} == {'a', 'c'}
+    with pytest.raises(ValueError, match='No LLM provider serves'):
+        pool.acquire(model='d-model')
+
+
+def test_duplicate_provider_names_are_rejected():
+    with pytest.raises(ValueError, match='Duplicate provider names'):
+        load_providers(specs('a', 'a'))
+
+
+def test_failing_provider_is_suspended_and_requests_fail_over(
+        tmp_path, llm, failing_url, monkeypatch):
+    monkeypatch.setattr(eval_prs, 'LLM_BACKOFF_BASE', 0.01)
+    monkeypatch.setattr(eval_prs, 'LLM_BACKOFF_MAX', 0.01)
+    monkeypatch.setattr(eval_prs, 'LLM_PROVIDERS', [{
+        'name': name,
+        'base_url': url,
+        'api_key': 'mock',
+        'model': 'mock-model',
+    } for name, url in (('failing', failing_url), ('healthy', llm))])
+    checker = QualityChecker(str(tmp_path / 'comments.csv'),
+                             str(tmp_path / 'comments.output.csv'),
+                             use_cache=False)
+    rows = [{
+        'Suggestion': f'Suggestion {i}',
+        'compact_diff': f'+line {i}'
+    } for i in range(4)]
+
+    results = checker.rate_suggestions_batch(rows)
+    checker.close()
+
+    assert {r['provider'] for r in results} == {'healthy'}
+    assert [r['category'] for r in results] == ['NITPICK'] * 4
+    assert checker.pool.by_name['failing'].suspensions >= 1
+    assert checker.metrics.providers['failing']['retries'] >= 1
+    assert checker.pool.by_name['failing'].in_flight == 0
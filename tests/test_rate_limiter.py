@@ -0,0 +1,47 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import TokenBucketRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic, advanced by hand"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def sent_at_once(limiter: TokenBucketRateLimiter) -> int:
+    sent = 0
+    while not limiter.try_acquire():
+        sent += 1
+    return sent
+
+
+def test_requests_are_spread_over_the_minute(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60)
+
+    assert sent_at_once(limiter) == 1
+    assert limiter.try_acquire() == pytest.approx(1.0)
+    # A long idle stretch does not bank a minute of requests either
+    clock[0] += 600
+    assert sent_at_once(limiter) == 1
+
+
+def test_burst_caps_back_to_back_requests(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, burst=5)
+
+    assert sent_at_once(limiter) == 5
+    clock[0] += 2.5
+    assert sent_at_once(limiter) == 2
+    clock[0] += 600
+    assert sent_at_once(limiter) == 5
+
+
+def test_token_budget_still_holds_a_large_request(clock):
+    limiter = TokenBucketRateLimiter(requests_per_minute=0,
+                                     tokens_per_minute=600)
+
+    assert limiter.try_acquire(600) == 0
+    assert limiter.try_acquire(60) == pytest.approx(6.0)
@@ -0,0 +1,94 @@
+import csv
+
+import pytest
+
+from results_store import (RESULT_FIELDNAMES, CsvResultsStore,
+                           SqliteResultsStore, open_results_store)
+
+FIELDNAMES = ['Suggestion'] + RESULT_FIELDNAMES
+
+
+def output_row(row_number: int) -> tuple[str, dict]:
+    return f'key {row_number % 2}', {
+        # Quoted newlines make a record span several lines
+        'Suggestion': f'Suggestion {row_number}\nsecond line',
+        'results': 'NITPICK',
+        'is_false_positive': row_number % 2 == 0,
+        'final_result': True,
+        'row_number': row_number,
+        'provider': 'mock',
+        'model': 'mock-model',
+    }
+
+
+def write(store, row_numbers):
+    store.load()
+    store.open(FIELDNAMES)
+    store.write_rows([output_row(n) for n in row_numbers])
+    store.close()
+
+
+@pytest.mark.parametrize('torn_at', ['\n', 'second', ',NITPICK'])
+def test_torn_csv_row_is_truncated_on_resume(tmp_path, torn_at):
+    path = tmp_path / 'comments.output.csv'
+    write(CsvResultsStore(str(path)), range(3))
+    complete = path.read_bytes()
+    with open(path, 'a', newline='') as f:
+        csv.writer(f).writerow(output_row(3)[1].values())
+    torn = path.read_bytes()
+    path.write_bytes(torn[:torn.index(torn_at.encode(), len(complete)) + 1])
+
+    store = CsvResultsStore(str(path))
+    store.load(dedup_key=lambda row: f"key {int(row['row_number']) % 2}")
+
+    assert path.read_bytes() == complete
+    assert store.processed_count() == 3
+    assert not store.is_processed(3)
+    assert store.get_verdict('key 1') == {
+        'category': 'NITPICK',
+        'is_false_positive': False,
+        'provider': 'mock',
+        'model': 'mock-model',
+    }
+    store.open(FIELDNAMES)
+    store.write_rows([output_row(3)])
+    store.close()
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['row_number'] for r in rows] == ['0', '1', '2', '3']
+
+
+def test_sqlite_store_resumes_from_its_indexes(tmp_path):
+    path = str(tmp_path / 'comments.output.sqlite3')
+    write(SqliteResultsStore(path), [2, 0])
+    write(SqliteResultsStore(path), [1, 2])
+
+    store = SqliteResultsStore(path)
+    store.load()
+    assert store.processed_count() == 3
+    assert store.is_processed(1) and not store.is_processed(3)
+    assert store.get_verdict('key 0') == {
+        'category': 'NITPICK',
+        'is_false_positive': True,
+        'provider': 'mock',
+        'model': 'mock-model',
+    }
+    assert store.get_verdict('key 2') is None
+
+    export_path = tmp_path / 'export.csv'
+    assert store.export_csv(str(export_path)) == 3
+    store.close()
+    with open(export_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['row_number'] for r in rows] == ['0', '1', '2']
+    assert rows[0]['Suggestion'] == 'Suggestion 0\nsecond line'
+
+
+def test_backend_picks_the_store_file(tmp_path):
+    output_file = str(tmp_path / 'comments.output.csv')
+    csv_store = open_results_store('csv', output_file)
+    sqlite_store = open_results_store('sqlite', output_file)
+    sqlite_store.close()
+
+    assert csv_store.path == output_file
+    assert sqlite_store.path == str(tmp_path / 'comments.output.sqlite3')
@@ -0,0 +1,179 @@
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TextIO
+
+import click
+
+from config import LLM_PROVIDERS, LLM_TRANSCRIPT_DIR
+from provider_pool import ProviderPool, load_providers
+
+TRANSCRIPT_GLOB = 'transcript-*.jsonl.gz'
+
+
+class TranscriptWriter:
+    """Appends LLM call records to rotating gzip-compressed JSONL files.
+
+    Callers only enqueue; a background thread serializes the records and
+    flushes whenever the queue runs dry, so a crash loses at most the
+    records still queued. Files are rotated past `max_bytes` of JSON.
+    """
+
+    def __init__(self, log_dir: str, max_bytes: int = 64 * 1024 * 1024):
+        self.log_dir = Path(log_dir)
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.prefix = f"transcript-{time.strftime('%Y%m%d-%H%M%S')}-" \
+            f"{os.getpid()}"
+        self.part = 0
+        self.file: TextIO | None = None
+        self.written = 0
+        self.queue: queue.Queue[dict | None] = queue.Queue()
+        self.thread = threading.Thread(target=self._run,
+                                       name='transcript-writer',
+                                       daemon=True)
+        self.thread.start()
+
+    def log(self, record: dict):
+        self.queue.put(record)
+
+    def _open(self) -> TextIO:
+        path = self.log_dir / f"{self.prefix}-{self.part:03d}.jsonl.gz"
+        self.part += 1
+        self.written = 0
+        return gzip.open(path, 'wt', encoding='utf-8')
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            if self.file is None or self.max_bytes and \
+                    self.written >= self.max_bytes:
+                if self.file:
+                    self.file.close()
+                self.file = self._open()
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            self.file.write(line)
+            self.written += len(line)
+            if self.queue.empty():
+                self.file.flush()
+        if self.file:
+            self.file.close()
+
+    def close(self):
+        """Write out everything queued and close the current file"""
+        self.queue.put(None)
+        self.thread.join()
+
+
+def read_transcript(log_dir: str) -> Iterator[dict]:
+    """Records of all transcript files in `log_dir`, oldest first.
+
+    A file cut short by a crash yields the records flushed before it.
+    """
+    for path in sorted(Path(log_dir).glob(TRANSCRIPT_GLOB)):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    yield json.loads(line)
+            except (EOFError, gzip.BadGzipFile, zlib.error,
+                    json.JSONDecodeError):
+                print(f"Stopped reading truncated transcript {path}")
+
+
+def matches(record: dict, txn_id: str | None, prompt_name: str | None,
+            row: int | None, errors_only: bool) -> bool:
+    if txn_id and not record['txn_id'].startswith(txn_id):
+        return False
+    if prompt_name and record.get('prompt_name') != prompt_name:
+        return False
+    if row is not None and row not in record.get('rows', []):
+        return False
+    return not errors_only or bool(record.get('error'))
+
+
+def summary(record: dict) -> str:
+    usage = record.get('usage') or {}
+    when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['time']))
+    rows = record.get('rows') or []
+    span = f"{rows[0]}..{rows[-1]}" if rows else "-"
+    line = (f"{when} {record['txn_id']} {record.get('prompt_name')} "
+            f"{record.get('provider', '-')}/{record['model']} "
+            f"rows={span} ({len(rows)}) "
+            f"{record.get('latency_s')}s "
+            f"tokens={usage.get('total_tokens', '?')}")
+    if record.get('error'):
+        line += f" error={record['error']}"
+    return line
+
+
+def replay(record: dict, client, model: str | None) -> str:
+    """Re-send a recorded request and return the new answer"""
+    response = client.chat.completions.create(
+        model=model or record['model'],
+        messages=[{
+            "role": "system",
+            "content": record['system_prompt']
+        }, {
+            "role": "user",
+            "content": record['user_prompt']
+        }],
+    )
+    return response.choices[0].message.content or ""
+
+
+@click.command()
+@click.option("--log_dir",
+              type=str,
+              default=LLM_TRANSCRIPT_DIR,
+              show_default=True,
+              help="Directory holding the transcript-*.jsonl.gz files")
+@click.option("--txn_id", type=str, default=None, help="Txn id or prefix")
+@click.option("--prompt_name", type=str, default=None)
+@click.option("--row",
+              type=int,
+              default=None,
+              help="Only calls that included this input row number")
+@click.option("--errors_only", is_flag=True, help="Only failed calls")
+@click.option("--full",
+              is_flag=True,
+              help="Print prompts and answers, not just a summary line")
+@click.option("--replay",
+              "do_replay",
+              is_flag=True,
+              help="Re-send the matching requests and compare the answers")
+@click.option("--model",
+              type=str,
+              default=None,
+              help="Model to replay against instead of the recorded one")
+def main(log_dir, txn_id, prompt_name, row, errors_only, full, do_replay,
+         model):
+    pool = ProviderPool(load_providers(LLM_PROVIDERS)) if do_replay else None
+    for record in read_transcript(log_dir):
+        if not matches(record, txn_id, prompt_name, row, errors_only):
+            continue
+        print(summary(record))
+        if full:
+            print(f"System:\n{record['system_prompt']}\n\n"
+                  f"User:\n{record['user_prompt']}\n\n"
+                  f"Answer:\n{record.get('answer', '')}\n")
+        if pool:
+            # Same endpoint when it is still configured
+            provider = pool.by_name.get(record.get('provider', ''),
+                                        pool.primary)
+            answer = replay(record, provider.client, model)
+            same = answer.strip() == (record.get('answer') or '').strip()
+            print(f"Replayed: {'same answer' if same else 'answer changed'}")
+            if full and not same:
+                print(f"New answer:\n{answer}\n")
+
+
+if __name__ == '__main__':
+    main()